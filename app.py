@@ -1,21 +1,82 @@
 import tkinter as tk
-from tkinter import ttk, messagebox, simpledialog
-import threading
-import socket
-from vector_clock import VectorClock
-from message import create_message, create_rename_message, parse_message
+from tkinter import ttk, messagebox, simpledialog, filedialog
+from concurrent.futures import ThreadPoolExecutor
+from vector_clock import VectorClock, AFTER, CONCURRENT
+from message import create_message, create_batch_message, create_gossip_message, create_rename_message, create_sync_request, create_sync_response
+from sync import delta_for, entries_for
+from engine import ApplyEngine
+from ingest import IngestPool
+from merkle import MerkleTree
+from causal import CausalIndex
+from runtime import NodeRuntime
+from codec import SUPPORTED
+from batching import WriteCoalescer
+from wal import open_wal
+from storage import open_store
+from render import RenderLoop, DataView, LogView, ConflictPanel
+from conflicts import ConflictStore
+from membership import rename
+from resolvers import ResolverTable
+from gossip import Gossip
+from metrics import Metrics, MetricsServer, watch_node
+from journal import EventJournal, INFO, WRITE, RECEIVE, CONFLICT, IGNORED, SYNC, RENAME, ERROR
 
 class NodeApp:
-    def __init__(self, root, node_id, all_nodes, port, peers):
+    def __init__(self, root, node_id, all_nodes, port, peers, coalesce_window=None, coalesce_max=256, data_dir=None, store_dir=None,
+                 resolvers=None, gossip=None, metrics_port=None, ingest=None, codecs=None):
         self.root = root
         self.node_id = node_id
         self.vc = VectorClock(node_id, all_nodes)
-        self.data = {}
+        self.tree = MerkleTree()
+        self.journal = EventJournal(registry=self.vc.registry)
+        self.metrics = Metrics()
+        self.conflicts = ConflictStore()
+        # Stratégie par préfixe de clé ; "manual" envoie le conflit dans le panneau de résolution
+        self.resolvers = ResolverTable(resolvers, default="manual")
+        # Index causal des horloges stockées (changed_since / concurrent_with)
+        self.history = CausalIndex()
+        # Application des écritures par partitions de clés : les threads de réception ne se
+        # croisent que sur une même partition
+        self.engine = ApplyEngine(self)
+        self.data = open_store(self, store_dir)
         self.port = port
         self.peers = peers  # [(host, port)]
+        # Ingestion sur processus des grands lots (rattrapage après partition), désactivée par défaut
+        self.ingest = IngestPool(**ingest) if ingest is not None else None
+        # Traitement sur un petit pool : self.engine sérialise les écritures d'une même partition.
+        # codecs : encodages proposés aux pairs, ["json"] pour se passer du binaire (cf. codec.SUPPORTED)
+        self.runtime = NodeRuntime('localhost', port, self.handle_message, on_send_error=self.on_send_error,
+                                   executor=ThreadPoolExecutor(max_workers=4), metrics=self.metrics, ingest=self.ingest,
+                                   codecs=codecs or SUPPORTED)
+        # Fenêtre de regroupement des écritures sortantes (en secondes), désactivée par défaut
+        self.coalescer = None
+        if coalesce_window is not None:
+            self.coalescer = WriteCoalescer(self.runtime, self.send_batch, coalesce_window, coalesce_max)
+        # Mode gossip : {"fanout": 3, "interval": 1.0, "view_size": 8, "ttl": 6} ; peers sert de vue initiale
+        self.gossip = None
+        if gossip is not None:
+            self.gossip = Gossip(self, peers, create_gossip_message, self.reconcile_with, address=("localhost", port),
+                                 apply=self.apply_gossip, **gossip)
+        # Journal d'écritures sur disque, désactivé par défaut
+        self.wal = None
+        replayed = 0
+        if data_dir is not None:
+            self.wal, replayed = open_wal(self, data_dir)
+            # Un renommage rejoué peut concerner ce nœud
+            self.node_id = self.vc.node_id
 
         self.setup_ui()
-        threading.Thread(target=self.listen, daemon=True).start()
+        self.root.protocol("WM_DELETE_WINDOW", self.close)
+        if self.wal is not None:
+            self.log_event(f"💾 État restauré : {len(self.data)} clé(s), {replayed} écriture(s) rejouée(s)", "blue")
+        self.runtime.start()
+        if self.gossip is not None:
+            self.gossip.start()
+        # Métriques et profilage : http://localhost:<metrics_port>/metrics, /profile/start...
+        watch_node(self.metrics, self)
+        self.metrics_server = None
+        if metrics_port is not None:
+            self.metrics_server = MetricsServer(self.metrics, metrics_port).start()
 
     def setup_ui(self):
         self.root.title(f"Nœud {self.node_id}")
@@ -35,7 +96,8 @@ class NodeApp:
 
         ttk.Button(frm_input, text="Enregistrer", command=self.set_key).grid(row=0, column=4, padx=10)
         ttk.Button(frm_input, text="Synchroniser", command=self.broadcast_data).grid(row=0, column=5)
-        ttk.Button(frm_input, text="📝 Renommer", command=self.rename_node).grid(row=0, column=6, padx=5)
+        ttk.Button(frm_input, text="Réconcilier", command=self.reconcile).grid(row=0, column=6, padx=(5, 0))
+        ttk.Button(frm_input, text="📝 Renommer", command=self.rename_node).grid(row=0, column=7, padx=5)
 
         self.clock_label = ttk.Label(self.root, text="", font=("Courier", 10))
         self.clock_label.pack(pady=5)
@@ -43,75 +105,177 @@ class NodeApp:
         frm_data = ttk.LabelFrame(self.root, text="Données stockées", padding=(10, 5))
         frm_data.pack(fill="both", expand=True, padx=10, pady=5)
 
-        self.data_display = tk.Text(frm_data, height=8, wrap="none", bg="#f0f0f0")
-        self.data_display.pack(fill="both", expand=True)
+        # Vue virtualisée : seules les lignes visibles sont dessinées
+        self.data_view = DataView(frm_data, self.row_for, height=8)
+        self.data_view.pack(fill="both", expand=True)
 
         frm_log = ttk.LabelFrame(self.root, text="Journal des événements", padding=(10, 5))
         frm_log.pack(fill="both", expand=True, padx=10, pady=5)
 
-        self.log_display = tk.Text(frm_log, height=6, wrap="word", bg="#fff8dc", fg="black")
-        self.log_display.pack(fill="both", expand=True)
+        frm_log_buttons = ttk.Frame(frm_log)
+        frm_log_buttons.pack(anchor="e")
+        self.conflict_button = ttk.Button(frm_log_buttons, text="⚠️ Conflits (0)", command=self.show_conflicts)
+        self.conflict_button.pack(side="left", padx=5)
+        ttk.Button(frm_log_buttons, text="💾 Exporter", command=self.export_journal).pack(side="left")
+        self.log_view = LogView(frm_log, self.journal, height=6)
+        self.log_view.pack(fill="both", expand=True)
 
+        # Panneau de résolution des conflits : fenêtre unique, masquée tant qu'on ne l'ouvre pas
+        self.conflict_window = tk.Toplevel(self.root)
+        self.conflict_window.title("Conflits en attente")
+        self.conflict_window.protocol("WM_DELETE_WINDOW", self.conflict_window.withdraw)
+        self.conflict_window.withdraw()
+        self.conflict_panel = ConflictPanel(self.conflict_window, self.conflicts, self.resolve_conflicts)
+        self.conflict_panel.pack(fill="both", expand=True, padx=10, pady=10)
+
+        self.ui = RenderLoop(self.root, self.render)
+        self.data_view.load(self.data.keys())
         self.refresh_ui()
 
-    def refresh_ui(self):
+    def refresh_ui(self, rows=False):
+        # Appelable depuis n'importe quel thread : le rendu a lieu à la prochaine trame Tk
+        self.ui.refresh(rows)
+
+    def render(self, keys, rows):
         self.clock_label.config(text=f"🕒 Horloge vectorielle locale : {self.vc}")
-        self.data_display.delete("1.0", tk.END)
-        for k, v in self.data.items():
-            val = v['value']
-            clock = v['clock']
-            self.data_display.insert(tk.END, f"{k:<10} = {val:<10}  |  horloge: {clock}\n")
-
-    def log_event(self, msg, color="black"):
-        self.log_display.insert(tk.END, f"{msg}\n", ("tag",))
-        self.log_display.tag_config("tag", foreground=color)
-        self.log_display.see(tk.END)
-
-    def listen(self):
-        s = socket.socket()
-        s.bind(('localhost', self.port))
-        s.listen()
-        while True:
-            conn, _ = s.accept()
-            data = conn.recv(4096)
-            if data:
-                msg = parse_message(data)
-                self.handle_message(msg)
+        self.data_view.update(keys, full=rows)
+        self.log_view.render()
+        self.conflict_panel.render()
+        self.conflict_button.config(text=f"⚠️ Conflits ({len(self.conflicts)})")
+
+    def row_for(self, key):
+        entry = self.data.get(key)
+        if entry is None:
+            return None
+        value = entry["value"]
+        conflict = self.conflicts.get(key)
+        if conflict is not None:
+            value = f"{value} ⚠️ {len(conflict.remotes) + 1} versions"
+        return key, value, self.vc.registry.decode(entry["clock"])
+
+    def log_event(self, msg, color="black", kind=INFO, key=None, sender=None, clock=None):
+        self.journal.record(kind, msg, key=key, sender=sender, clock=clock, color=color)
+        self.metrics.inc("events_total", kind=kind)
+        self.ui.refresh()
+
+    def export_journal(self):
+        path = filedialog.asksaveasfilename(title="Exporter le journal", defaultextension=".jsonl",
+                                            initialfile=f"journal_{self.node_id}.jsonl")
+        if path:
+            count = self.journal.export(path)
+            self.log_event(f"💾 Journal exporté : {count} événement(s) → {path}", "blue")
 
     def handle_message(self, msg):
         if msg.get("type") == "rename":
             old_id = msg["old_id"]
             new_id = msg["new_id"]
-            self.vc.rename_node(old_id, new_id)
-            self.log_event(f"🔄 Nœud renommé (reçu) : {old_id} → {new_id}", "purple")
+            with self.engine.exclusive():
+                rename(self, old_id, new_id, self.conflicts.clocks())
+            if self.wal is not None:
+                self.wal.append("rename", old_id, new_id)
+            self.log_event(f"🔄 Nœud renommé (reçu) : {old_id} → {new_id}", "purple", kind=RENAME)
+            self.refresh_ui(rows=True)
+            return
+
+        if msg.get("type") == "sync_request":
+            self.handle_sync_request(msg)
+            return
+        if msg.get("type") == "sync_response":
+            self.handle_sync_response(msg)
+            return
+        if msg.get("type") == "gossip":
+            if self.gossip is not None:
+                self.gossip.receive(msg)
+            else:
+                self.apply_gossip(msg["sender"], msg["entries"])
+            return
+        if msg.get("type") == "batch":
+            self.engine.apply_batch(msg["sender"], msg["entries"])
+            self.log_event(f"📦 Lot de {len(msg['entries'])} écriture(s) reçu de {msg['sender']}", "green", kind=RECEIVE, sender=msg["sender"])
             self.refresh_ui()
             return
 
-        sender = msg["sender"]
-        clock = msg["clock"]
-        key = msg["key"]
-        value = msg["value"]
-
-        conflict = False
-        if key in self.data:
-            existing_clock = self.data[key]["clock"]
-            if not self.vc.happens_before(clock) and not self.happens_after(clock, existing_clock):
-                conflict = True
-
-        if conflict:
-            self.log_event(f"⚠️ Conflit sur '{key}' avec {sender}. Remplacement par la version reçue.", "red")
-            messagebox.showwarning("Conflit détecté", f"Conflit sur la clé '{key}' avec {sender}")
-            self.data[key] = {"value": value, "clock": clock}
+        self.engine.apply(msg["sender"], msg["key"], msg["value"], self.vc.registry.encode(msg["clock"]))
+        self.refresh_ui()
+
+    def apply_gossip(self, sender, entries):
+        if entries:
+            self.engine.apply_batch(sender, entries)
+            self.log_event(f"📣 Rumeur de {len(entries)} écriture(s) reçue de {sender}", "green", kind=RECEIVE, sender=sender)
+            self.refresh_ui()
+
+    def apply(self, sender, key, value, clock, order, merge=True):
+        # Appelé par self.engine, sous le verrou de la partition de key
+        if order == CONCURRENT:
+            local = self.data[key]
+            policy, resolved = self.resolvers.resolve(key, (local["value"], local["clock"]), (value, clock), self.vc.registry)
+            self.engine.merge(clock)
+            if resolved is not None:
+                if resolved[1] is not local["clock"]:
+                    self.store(key, *resolved)
+                self.log_event(f"🤝 Conflit sur '{key}' avec {sender} résolu ({policy}) : {resolved[0]}", "purple", kind=CONFLICT, key=key, sender=sender, clock=resolved[1])
+                return
+            # Stratégie manuelle : les deux versions sont gardées en attente ; la résolution se fait depuis le panneau
+            self.conflicts.add(key, local["value"], local["clock"], sender, value, clock)
+            self.ui.touch(key)
+            self.log_event(f"⚠️ Conflit sur '{key}' avec {sender} : en attente de résolution.", "red", kind=CONFLICT, key=key, sender=sender, clock=clock)
+        elif order == AFTER:
+            if merge:
+                self.engine.update(clock)
+            self.store(key, value, clock)
+            self.log_event(f"✅ Donnée reçue : {key} = {value} de {sender}", "green", kind=RECEIVE, key=key, sender=sender, clock=clock)
         else:
-            self.vc.update(clock)
-            self.data[key] = {"value": value, "clock": clock}
-            self.log_event(f"✅ Donnée reçue : {key} = {value} de {sender}", "green")
+            self.log_event(f"↩️ Version déjà connue de '{key}' ignorée ({sender})", "gray", kind=IGNORED, key=key, sender=sender, clock=clock)
 
-        self.refresh_ui()
+    def store(self, key, value, clock):
+        self.data[key] = {"value": value, "clock": clock}
+        self.history.update(key, clock)
+        if key in self.conflicts:
+            self.conflicts.settle(key, value, clock)
+        wire_clock = self.vc.registry.decode(clock)
+        self.tree.update(key, value, wire_clock)
+        if self.wal is not None:
+            self.wal.append("put", key, value, wire_clock)
+        self.ui.touch(key)
+
+    def handle_sync_request(self, msg):
+        host, port = msg["reply_to"]
+        if msg.get("tree") is not None:
+            self.handle_tree_step(host, port, msg["tree"])
+            return
+        delta = delta_for(self.data, self.vc.registry.encode(msg["clock"]), self.vc.registry, self.history)
+        reply = create_sync_response(self.node_id, delta, clock=self.vc.to_dict(), reply_to=("localhost", self.port))
+        self.runtime.send(host, port, reply)
+        self.log_event(f"🔁 Synchronisation demandée par {msg['sender']} : {len(delta)} entrée(s) envoyée(s)", "purple", kind=SYNC, sender=msg["sender"])
 
-    def happens_after(self, c1, c2):
-        return all(c1.get(k, 0) >= c2.get(k, 0) for k in c1) and any(c1.get(k, 0) > c2.get(k, 0) for k in c1)
+    def handle_sync_response(self, msg):
+        sender = msg["sender"]
+        if msg.get("clock") is not None:
+            # Le pair attend en retour ce qu'il n'a pas encore vu (calculé avant d'appliquer sa réponse)
+            host, port = msg["reply_to"]
+            delta = delta_for(self.data, self.vc.registry.encode(msg["clock"]), self.vc.registry, self.history)
+            if delta:
+                self.runtime.send(host, port, create_sync_response(self.node_id, delta))
+        if msg.get("buckets") is not None:
+            host, port = msg["reply_to"]
+            entries = entries_for(self.data, self.tree.keys_in(msg["buckets"]), self.vc.registry)
+            self.runtime.send(host, port, create_sync_response(self.node_id, entries))
+        self.engine.apply_batch(sender, msg["data"])
+        self.log_event(f"🔁 Synchronisation avec {sender} : {len(msg['data'])} entrée(s) reçue(s)", "purple", kind=SYNC, sender=sender)
+        self.refresh_ui()
 
+    def handle_tree_step(self, host, port, tree_msg):
+        # Descente uniquement dans les sous-arbres dont les condensés diffèrent
+        level, mismatched = self.tree.diverging(tree_msg)
+        if not mismatched:
+            return
+        if level < self.tree.depth:
+            reply = create_sync_request(self.node_id, reply_to=("localhost", self.port),
+                                        tree=self.tree.descend(level, mismatched))
+        else:
+            entries = entries_for(self.data, self.tree.keys_in(mismatched), self.vc.registry)
+            reply = create_sync_response(self.node_id, entries, reply_to=("localhost", self.port), buckets=mismatched)
+        self.runtime.send(host, port, reply)
 
     def set_key(self):
         key = self.key_entry.get().strip()
@@ -119,22 +283,84 @@ class NodeApp:
         if not key or not value:
             messagebox.showinfo("Entrée invalide", "Veuillez remplir les deux champs.")
             return
-        self.vc.increment()
-        clock = self.vc.to_dict()
-        self.data[key] = {"value": value, "clock": clock}
-        self.log_event(f"📤 Mise à jour locale : {key} = {value}", "blue")
+        with self.engine.locked([key]):
+            self.absorb_conflicts([key])
+            clock = self.engine.tick()
+            self.store(key, value, clock)
+        wire_clock = self.vc.registry.decode(clock)
+        self.log_event(f"📤 Mise à jour locale : {key} = {value}", "blue", kind=WRITE, key=key, clock=clock)
+        self.refresh_ui()
+
+        if self.coalescer is not None:
+            self.coalescer.add(key, value, wire_clock)
+            return
+        if self.gossip is not None:
+            self.gossip.publish([[key, value, wire_clock]])
+            return
+        msg = create_message(self.node_id, wire_clock, key, value, msg_type="data")
+        self.runtime.broadcast(self.peers, msg)
+
+    def set_many(self, items):
+        # Un seul événement d'horloge pour l'ensemble des clés écrites
+        items = dict(items)
+        entries = []
+        with self.engine.locked(items):
+            self.absorb_conflicts(items)
+            clock = self.engine.tick()
+            wire_clock = self.vc.registry.decode(clock)
+            for key, value in items.items():
+                self.store(key, value, clock)
+                entries.append([key, value, wire_clock])
+        self.log_event(f"📤 Mise à jour locale groupée : {len(entries)} clé(s)", "blue", kind=WRITE, clock=clock)
         self.refresh_ui()
+        if self.coalescer is not None:
+            for key, value, _ in entries:
+                self.coalescer.add(key, value, wire_clock)
+        elif entries:
+            self.send_batch(entries)
 
-        msg = create_message(self.node_id, clock, key, value, msg_type="data")
-        for host, port in self.peers:
-            self.send_message(host, port, msg)
+    def absorb_conflicts(self, keys):
+        # Écrire une clé en conflit la résout : la nouvelle version doit dominer toutes ses sœurs
+        for key in keys:
+            conflict = self.conflicts.take(key)
+            if conflict is not None:
+                self.engine.merge(conflict.merged_clock())
+
+    def show_conflicts(self):
+        self.conflict_window.deiconify()
+        self.conflict_window.lift()
+
+    def resolve_conflicts(self, keys, choice):
+        items = {}
+        for key in keys:
+            conflict = self.conflicts.get(key)
+            if conflict is not None:
+                items[key] = conflict.value if choice == "local" else conflict.latest_remote()
+        if items:
+            self.set_many(items.items())
+            label = "version locale" if choice == "local" else "version distante"
+            self.log_event(f"🛠️ {len(items)} conflit(s) résolu(s) : {label} conservée", "purple", kind=CONFLICT)
+
+    def send_batch(self, entries):
+        if self.gossip is not None:
+            self.gossip.publish(entries)
+            return
+        self.runtime.broadcast(self.peers, create_batch_message(self.node_id, entries))
 
     def broadcast_data(self):
-        for key, val in self.data.items():
-            msg = create_message(self.node_id, val["clock"], key, val["value"], msg_type="data")
-            for host, port in self.peers:
-                self.send_message(host, port, msg)
-        self.log_event("🔁 Synchronisation forcée avec les pairs", "purple")
+        # Échange de résumés : seules les entrées non vues par chaque côté circulent
+        msg = create_sync_request(self.node_id, self.vc.to_dict(), reply_to=("localhost", self.port))
+        self.runtime.broadcast(self.peers, msg)
+        self.log_event("🔁 Synchronisation forcée avec les pairs", "purple", kind=SYNC)
+
+    def reconcile_with(self, host, port):
+        msg = create_sync_request(self.node_id, reply_to=("localhost", self.port), tree=self.tree.start())
+        self.runtime.send(host, port, msg)
+
+    def reconcile(self):
+        msg = create_sync_request(self.node_id, reply_to=("localhost", self.port), tree=self.tree.start())
+        self.runtime.broadcast(self.peers, msg)
+        self.log_event("🌳 Réconciliation par arbre de Merkle lancée", "purple", kind=SYNC)
 
     def rename_node(self):
         new_id = simpledialog.askstring("Renommer le nœud", "Nouveau nom du nœud :")
@@ -143,22 +369,36 @@ class NodeApp:
             new_id = new_id.strip()
 
             self.node_id = new_id
-            self.vc.rename_node(old_id, new_id)
+            with self.engine.exclusive():
+                rename(self, old_id, new_id, self.conflicts.clocks())
+            if self.wal is not None:
+                self.wal.append("rename", old_id, new_id)
             self.root.title(f"Nœud {self.node_id}")
-            self.refresh_ui()
-            self.log_event(f"🔧 Nom modifié localement : {old_id} → {new_id}", "blue")
+            self.refresh_ui(rows=True)
+            self.log_event(f"🔧 Nom modifié localement : {old_id} → {new_id}", "blue", kind=RENAME)
 
             msg = create_rename_message(old_id, new_id)
-            for host, port in self.peers:
-                self.send_message(host, port, msg)
+            self.runtime.broadcast(self.peers, msg)
         else:
             messagebox.showinfo("Renommage", "Aucun changement effectué.")
 
+    def close(self):
+        if self.metrics_server is not None:
+            self.metrics_server.stop()
+        if self.gossip is not None:
+            self.gossip.stop()
+        self.runtime.stop()
+        if self.ingest is not None:
+            self.ingest.close()
+        if self.wal is not None:
+            self.wal.close()
+        self.data.close()
+        self.root.destroy()
+
     def send_message(self, host, port, msg):
-        try:
-            s = socket.socket()
-            s.connect((host, port))
-            s.send(msg)
-            s.close()
-        except:
-            self.log_event(f"❌ Erreur d'envoi vers {host}:{port}", "gray")
+        self.runtime.send(host, port, msg)
+
+    def on_send_error(self, host, port, error):
+        self.log_event(f"❌ Erreur d'envoi vers {host}:{port}", "gray", kind=ERROR)
+        if self.gossip is not None:
+            self.gossip.remove(host, port)
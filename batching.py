@@ -0,0 +1,51 @@
+import threading
+
+
+class WriteCoalescer:
+    # Regroupe les écritures locales pendant une fenêtre (en secondes) ou jusqu'à
+    # max_entries clés, puis les confie à flush_fn sous forme d'un seul lot.
+    # Deux écritures de la même clé dans la fenêtre : seule la dernière part.
+    def __init__(self, runtime, flush_fn, window=0.005, max_entries=256):
+        self.runtime = runtime
+        self.flush_fn = flush_fn
+        self.window = window
+        self.max_entries = max_entries
+        self.pending = {}
+        self.lock = threading.Lock()
+        # Fenêtre ouverte (numéro, incrémenté à chaque vidage) et son minuteur
+        self.generation = 0
+        self.timer = None
+
+    def add(self, key, value, clock):
+        with self.lock:
+            self.pending.pop(key, None)
+            self.pending[key] = (value, clock)
+            size = len(self.pending)
+            generation = self.generation
+        if size >= self.max_entries:
+            self.flush()
+        elif size == 1:
+            self.runtime.loop.call_soon_threadsafe(self._arm, generation)
+
+    def _arm(self, generation):
+        # Sur la boucle : minuteur de la fenêtre, sauf si elle a déjà été vidée entre-temps
+        timer = self.runtime.loop.call_later(self.window, self.flush, generation)
+        with self.lock:
+            if generation == self.generation:
+                self.timer = timer
+                return
+        if timer is not None:
+            timer.cancel()
+
+    def flush(self, generation=None):
+        # generation : vidage par le minuteur de cette fenêtre, sans effet sur les suivantes
+        with self.lock:
+            if generation is not None and generation != self.generation:
+                return
+            pending, self.pending = self.pending, {}
+            self.generation += 1
+            timer, self.timer = self.timer, None
+        if timer is not None:
+            self.runtime.loop.call_soon_threadsafe(timer.cancel)
+        if pending:
+            self.flush_fn([[key, value, clock] for key, (value, clock) in pending.items()])
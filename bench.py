@@ -0,0 +1,208 @@
+import argparse
+import json
+import platform
+import time
+
+from vector_clock import VectorClock
+from message import create_message, encode_message, parse_message
+from codec import BinaryEncoder, Decoder
+from node import Node
+from simulate import SimNetwork
+
+BASELINE = "bench_baseline.json"
+NODES = (3, 10, 100, 1000)
+KEYS = (100, 10000)
+VALUE_SIZES = (16, 1024)
+MIN_TIME = 0.05
+REPEAT = 3
+# Au-delà de ce rapport au temps de référence, le cas est signalé comme une régression
+THRESHOLD = 1.2
+
+
+def names(count):
+    return [f"N{i}" for i in range(count)]
+
+
+def clock_of(count, ts=1):
+    return {name: ts for name in names(count)}
+
+
+class QuietNode(Node):
+    def log_event(self, msg, **kwargs):
+        pass
+
+
+# --- Cas mesurés : setup(**paramètres) -> prepare(number) -> fonction appelée `number` fois ---
+def repeated(fn):
+    return lambda number: fn
+
+
+def bench_increment(nodes):
+    return repeated(VectorClock("N0", names(nodes)).increment)
+
+
+def bench_update(nodes):
+    # Horloge reçue sous forme de dict, comme à la sortie du décodeur
+    vc = VectorClock("N0", names(nodes))
+    received = clock_of(nodes)
+    return repeated(lambda: vc.update(received))
+
+
+def bench_happens_before(nodes):
+    vc = VectorClock("N0", names(nodes))
+    vc.update(clock_of(nodes))
+    later = clock_of(nodes, 2)
+    return repeated(lambda: vc.happens_before(later))
+
+
+def bench_to_dict(nodes):
+    vc = VectorClock("N0", names(nodes))
+    vc.update(clock_of(nodes))
+    return repeated(vc.to_dict)
+
+
+def bench_roundtrip_json(nodes, value_size):
+    clock = clock_of(nodes)
+    value = "x" * value_size
+    return repeated(lambda: parse_message(encode_message(create_message("N1", clock, "key", value))))
+
+
+def bench_roundtrip_binary(nodes, value_size):
+    # Régime établi d'une connexion : les noms de nœuds ont déjà été transmis
+    encoder, decoder = BinaryEncoder(), Decoder()
+    clock = clock_of(nodes)
+    value = "x" * value_size
+    decoder.decode(encoder.encode(create_message("N1", clock, "key", value)))
+    return repeated(lambda: decoder.decode(encoder.encode(create_message("N1", clock, "key", value))))
+
+
+def bench_apply(nodes, keys, value_size):
+    # Application de messages "data" plus récents que la version locale (chemin AFTER) ; les
+    # messages sont préparés hors mesure, avec des compteurs croissants d'un essai à l'autre
+    node = QuietNode("N0", names(nodes), 0, [], runtime_factory=SimNetwork().runtime)
+    value = "x" * value_size
+    base = clock_of(nodes)
+    for i in range(keys):
+        node.handle_message(create_message("N1", base, f"k{i}", value))
+    sent = [1]
+
+    def prepare(number):
+        first = sent[0]
+        sent[0] += number
+        messages = iter([create_message("N1", dict(base, N1=first + 1 + n), f"k{n % keys}", value)
+                         for n in range(number)])
+        return lambda: node.handle_message(next(messages))
+    return prepare
+
+
+CASES = [
+    ("increment", bench_increment, {"nodes": NODES}),
+    ("update", bench_update, {"nodes": NODES}),
+    ("happens_before", bench_happens_before, {"nodes": NODES}),
+    ("to_dict", bench_to_dict, {"nodes": NODES}),
+    ("roundtrip_json", bench_roundtrip_json, {"nodes": NODES, "value_size": VALUE_SIZES}),
+    ("roundtrip_binary", bench_roundtrip_binary, {"nodes": NODES, "value_size": VALUE_SIZES}),
+    ("apply", bench_apply, {"nodes": NODES, "keys": KEYS, "value_size": VALUE_SIZES}),
+]
+
+
+def grid(params):
+    combos = [{}]
+    for name, values in params.items():
+        combos = [dict(c, **{name: v}) for c in combos for v in values]
+    return combos
+
+
+def case_id(name, params):
+    return f"{name}[{','.join(f'{k}={v}' for k, v in params.items())}]"
+
+
+def measure(setup, params, min_time=MIN_TIME, repeat=REPEAT):
+    # Nombre d'itérations doublé jusqu'à min_time, puis meilleur de `repeat` essais (ns/opération)
+    prepare = setup(**params)
+    number = 1
+    while True:
+        elapsed = run_once(prepare, number)
+        if elapsed >= min_time:
+            break
+        number *= 2
+    best = min([elapsed] + [run_once(prepare, number) for _ in range(repeat - 1)])
+    return best / number * 1e9
+
+
+def run_once(prepare, number):
+    fn = prepare(number)
+    start = time.perf_counter()
+    for _ in range(number):
+        fn()
+    return time.perf_counter() - start
+
+
+def run(only=None, limits=None, min_time=MIN_TIME):
+    # only : noms de cas à garder ; limits : {"nodes": (3, 100)...} restreint les grilles
+    results = {}
+    for name, setup, params in CASES:
+        if only and name not in only:
+            continue
+        params = {k: [v for v in values if not limits or k not in limits or v in limits[k]]
+                  for k, values in params.items()}
+        for combo in grid(params):
+            key = case_id(name, combo)
+            results[key] = measure(setup, combo, min_time)
+            print(f"{key:<55} {format_ns(results[key]):>12}", flush=True)
+    return {"meta": {"python": platform.python_version(), "platform": platform.platform(),
+                     "date": time.strftime("%Y-%m-%d %H:%M:%S")},
+            "results": results}
+
+
+def format_ns(ns):
+    if ns >= 1e6:
+        return f"{ns / 1e6:.2f} ms"
+    if ns >= 1e3:
+        return f"{ns / 1e3:.2f} µs"
+    return f"{ns:.0f} ns"
+
+
+def compare(current, baseline, threshold=THRESHOLD):
+    # Rend les cas plus lents que la référence au-delà du seuil
+    slower = []
+    print(f"\n📊 Comparaison avec la référence du {baseline['meta']['date']} ({baseline['meta']['python']})")
+    for key, ns in current["results"].items():
+        ref = baseline["results"].get(key)
+        if ref is None:
+            continue
+        ratio = ns / ref
+        mark = "⚠️" if ratio > threshold else ("🚀" if ratio < 1 / threshold else "  ")
+        print(f"{mark} {key:<55} {format_ns(ref):>12} → {format_ns(ns):>12}  ×{ratio:.2f}")
+        if ratio > threshold:
+            slower.append(key)
+    return slower
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Micro-benchmarks des horloges et des messages")
+    parser.add_argument("cases", nargs="*", help=f"cas à lancer parmi : {', '.join(n for n, _, _ in CASES)}")
+    parser.add_argument("--nodes", help="nombres de nœuds, ex. 3,100")
+    parser.add_argument("--keys", help="nombres de clés, ex. 100")
+    parser.add_argument("--value-size", help="tailles de valeur en octets, ex. 16")
+    parser.add_argument("--min-time", type=float, default=MIN_TIME, help="durée minimale d'une mesure (s)")
+    parser.add_argument("--json", help="écrit les résultats dans ce fichier")
+    parser.add_argument("--compare", nargs="?", const=BASELINE, help="compare à une référence")
+    parser.add_argument("--save-baseline", nargs="?", const=BASELINE, help="enregistre les résultats comme référence")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    limits = {name: [int(v) for v in getattr(args, attr).split(",")]
+              for name, attr in (("nodes", "nodes"), ("keys", "keys"), ("value_size", "value_size"))
+              if getattr(args, attr)}
+    current = run(args.cases, limits, args.min_time)
+    for path in (args.json, args.save_baseline):
+        if path:
+            with open(path, "w") as f:
+                json.dump(current, f, indent=2, sort_keys=True)
+    if args.compare:
+        with open(args.compare) as f:
+            slower = compare(current, json.load(f))
+        raise SystemExit(1 if slower else 0)
@@ -0,0 +1,128 @@
+import bisect
+import threading
+from itertools import zip_longest
+
+from vector_clock import compare_many, CONCURRENT
+
+SLACK = 1024
+
+
+class SlotLog:
+    # Compteurs d'un emplacement du registre : dernier compteur de chaque clé et journal des
+    # (compteur, clé) en ajout seul, trié à la lecture (timsort fusionne le préfixe déjà trié et
+    # la fin). Les paires périmées, réécrites depuis, sont écartées à la lecture et purgées quand
+    # elles dépassent le nombre de clés vivantes.
+    def __init__(self):
+        self.current = {}  # clé -> compteur
+        self.log = []
+        self.sorted = 0  # longueur du préfixe trié de log
+
+    def compact(self):
+        if len(self.log) > 2 * len(self.current) + SLACK:
+            self.log = sorted((ts, key) for key, ts in self.current.items())
+            self.sorted = len(self.log)
+
+    def above(self, ts):
+        # Clés dont le compteur dépasse ts
+        if self.sorted < len(self.log):
+            self.log.sort()
+            self.sorted = len(self.log)
+        current = self.current
+        # (ts + 1,) précède toute paire (ts + 1, clé) : premier compteur au-delà de ts
+        start = bisect.bisect_left(self.log, (ts + 1,))
+        return [key for counter, key in self.log[start:] if current.get(key) == counter]
+
+    def __len__(self):
+        return len(self.current)
+
+
+class CausalIndex:
+    # Index des horloges stockées : pour chaque emplacement du registre, liste triée des
+    # (compteur, clé) non nuls. "Quelles clés ont changé depuis l'horloge C" se lit alors comme
+    # l'union des suffixes au-delà de C[i], sans parcourir toutes les clés.
+    def __init__(self):
+        self.slots = []  # emplacement -> SlotLog
+        self.clocks = {}  # clé -> horloge indexée (emplacements modifiés par la version suivante)
+        self.appended = 0
+        # () -> (clé, horloge) : reconstruction différée à la première requête (cf. storage.py)
+        self.source = None
+        self.lock = threading.Lock()
+
+    def update(self, key, clock):
+        with self.lock:
+            self._update(key, clock)
+
+    def _update(self, key, clock):
+        # Seuls les emplacements dont le compteur change sont touchés : une nouvelle version ne
+        # diffère en général de la précédente que par quelques compteurs
+        old = self.clocks.get(key, ())
+        self.clocks[key] = clock
+        slots = self.slots
+        while len(clock) > len(slots):
+            slots.append(SlotLog())
+        # Boucle chaude du rattrapage : SlotLog manipulé directement
+        for idx, (before, after) in enumerate(zip_longest(old, clock, fillvalue=0)):
+            if before != after:
+                slot = slots[idx]
+                if after:
+                    slot.current[key] = after
+                    slot.log.append((after, key))
+                    self.appended += 1
+                else:
+                    slot.current.pop(key, None)
+        if self.appended > SLACK * max(len(slots), 1):
+            self.appended = 0
+            for slot in slots:
+                slot.compact()
+
+    def remove(self, key):
+        # Clé effacée localement : ses paires restent dans les journaux, écartées à la lecture
+        with self.lock:
+            for idx, ts in enumerate(self.clocks.pop(key, ())):
+                if ts:
+                    self.slots[idx].current.pop(key, None)
+
+    def rebuild(self, items):
+        # items : (clé, horloge) ; après un effacement de compteurs (collecte, repli de renommage)
+        with self.lock:
+            self.slots = []
+            self.clocks = {}
+            self.appended = 0
+            self.source = None
+        for key, clock in items:
+            self.update(key, clock)
+
+    def defer(self, source):
+        # Reconstruction à la première requête ; les écritures d'ici là sont indexées normalement,
+        # source() les relit à l'identique ou plus récentes
+        with self.lock:
+            self.source = source
+
+    def _build(self):
+        if self.source is not None:
+            source, self.source = self.source, None
+            for key, clock in source():
+                self._update(key, clock)
+
+    def clock_of(self, key):
+        # Ce que l'écrivain connaissait au moment d'écrire la version stockée de key
+        with self.lock:
+            self._build()
+            return self.clocks.get(key)
+
+    def changed_since(self, clock):
+        # Clés dont la version n'est pas causalement couverte par clock (postérieures ou concurrentes)
+        changed = set()
+        with self.lock:
+            self._build()
+            for idx, slot in enumerate(self.slots):
+                changed.update(slot.above(clock[idx] if idx < len(clock) else 0))
+        return changed
+
+    def concurrent_with(self, clock):
+        # Parmi les clés non couvertes par clock, celles qui ne la dominent pas non plus
+        candidates = list(self.changed_since(clock))
+        with self.lock:
+            clocks = [self.clocks.get(key, clock) for key in candidates]
+        orders = compare_many(clocks, [clock] * len(clocks))
+        return {key for key, order in zip(candidates, orders) if order == CONCURRENT}
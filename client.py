@@ -0,0 +1,118 @@
+import itertools
+import json
+import socket
+import threading
+
+from transport import HEADER, recv_frame
+
+
+class ClientError(Exception):
+    pass
+
+
+class Client:
+    # Client du protocole local (service.py) ; address = (hôte, port) ou chemin de socket Unix.
+    # Chaque appel attend sa réponse ; pipeline() envoie un lot de requêtes d'un bloc.
+    def __init__(self, address, timeout=10):
+        if isinstance(address, str):
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.sock.settimeout(timeout)
+            self.sock.connect(address)
+        else:
+            self.sock = socket.create_connection(tuple(address), timeout)
+            self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.ids = itertools.count(1)
+        self.lock = threading.Lock()
+
+    def request(self, requests):
+        # Envoie toutes les requêtes puis lit les réponses, dans le même ordre
+        requests = [dict(r, id=next(self.ids)) for r in requests]
+        payload = b"".join(HEADER.pack(len(raw)) + raw for raw in (json.dumps(r).encode() for r in requests))
+        with self.lock:
+            self.sock.sendall(payload)
+            replies = []
+            for sent in requests:
+                frame = recv_frame(self.sock)
+                if frame is None:
+                    raise ConnectionError("Connexion fermée par le nœud")
+                reply = json.loads(frame.decode())
+                if reply.get("id") != sent["id"]:
+                    raise ClientError(f"Réponse désynchronisée : {reply.get('id')} au lieu de {sent['id']}")
+                replies.append(reply)
+        errors = [reply["error"] for reply in replies if not reply["ok"]]
+        if errors:
+            raise ClientError("; ".join(errors))
+        return [reply["result"] for reply in replies]
+
+    def call(self, op, **fields):
+        return self.request([make_request(op, **fields)])[0]
+
+    def get(self, key, r=None):
+        return self.call("get", key=key, r=r)
+
+    def set(self, key, value, w=None):
+        return self.call("set", key=key, value=value, w=w)
+
+    def mset(self, items):
+        return self.call("mset", items=[[k, v] for k, v in dict(items).items()])
+
+    def incr(self, key, amount=None):
+        return self.call("incr", key=key, amount=amount)
+
+    def scan(self, prefix="", start="", limit=None):
+        return self.call("scan", prefix=prefix, start=start, limit=limit)
+
+    def stats(self):
+        return self.call("stats")
+
+    def pipeline(self):
+        return Pipeline(self)
+
+    def close(self):
+        self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class Pipeline:
+    # Requêtes accumulées puis envoyées en une écriture : execute() rend les résultats dans l'ordre
+    def __init__(self, client):
+        self.client = client
+        self.requests = []
+
+    def add(self, op, **fields):
+        self.requests.append(make_request(op, **fields))
+        return self
+
+    def get(self, key, r=None):
+        return self.add("get", key=key, r=r)
+
+    def set(self, key, value, w=None):
+        return self.add("set", key=key, value=value, w=w)
+
+    def mset(self, items):
+        return self.add("mset", items=[[k, v] for k, v in dict(items).items()])
+
+    def incr(self, key, amount=None):
+        return self.add("incr", key=key, amount=amount)
+
+    def scan(self, prefix="", start="", limit=None):
+        return self.add("scan", prefix=prefix, start=start, limit=limit)
+
+    def stats(self):
+        return self.add("stats")
+
+    def execute(self):
+        requests, self.requests = self.requests, []
+        return self.client.request(requests) if requests else []
+
+    def __len__(self):
+        return len(self.requests)
+
+
+def make_request(op, **fields):
+    return {"op": op, **{name: value for name, value in fields.items() if value is not None}}
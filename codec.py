@@ -0,0 +1,265 @@
+import json
+import struct
+import sys
+import zlib
+from array import array
+
+try:
+    import lz4.frame as lz4
+except ImportError:
+    lz4 = None
+
+MAGIC = 0xB1
+FLAG_ZLIB = 0x01
+FLAG_LZ4 = 0x02
+COMPRESS_MIN = 1024
+
+T_NONE, T_FALSE, T_TRUE, T_INT, T_FLOAT, T_STR, T_LIST, T_DICT, T_CLOCK = range(9)
+FLOAT = struct.Struct("!d")
+
+# Champs de message portant une horloge : "clock" et le troisième élément des entrées
+# [clé, valeur, horloge] de "entries" / "data". Les autres dicts (valeurs utilisateur compris)
+# restent des dicts ordinaires.
+CLOCK_FIELD = "clock"
+ENTRY_FIELDS = ("entries", "data")
+
+# Largeur en octets -> code de tableau, pour les indices et compteurs d'horloge
+WIDTHS = {array(code).itemsize: code for code in "BHIQ"}
+
+JSON = "json"
+# bin2 : horloges en tableaux d'entiers à largeur fixe (bin1 : paires varint), non compatible
+BINARY = "bin2"
+# Par ordre de préférence. Le binaire donne des trames plus petites (noms de nœuds transmis une
+# fois par connexion, horloges en tableaux d'entiers) mais le reste s'encode en Python pur, alors que json est en C :
+# pour de petites valeurs sur un réseau rapide, codecs=[JSON] peut revenir moins cher en CPU.
+SUPPORTED = [BINARY, JSON]
+
+
+def negotiate(offered):
+    for name in SUPPORTED:
+        if name in offered:
+            return name
+    return JSON
+
+
+# --- Entiers à longueur variable ---
+def write_varint(out, n):
+    while n > 0x7F:
+        out.append((n & 0x7F) | 0x80)
+        n >>= 7
+    out.append(n)
+
+
+def width_of(n):
+    for width in (1, 2, 4):
+        if n < 1 << (8 * width):
+            return width
+    return 8
+
+
+def read_varint(buf, pos):
+    shift = result = 0
+    while True:
+        b = buf[pos]
+        pos += 1
+        result |= (b & 0x7F) << shift
+        if b < 0x80:
+            return result, pos
+        shift += 7
+
+
+class JsonCodec:
+    name = JSON
+
+    def encode(self, msg):
+        return json.dumps(msg).encode()
+
+
+class BinaryEncoder:
+    # État lié à une connexion sortante : chaque nom de nœud n'est transmis qu'une fois,
+    # les horloges circulent ensuite sous forme de tableaux d'indices et de compteurs.
+    name = BINARY
+
+    def __init__(self, compress_min=COMPRESS_MIN):
+        self.index = {}
+        self.compress_min = compress_min
+
+    def encode(self, msg):
+        body = bytearray()
+        defs = []
+        if isinstance(msg, dict):
+            self._write_message(body, msg, defs)
+        else:
+            self._write(body, msg, defs)
+        head = bytearray()
+        write_varint(head, len(defs))
+        for idx, name in defs:
+            raw = name.encode()
+            write_varint(head, idx)
+            write_varint(head, len(raw))
+            head += raw
+        payload = bytes(head + body)
+        flags = 0
+        if len(payload) >= self.compress_min:
+            if lz4 is not None:
+                payload, flags = lz4.compress(payload), FLAG_LZ4
+            else:
+                payload, flags = zlib.compress(payload, 1), FLAG_ZLIB
+        return bytes((MAGIC, flags)) + payload
+
+    def _name_index(self, name, defs):
+        idx = self.index.get(name)
+        if idx is None:
+            idx = self.index[name] = len(self.index)
+            defs.append((idx, name))
+        return idx
+
+    def _write_message(self, out, msg, defs):
+        out.append(T_DICT)
+        write_varint(out, len(msg))
+        for k, v in msg.items():
+            self._write(out, str(k), defs)
+            if k == CLOCK_FIELD and isinstance(v, dict):
+                self._write_clock(out, v, defs)
+            elif k in ENTRY_FIELDS and isinstance(v, list):
+                out.append(T_LIST)
+                write_varint(out, len(v))
+                for entry in v:
+                    if isinstance(entry, (list, tuple)) and len(entry) == 3 and isinstance(entry[2], dict):
+                        out.append(T_LIST)
+                        out.append(3)
+                        self._write(out, entry[0], defs)
+                        self._write(out, entry[1], defs)
+                        self._write_clock(out, entry[2], defs)
+                    else:
+                        self._write(out, entry, defs)
+            else:
+                self._write(out, v, defs)
+
+    def _write_clock(self, out, clock, defs):
+        # Indices puis compteurs, chacun en tableau little-endian de la plus petite largeur utile
+        idxs = list(map(self.index.get, clock))
+        if None in idxs:
+            idxs = [self._name_index(name, defs) for name in clock]
+        out.append(T_CLOCK)
+        write_varint(out, len(idxs))
+        if not idxs:
+            return
+        for values in (idxs, list(clock.values())):
+            width = width_of(max(values))
+            packed = array(WIDTHS[width], values)
+            if sys.byteorder == "big":
+                packed.byteswap()
+            out.append(width)
+            out += packed.tobytes()
+
+    def _write(self, out, obj, defs):
+        if obj is None:
+            out.append(T_NONE)
+        elif obj is True:
+            out.append(T_TRUE)
+        elif obj is False:
+            out.append(T_FALSE)
+        elif type(obj) is int:
+            out.append(T_INT)
+            write_varint(out, obj << 1 if obj >= 0 else ((-obj) << 1) - 1)
+        elif type(obj) is float:
+            out.append(T_FLOAT)
+            out += FLOAT.pack(obj)
+        elif isinstance(obj, str):
+            raw = obj.encode()
+            out.append(T_STR)
+            write_varint(out, len(raw))
+            out += raw
+        elif isinstance(obj, dict):
+            out.append(T_DICT)
+            write_varint(out, len(obj))
+            for k, v in obj.items():
+                self._write(out, str(k), defs)
+                self._write(out, v, defs)
+        elif isinstance(obj, (list, tuple)):
+            out.append(T_LIST)
+            write_varint(out, len(obj))
+            for item in obj:
+                self._write(out, item, defs)
+        else:
+            raise TypeError(f"Type non sérialisable : {type(obj).__name__}")
+
+
+class Decoder:
+    # État lié à une connexion entrante : table index -> nom alimentée par l'émetteur
+    def __init__(self):
+        self.names = {}
+
+    def decode(self, frame):
+        if not frame or frame[0] != MAGIC:
+            return json.loads(frame.decode())
+        payload, pos = self.header(frame)
+        obj, _ = self._read(payload, pos)
+        return obj
+
+    def header(self, frame):
+        # Décompression et table des noms (état de la connexion) ; rend le corps et sa position,
+        # décodable ailleurs avec une copie de self.names (cf. ingest.py)
+        flags = frame[1]
+        payload = frame[2:]
+        if flags & FLAG_LZ4:
+            if lz4 is None:
+                raise ValueError("Trame LZ4 reçue mais le module lz4 est absent")
+            payload = lz4.decompress(payload)
+        elif flags & FLAG_ZLIB:
+            payload = zlib.decompress(payload)
+        count, pos = read_varint(payload, 0)
+        for _ in range(count):
+            idx, pos = read_varint(payload, pos)
+            size, pos = read_varint(payload, pos)
+            self.names[idx] = payload[pos:pos + size].decode()
+            pos += size
+        return payload, pos
+
+    def _read(self, buf, pos):
+        tag = buf[pos]
+        pos += 1
+        if tag == T_NONE:
+            return None, pos
+        if tag == T_TRUE:
+            return True, pos
+        if tag == T_FALSE:
+            return False, pos
+        if tag == T_INT:
+            n, pos = read_varint(buf, pos)
+            return (n >> 1) ^ -(n & 1), pos
+        if tag == T_FLOAT:
+            return FLOAT.unpack_from(buf, pos)[0], pos + FLOAT.size
+        if tag == T_STR:
+            size, pos = read_varint(buf, pos)
+            return buf[pos:pos + size].decode(), pos + size
+        if tag == T_LIST:
+            size, pos = read_varint(buf, pos)
+            items = []
+            for _ in range(size):
+                item, pos = self._read(buf, pos)
+                items.append(item)
+            return items, pos
+        if tag == T_DICT:
+            size, pos = read_varint(buf, pos)
+            obj = {}
+            for _ in range(size):
+                k, pos = self._read(buf, pos)
+                obj[k], pos = self._read(buf, pos)
+            return obj, pos
+        if tag == T_CLOCK:
+            size, pos = read_varint(buf, pos)
+            if not size:
+                return {}, pos
+            columns = []
+            for _ in range(2):
+                width = buf[pos]
+                values = array(WIDTHS[width])
+                values.frombytes(buf[pos + 1:pos + 1 + size * width])
+                if sys.byteorder == "big":
+                    values.byteswap()
+                columns.append(values)
+                pos += 1 + size * width
+            return dict(zip(map(self.names.__getitem__, columns[0]), columns[1])), pos
+        raise ValueError(f"Étiquette inconnue : {tag}")
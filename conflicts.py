@@ -0,0 +1,90 @@
+import threading
+from array import array
+
+from vector_clock import compare, merge_into, AFTER, BEFORE, EQUAL
+
+
+class Conflict:
+    # Versions sœurs d'une clé : la version locale et les versions distantes concurrentes
+    def __init__(self, key, value, clock):
+        self.key = key
+        self.value = value
+        self.clock = clock
+        self.remotes = []  # [(émetteur, valeur, horloge)]
+
+    def clocks(self):
+        return [self.clock] + [clock for _, _, clock in self.remotes]
+
+    def merged_clock(self):
+        merged = array('Q')
+        for clock in self.clocks():
+            merge_into(merged, clock)
+        return merged
+
+    def latest_remote(self):
+        return self.remotes[-1][1]
+
+
+class ConflictStore:
+    # Conflits en attente de résolution. L'ingestion ne fait qu'y ajouter des versions sœurs ;
+    # la résolution (par l'utilisateur, en lot) se fait plus tard depuis le thread Tk.
+    def __init__(self):
+        self.pending = {}
+        self.changed = set()
+        self.lock = threading.Lock()
+
+    def add(self, key, local_value, local_clock, sender, value, clock):
+        with self.lock:
+            conflict = self.pending.get(key)
+            if conflict is None:
+                conflict = self.pending[key] = Conflict(key, local_value, local_clock)
+            if any(compare(clock, c) in (BEFORE, EQUAL) for _, _, c in conflict.remotes):
+                return
+            # Une version distante plus récente remplace celles qu'elle a vues
+            conflict.remotes = [r for r in conflict.remotes if compare(r[2], clock) != BEFORE]
+            conflict.remotes.append((sender, value, clock))
+            self.changed.add(key)
+
+    def settle(self, key, value, clock):
+        # Nouvelle version locale d'une clé en conflit : les sœurs qu'elle domine disparaissent
+        with self.lock:
+            conflict = self.pending.get(key)
+            if conflict is None:
+                return
+            conflict.remotes = [r for r in conflict.remotes if compare(clock, r[2]) not in (AFTER, EQUAL)]
+            if conflict.remotes:
+                conflict.value, conflict.clock = value, clock
+            else:
+                del self.pending[key]
+            self.changed.add(key)
+
+    def take(self, key):
+        with self.lock:
+            conflict = self.pending.pop(key, None)
+            if conflict is not None:
+                self.changed.add(key)
+            return conflict
+
+    def get(self, key):
+        with self.lock:
+            return self.pending.get(key)
+
+    def drain_changed(self):
+        with self.lock:
+            changed, self.changed = self.changed, set()
+            return changed
+
+    def keys(self):
+        with self.lock:
+            return list(self.pending)
+
+    def clocks(self):
+        # Toutes les horloges des versions en attente (effacement des nœuds retirés)
+        with self.lock:
+            return [clock for conflict in self.pending.values() for clock in conflict.clocks()]
+
+    def __contains__(self, key):
+        return key in self.pending
+
+    def __len__(self):
+        return len(self.pending)
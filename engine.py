@@ -0,0 +1,138 @@
+import threading
+import zlib
+from array import array
+
+from vector_clock import compare, merge_into, AFTER
+from sync import classify_entries
+
+SHARDS = 64
+
+
+class ShardLocks:
+    # Verrous d'un ensemble de partitions, pris dans l'ordre croissant (aucun interblocage entre
+    # deux écritures multi-clés)
+    def __init__(self, locks):
+        self.locks = locks
+
+    def __enter__(self):
+        for lock in self.locks:
+            lock.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        for lock in reversed(self.locks):
+            lock.release()
+
+
+class ApplyEngine:
+    # Application concurrente des écritures : l'espace des clés est partitionné, chaque partition a
+    # son verrou. Comparaison et stockage d'une clé se font sous le verrou de sa partition (ordre
+    # déterministe par clé) ; des clés de partitions différentes s'appliquent en parallèle. Seules
+    # les fusions dans l'horloge du nœud passent par un verrou commun, tenu le temps d'un max.
+    def __init__(self, node, shards=SHARDS):
+        self.node = node
+        self.locks = [threading.Lock() for _ in range(shards)]
+        self.clock_lock = threading.Lock()
+
+    def shard_of(self, key):
+        # crc32 plutôt que hash() : même partition d'un processus à l'autre
+        return zlib.crc32(key.encode()) % len(self.locks)
+
+    def locked(self, keys):
+        return ShardLocks([self.locks[s] for s in sorted({self.shard_of(k) for k in keys})])
+
+    def exclusive(self):
+        # Réécriture globale (collecte, renommage) : toutes les partitions puis l'horloge du nœud
+        return ShardLocks(self.locks + [self.clock_lock])
+
+    # --- Horloge du nœud ---
+    def tick(self):
+        # Événement local : incrément et copie atomiques, la copie sert au stockage et à l'envoi
+        with self.clock_lock:
+            self.node.vc.increment()
+            return self.node.vc.snapshot()
+
+    def merge(self, clock):
+        with self.clock_lock:
+            merge_into(self.node.vc.counters, clock)
+
+    def update(self, clock):
+        with self.clock_lock:
+            self.node.vc.update(clock)
+
+    def absorb(self, clock):
+        # Sous le verrou d'une partition : une écriture locale qui suit sur ses clés domine alors
+        # toujours les versions qui viennent d'y être stockées
+        if not any(clock):
+            return False
+        self.merge(clock)
+        return True
+
+    def received(self):
+        # Fin d'un lot reçu (horloges déjà fusionnées) : un seul incrément
+        with self.clock_lock:
+            self.node.vc.increment()
+
+    # --- Réception ---
+    def apply(self, sender, key, value, clock):
+        node = self.node
+        with self.locks[self.shard_of(key)]:
+            local = node.data.get(key)
+            order = compare(clock, local["clock"]) if local is not None else AFTER
+            node.apply(sender, key, value, clock, order)
+
+    def apply_batch(self, sender, entries):
+        # Entrées groupées par partition, une partition verrouillée à la fois ; les horloges d'une
+        # partition sont fusionnées dans l'horloge locale avant d'en rendre le verrou, un seul
+        # incrément pour tout le lot
+        node = self.node
+        pool = node.ingest
+        if pool is not None and len(entries) >= pool.min_entries:
+            classified = pool.classify(node, entries)
+            if classified is not None:
+                self._apply_classified(sender, classified)
+                return
+        shards = {}
+        for entry in entries:
+            shards.setdefault(self.shard_of(entry[0]), []).append(entry)
+        received = False
+        for shard in sorted(shards):
+            with self.locks[shard]:
+                merged = array('Q')
+                seen = set()
+                for key, value, clock, order in classify_entries(node.data, shards[shard], node.vc.registry):
+                    if key in seen:
+                        # Clé déjà écrite plus haut dans le lot : le classement face à l'état
+                        # d'avant le lot ne vaut plus, comparaison à la version qui vient d'être écrite
+                        local = node.data.get(key)
+                        order = compare(clock, local["clock"]) if local is not None else AFTER
+                    seen.add(key)
+                    if order == AFTER:
+                        merge_into(merged, clock)
+                    node.apply(sender, key, value, clock, order, merge=False)
+                received = self.absorb(merged) or received
+        if received:
+            self.received()
+
+    def _apply_classified(self, sender, classified):
+        # Lot classé hors processus (ingest.py) : une clé modifiée entre-temps (par un autre lot ou
+        # plus haut dans celui-ci) est reclassée ici
+        node = self.node
+        shards = {}
+        for item in classified:
+            shards.setdefault(self.shard_of(item[0]), []).append(item)
+        received = False
+        for shard in sorted(shards):
+            with self.locks[shard]:
+                merged = array('Q')
+                for key, value, clock, order, seen in shards[shard]:
+                    local = node.data.get(key)
+                    current = local["clock"] if local is not None else None
+                    if current != seen:
+                        order = compare(clock, current) if current is not None else AFTER
+                    if order == AFTER:
+                        merge_into(merged, clock)
+                    node.apply(sender, key, value, clock, order, merge=False)
+                received = self.absorb(merged) or received
+        if received:
+            self.received()
@@ -0,0 +1,125 @@
+import random
+import threading
+from collections import OrderedDict
+
+from merkle import entry_digest
+
+FANOUT = 3
+INTERVAL = 1.0
+VIEW_SIZE = 8
+TTL = 6
+SEEN_SIZE = 100000
+VIEW_SAMPLE = 3
+
+
+class Gossip:
+    # Diffusion épidémique : une écriture part vers `fanout` pairs tirés au hasard dans une vue
+    # partielle, qui la relaient tant que le ttl le permet. Les entrées déjà vues (condensé
+    # clé/valeur/horloge) ne sont ni réappliquées ni relayées. Un tour périodique de réconciliation
+    # de Merkle avec un pair au hasard (push-pull) rattrape ce que la rumeur a manqué : la synchro
+    # delta par horloge suppose une livraison causale, que la rumeur ne garantit pas. Chaque
+    # message porte un échantillon de la vue pour la renouveler.
+    def __init__(self, node, view, create, pull, address=None, apply=None, fanout=FANOUT,
+                 interval=INTERVAL, view_size=VIEW_SIZE, ttl=TTL, seen_size=SEEN_SIZE):
+        self.node = node
+        self.create = create  # (sender, entries, ttl, view=..., origin=...) -> message
+        self.pull = pull  # (host, port) : lance une réconciliation avec ce pair
+        self.apply = apply or (lambda sender, entries: node.engine.apply_batch(sender, entries))
+        self.address = tuple(address) if address is not None else None  # annoncée aux pairs
+        self.fanout = fanout
+        self.interval = interval
+        self.view_size = view_size
+        self.ttl = ttl
+        self.seen_size = seen_size
+        self.view = []
+        self.seen = OrderedDict()
+        self.lock = threading.Lock()
+        self.running = False
+        self.merge_view(view)
+
+    # --- Vue partielle ---
+    def merge_view(self, addresses):
+        with self.lock:
+            for address in addresses:
+                address = tuple(address)
+                if address != self.address and address not in self.view:
+                    self.view.append(address)
+            while len(self.view) > self.view_size:
+                self.view.pop(random.randrange(len(self.view)))
+
+    def remove(self, host, port):
+        with self.lock:
+            # La vue n'est jamais vidée : le dernier pair connu reste la porte d'entrée
+            if (host, port) in self.view and len(self.view) > 1:
+                self.view.remove((host, port))
+
+    def sample(self, count, exclude=None):
+        with self.lock:
+            candidates = [a for a in self.view if a != exclude]
+        return random.sample(candidates, min(count, len(candidates)))
+
+    # --- Rumeurs ---
+    def first_seen(self, key, value, clock):
+        digest = entry_digest(key, value, clock)
+        with self.lock:
+            if digest in self.seen:
+                self.seen.move_to_end(digest)
+                return False
+            self.seen[digest] = None
+            if len(self.seen) > self.seen_size:
+                self.seen.popitem(last=False)
+            return True
+
+    def publish(self, entries):
+        # Écritures locales : entries = [[clé, valeur, horloge], ...]
+        for key, value, clock in entries:
+            self.first_seen(key, value, clock)
+        self.push(entries, self.ttl)
+
+    def push(self, entries, ttl, exclude=None):
+        targets = self.sample(self.fanout, exclude)
+        if targets:
+            msg = self.create(self.node.node_id, entries, ttl, view=self.view_sample(), origin=self.address)
+            self.node.runtime.broadcast(targets, msg)
+
+    def view_sample(self):
+        sample = [list(a) for a in self.sample(VIEW_SAMPLE)]
+        if self.address is not None:
+            sample.append(list(self.address))
+        return sample
+
+    def receive(self, msg):
+        # Rend les entrées nouvelles (déjà appliquées et relayées)
+        self.merge_view(msg.get("view") or [])
+        fresh = [e for e in msg["entries"] if self.first_seen(*e)]
+        if fresh:
+            self.apply(msg["sender"], fresh)
+            if msg["ttl"] > 1:
+                origin = tuple(msg["origin"]) if msg.get("origin") else None
+                self.push(fresh, msg["ttl"] - 1, exclude=origin)
+        return fresh
+
+    # --- Tours push-pull ---
+    def start(self):
+        self.running = True
+        self.node.runtime.loop.call_soon_threadsafe(self._schedule)
+
+    def stop(self):
+        self.running = False
+
+    def _schedule(self):
+        if self.running:
+            # Gigue pour éviter que tous les nœuds synchronisent au même instant
+            self.node.runtime.loop.call_later(self.interval * random.uniform(0.5, 1.5), self._round)
+
+    def _round(self):
+        try:
+            peer = self.sample(1)
+            if peer:
+                host, port = peer[0]
+                self.pull(host, port)
+                self.node.runtime.send(host, port, self.create(self.node.node_id, [], 0, view=self.view_sample(),
+                                                               origin=self.address))
+        finally:
+            self._schedule()
+
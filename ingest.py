@@ -0,0 +1,100 @@
+import json
+import multiprocessing
+import os
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+
+from codec import Decoder, MAGIC
+from vector_clock import compare, trimmed, AFTER
+
+MIN_ENTRIES = 512
+MIN_FRAME = 64 * 1024
+CHUNK = 2048
+
+
+# --- Fonctions exécutées dans les processus de travail ---
+def decode_json(frame):
+    return json.loads(frame.decode())
+
+
+def decode_body(payload, pos, names):
+    decoder = Decoder()
+    decoder.names = names
+    obj, _ = decoder._read(payload, pos)
+    return obj
+
+
+def classify_chunk(entries, index, retired, width, local):
+    # Encode les horloges reçues avec une copie de l'index du registre et les compare aux
+    # versions locales ; None si l'horloge cite un nœud inconnu (à interner par le propriétaire)
+    results = []
+    for key, _, clock in entries:
+        counters = array('Q', bytes(8 * width))
+        for name, ts in clock.items():
+            if name in retired:
+                continue
+            idx = index.get(name)
+            if idx is None:
+                counters = None
+                break
+            counters[idx] = ts
+        if counters is None:
+            results.append(None)
+            continue
+        counters = trimmed(counters)
+        mine = local.get(key)
+        results.append((counters, compare(counters, mine) if mine is not None else AFTER))
+    return results
+
+
+class IngestPool:
+    # Étape d'ingestion optionnelle sur un pool de processus : décodage des grandes trames et
+    # classement causal des grands lots, hors GIL du nœud. Seules les écritures (engine.py) restent
+    # dans le processus propriétaire. "spawn" : le nœud a déjà des threads (asyncio, Tk) au
+    # moment du premier envoi, un fork les dupliquerait dans un état incohérent.
+    def __init__(self, workers=None, min_entries=MIN_ENTRIES, min_frame=MIN_FRAME, chunk=CHUNK):
+        self.min_entries = min_entries
+        self.min_frame = min_frame
+        self.chunk = chunk
+        self.workers = workers or os.cpu_count() or 1
+        self.executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+
+    # --- Décodage (appelé depuis la boucle asyncio du runtime) ---
+    async def decode(self, loop, frame, decoder):
+        if not frame or frame[0] != MAGIC:
+            return await loop.run_in_executor(self.executor, decode_json, frame)
+        payload, pos = decoder.header(frame)
+        return await loop.run_in_executor(self.executor, decode_body, payload, pos, dict(decoder.names))
+
+    # --- Classement ---
+    def classify(self, node, entries):
+        # Rend [(clé, valeur, horloge, ordre, horloge locale comparée)] ; l'appelant revérifie
+        # l'horloge locale sous le verrou de la partition avant d'écrire
+        registry = node.vc.registry
+        ids = list(registry.ids)
+        index = {name: idx for idx, name in enumerate(ids) if name is not None}
+        retired = set(registry.retired)
+        local = {}
+        for key, _, _ in entries:
+            entry = node.data.get(key)
+            if entry is not None:
+                local[key] = entry["clock"]
+        chunks = [entries[i:i + self.chunk] for i in range(0, len(entries), self.chunk)]
+        futures = [self.executor.submit(classify_chunk, chunk, index, retired, len(ids),
+                                        {key: local[key] for key, _, _ in chunk if key in local})
+                   for chunk in chunks]
+        results = []
+        for chunk, future in zip(chunks, futures):
+            for (key, value, clock), result in zip(chunk, future.result()):
+                mine = local.get(key)
+                if result is None:
+                    counters = registry.encode(clock)
+                    result = (counters, compare(counters, mine) if mine is not None else AFTER)
+                results.append((key, value, result[0], result[1], mine))
+        if registry.ids[:len(ids)] != ids:
+            # Emplacement libéré puis réattribué pendant le classement : index périmé
+            return None
+        return results
+
+    def close(self):
+        self.executor.shutdown(wait=False)
@@ -0,0 +1,64 @@
+import json
+import threading
+import time
+from array import array
+from collections import deque, namedtuple
+from itertools import islice
+
+CAPACITY = 10000
+
+# Types d'événements
+INFO = "info"
+WRITE = "write"
+RECEIVE = "receive"
+CONFLICT = "conflict"
+IGNORED = "ignored"
+SYNC = "sync"
+RENAME = "rename"
+ERROR = "error"
+
+Event = namedtuple("Event", "seq time kind key sender clock message color")
+
+
+class EventJournal:
+    # Tampon circulaire borné d'événements structurés : au-delà de `capacity`, les plus anciens
+    # sont oubliés. Les lecteurs suivent leur position par numéro de séquence (since).
+    def __init__(self, capacity=CAPACITY, registry=None):
+        self.events = deque(maxlen=capacity)
+        self.registry = registry  # pour décoder les horloges à l'export
+        self.seq = 0
+        self.lock = threading.Lock()
+
+    def record(self, kind, message, key=None, sender=None, clock=None, color="black"):
+        with self.lock:
+            self.seq += 1
+            event = Event(self.seq, time.time(), kind, key, sender, clock, message, color)
+            self.events.append(event)
+        return event
+
+    def since(self, seq, limit=None):
+        # Événements postérieurs à seq encore présents, au plus les `limit` plus récents
+        with self.lock:
+            count = min(self.seq - seq, len(self.events))
+            if limit is not None:
+                count = min(count, limit)
+            if count <= 0:
+                return []
+            events = list(islice(reversed(self.events), count))
+        events.reverse()
+        return events
+
+    def export(self, path):
+        # Une ligne JSON par événement ; rend le nombre d'événements écrits
+        with self.lock:
+            events = list(self.events)
+        with open(path, "w", encoding="utf-8") as f:
+            for event in events:
+                record = event._asdict()
+                del record["color"]
+                if isinstance(event.clock, array) and self.registry is not None:
+                    record["clock"] = self.registry.decode(event.clock)
+                elif isinstance(event.clock, array):
+                    record["clock"] = event.clock.tolist()
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        return len(events)
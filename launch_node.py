@@ -4,7 +4,7 @@ from app import NodeApp
 
 def start_node(node_id, all_nodes, port, peers):
     root = tk.Tk()
-    app = NodeApp(root, node_id, all_nodes, port, peers)
+    app = NodeApp(root, node_id, all_nodes, port, peers, data_dir=f"data_{node_id}")
     root.mainloop()
 
 if __name__ == '__main__':
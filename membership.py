@@ -0,0 +1,129 @@
+import threading
+from array import array
+
+from sync import rebuild_tree
+
+
+class Membership:
+    # Appartenance par époques : chaque retrait et chaque collecte incrémente l'époque. Un nœud
+    # retiré reste dans les horloges jusqu'à ce que tous les membres vivants aient confirmé avoir
+    # vu son dernier compteur ; ses entrées sont alors effacées de toutes les horloges.
+    def __init__(self, epoch=0, retiring=None, retired=()):
+        self.epoch = epoch
+        self.retiring = dict(retiring or {})  # nom -> dernier compteur connu au moment du retrait
+        self.retired = set(retired)  # noms collectés, jamais réadmis
+        self.acks = {name: {} for name in self.retiring}  # nom -> {membre: compteur vu}
+        self.lock = threading.Lock()
+
+    def retire(self, name, counter):
+        with self.lock:
+            if name in self.retired:
+                return False
+            self.epoch += 1
+            self.retiring[name] = max(counter, self.retiring.get(name, 0))
+            self.acks.setdefault(name, {})
+            return True
+
+    def adopt(self, epoch, retiring, retired):
+        # Annonce reçue d'un pair ; rend les noms collectés dont les entrées sont à effacer ici
+        with self.lock:
+            self.epoch = max(self.epoch, epoch)
+            for name, counter in retiring.items():
+                if name not in self.retired:
+                    self.retiring[name] = max(counter, self.retiring.get(name, 0))
+                    self.acks.setdefault(name, {})
+            fresh = [name for name in retired if name not in self.retired]
+            self._forget(fresh)
+            return fresh
+
+    def acknowledge(self, member, counters):
+        # counters : {nom retiré: compteur que le membre a vu pour ce nom}
+        with self.lock:
+            for name, ts in counters.items():
+                if name in self.acks:
+                    self.acks[name][member] = max(ts, self.acks[name].get(member, 0))
+
+    def collectable(self, members):
+        with self.lock:
+            return [name for name, last in self.retiring.items()
+                    if all(self.acks[name].get(m, -1) >= last for m in members if m != name)]
+
+    def collect(self, names):
+        with self.lock:
+            self.epoch += 1
+            self._forget(names)
+
+    def _forget(self, names):
+        for name in names:
+            self.retiring.pop(name, None)
+            self.acks.pop(name, None)
+            self.retired.add(name)
+
+    def seen(self, vc):
+        # Compteurs de ce nœud pour les noms en cours de retrait (accusé de réception)
+        counters = vc.snapshot()
+        index = vc.registry.index
+        with self.lock:
+            names = list(self.retiring)
+        return {name: counters[index[name]] if name in index else 0 for name in names}
+
+    def state(self):
+        with self.lock:
+            return {"epoch": self.epoch, "retiring": dict(self.retiring), "retired": sorted(self.retired)}
+
+
+def forget(node, names, clocks=()):
+    # Efface les compteurs des nœuds collectés de l'horloge locale, des horloges par clé et des
+    # horloges annexes (conflits en attente) puis libère leurs emplacements dans le registre
+    registry = node.vc.registry
+    registry.retired.update(names)
+    slots = [registry.index[name] for name in names if name in registry.index]
+    if not slots:
+        return 0
+
+    def clear(counters):
+        for idx in slots:
+            if idx < len(counters):
+                counters[idx] = 0
+
+    with node.engine.exclusive():
+        rewritten = 0
+        for key in list(node.data):
+            entry = node.data[key]
+            if any(idx < len(entry["clock"]) and entry["clock"][idx] for idx in slots):
+                # Copie : un même instantané peut être partagé par plusieurs clés
+                clock = array('Q', entry["clock"])
+                clear(clock)
+                node.data[key] = {"value": entry["value"], "clock": clock}
+                rewritten += 1
+        clear(node.vc.counters)
+        for counters in clocks:
+            clear(counters)
+        rebuild_tree(node.tree, node.data, registry)
+        node.history.rebuild((k, v["clock"]) for k, v in node.data.items())
+        for name in names:
+            registry.release(name)
+        return rewritten
+
+
+def rename(node, old_id, new_id, clocks=()):
+    # Renommage d'un nœud dans l'horloge locale et les horloges par clé. L'appelant tient
+    # engine.exclusive() (sauf au rejeu du journal). Si new_id est déjà connu (nom repris de la
+    # configuration), les compteurs de old_id sont repliés sur les siens dans toutes les horloges,
+    # annexes comprises (conflits en attente), et l'index causal est reconstruit
+    registry = node.vc.registry
+    old = registry.index.get(old_id)
+    folded = old is not None and new_id in registry.index and old != registry.index[new_id]
+    rewritten = []
+    if folded:
+        for key in list(node.data):
+            entry = node.data[key]
+            if old < len(entry["clock"]) and entry["clock"][old]:
+                # Copie : un même instantané peut être partagé par plusieurs clés
+                rewritten.append((key, entry["value"], array('Q', entry["clock"])))
+    node.vc.rename_node(old_id, new_id, [clock for _, _, clock in rewritten] + list(clocks))
+    for key, value, clock in rewritten:
+        node.data[key] = {"value": value, "clock": clock}
+    rebuild_tree(node.tree, node.data, registry)
+    if folded:
+        node.history.rebuild((k, v["clock"]) for k, v in node.data.items())
@@ -0,0 +1,115 @@
+import hashlib
+import json
+import threading
+
+FANOUT_BITS = 4
+DEPTH = 4
+
+
+def entry_digest(key, value, clock):
+    # Forme canonique indépendante des index locaux du registre de nœuds
+    canonical = json.dumps([key, value, sorted((n, ts) for n, ts in clock.items() if ts)],
+                           sort_keys=True, separators=(",", ":"))
+    return int.from_bytes(hashlib.blake2b(canonical.encode(), digest_size=16).digest(), "big")
+
+
+def bucket_of(key, fanout_bits=FANOUT_BITS, depth=DEPTH):
+    h = int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "big")
+    return h >> (64 - fanout_bits * depth)
+
+
+class MerkleTree:
+    # Arbre de hachage à profondeur fixe sur l'espace des clés. Chaque nœud interne est le
+    # XOR de ses enfants, ce qui permet une mise à jour en O(profondeur) à chaque écriture.
+    def __init__(self, fanout_bits=FANOUT_BITS, depth=DEPTH):
+        self.fanout_bits = fanout_bits
+        self.depth = depth
+        self.levels = [{} for _ in range(depth + 1)]
+        self.entries = {}
+        self.buckets = {}
+        # Les racines sont partagées par toutes les clés : XOR en lecture-écriture sous verrou
+        self.lock = threading.Lock()
+
+    def _apply(self, leaf, delta):
+        for level in range(self.depth, -1, -1):
+            index = leaf >> (self.fanout_bits * (self.depth - level))
+            nodes = self.levels[level]
+            digest = nodes.get(index, 0) ^ delta
+            if digest:
+                nodes[index] = digest
+            else:
+                nodes.pop(index, None)
+
+    def update(self, key, value, clock):
+        digest = entry_digest(key, value, clock)
+        leaf = bucket_of(key, self.fanout_bits, self.depth)
+        with self.lock:
+            old = self.entries.get(key)
+            if old == digest:
+                return
+            self.entries[key] = digest
+            self.buckets.setdefault(leaf, set()).add(key)
+            self._apply(leaf, digest ^ (old or 0))
+
+    def remove(self, key):
+        leaf = bucket_of(key, self.fanout_bits, self.depth)
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is None:
+                return
+            keys = self.buckets[leaf]
+            keys.discard(key)
+            if not keys:
+                del self.buckets[leaf]
+            self._apply(leaf, old)
+
+    def rebuild(self, items):
+        # items : itérable de (clé, valeur, horloge sous forme de dict)
+        with self.lock:
+            self.levels = [{} for _ in range(self.depth + 1)]
+            self.entries = {}
+            self.buckets = {}
+        for key, value, clock in items:
+            self.update(key, value, clock)
+
+    def load(self, digests):
+        # digests : {clé: condensé} enregistrés (cf. storage.py), sans relire les valeurs
+        with self.lock:
+            self.levels = [{} for _ in range(self.depth + 1)]
+            self.entries = {}
+            self.buckets = {}
+            for key, digest in digests.items():
+                leaf = bucket_of(key, self.fanout_bits, self.depth)
+                self.entries[key] = digest
+                self.buckets.setdefault(leaf, set()).add(key)
+                self._apply(leaf, digest)
+
+    def digest(self, level, index):
+        return self.levels[level].get(index, 0)
+
+    def children(self, parents):
+        shift = self.fanout_bits
+        return [(parent << shift) | i for parent in parents for i in range(1 << shift)]
+
+    def keys_in(self, leaves):
+        return [key for leaf in leaves for key in self.buckets.get(leaf, ())]
+
+    # --- Poignée de main de réconciliation ---
+    def start(self):
+        return {"level": 0, "parents": None, "digests": self.encode(0, [0])}
+
+    def encode(self, level, indexes):
+        return [[i, format(self.digest(level, i), "x")] for i in indexes if self.digest(level, i)]
+
+    def diverging(self, tree_msg):
+        # Index du niveau reçu dont le condensé diffère du nôtre
+        level = tree_msg["level"]
+        parents = tree_msg["parents"]
+        candidates = [0] if parents is None else self.children(parents)
+        theirs = {i: int(d, 16) for i, d in tree_msg["digests"]}
+        return level, [i for i in candidates if self.digest(level, i) != theirs.get(i, 0)]
+
+    def descend(self, level, mismatched):
+        # Message suivant : condensés de nos enfants sous les seuls sous-arbres divergents
+        return {"level": level + 1, "parents": mismatched,
+                "digests": self.encode(level + 1, self.children(mismatched))}
@@ -1,37 +1,102 @@
-import json
+from codec import JsonCodec, Decoder
+
+# Les create_* produisent des dicts : l'encodage (JSON ou binaire négocié) se fait à la
+# frontière réseau, dans le runtime.
 
 def create_message(sender, clock, key, value, msg_type="data", token=None):
-    return json.dumps({
+    return {
         "type": msg_type,
         "sender": sender,
         "clock": clock,
         "key": key,
         "value": value,
         "token": token
-    }).encode()
+    }
+
+def create_batch_message(sender, entries, token=None):
+    # entries : liste de [clé, valeur, horloge], appliquée avec une seule fusion d'horloge
+    return {
+        "type": "batch",
+        "sender": sender,
+        "entries": entries,
+        "token": token
+    }
+
+def create_gossip_message(sender, entries, ttl, view=None, origin=None, token=None):
+    # Rumeur : entries relayées tant que ttl > 1 ; view = échantillon de la vue partielle de l'émetteur
+    return {
+        "type": "gossip",
+        "sender": sender,
+        "entries": entries,
+        "ttl": ttl,
+        "view": view,
+        "origin": origin,
+        "token": token
+    }
+
+def create_forward_message(sender, entries, op=None, token=None):
+    # entries : liste de [clé, valeur] écrites sur un nœud qui ne les détient pas, à écrire par
+    # leur primaire (qui les horodate et les réplique) ; op="incr" : [clé, quantité] à ajouter à un compteur
+    return {
+        "type": "forward",
+        "sender": sender,
+        "entries": entries,
+        "op": op,
+        "token": token
+    }
+
+def create_quorum_message(msg_type, sender, rid, reply_to=None, entries=None, keys=None, key=None, value=None,
+                          w=None, ok=True, token=None):
+    # Requêtes à quorum (cf. quorum.py) : "put" (écriture coordonnée par un détenteur), "replicate"
+    # (entries à appliquer puis acquitter), "read" (versions de keys) et "reply" (réponse à rid)
+    return {
+        "type": msg_type,
+        "sender": sender,
+        "rid": rid,
+        "reply_to": reply_to,
+        "entries": entries,
+        "keys": keys,
+        "key": key,
+        "value": value,
+        "w": w,
+        "ok": ok,
+        "token": token
+    }
 
 def create_rename_message(old_id, new_id, token=None):
-    return json.dumps({
+    return {
         "type": "rename",
         "old_id": old_id,
         "new_id": new_id,
         "token": token
-    }).encode()
+    }
 
-def create_sync_request(sender, token=None):
-    return json.dumps({
+def create_sync_request(sender, clock=None, reply_to=None, tree=None, token=None):
+    # clock : résumé pour la synchro delta ; tree : étape de descente dans l'arbre de Merkle
+    return {
         "type": "sync_request",
         "sender": sender,
+        "clock": clock,
+        "tree": tree,
+        "reply_to": reply_to,
         "token": token
-    }).encode()
+    }
 
-def create_sync_response(sender, data, token=None):
-    return json.dumps({
+def create_sync_response(sender, data, clock=None, reply_to=None, buckets=None, token=None):
+    # data : liste de [clé, valeur, horloge] ; clock présent = le pair attend notre delta en retour ;
+    # buckets présent = le pair attend nos entrées de ces feuilles de l'arbre de Merkle
+    return {
         "type": "sync_response",
         "sender": sender,
         "data": data,
+        "clock": clock,
+        "buckets": buckets,
+        "reply_to": reply_to,
         "token": token
-    }).encode()
+    }
+
+def encode_message(msg):
+    return JsonCodec().encode(msg)
 
 def parse_message(raw_data):
-    return json.loads(raw_data.decode())
\ No newline at end of file
+    return Decoder().decode(raw_data)
\ No newline at end of file
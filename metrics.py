@@ -0,0 +1,232 @@
+import bisect
+import json
+import sys
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Bornes des histogrammes de durée (secondes), de 50 µs à 10 s
+BOUNDS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+          0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SAMPLE_INTERVAL = 0.005
+TOP = 30
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BOUNDS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(BOUNDS, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        # Borne supérieure du seau qui contient le quantile q
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(BOUNDS + (float("inf"),), self.counts):
+            seen += count
+            if seen >= rank and count:
+                return bound
+        return 0.0
+
+
+class Metrics:
+    # Compteurs et histogrammes étiquetés (nom, étiquettes) ; les jauges sont des fonctions
+    # évaluées à la lecture (taille du stockage, profondeur des files...).
+    def __init__(self):
+        self.counters = Counter()
+        self.histograms = {}
+        self.gauges = {}
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted(labels.items()))
+
+    def inc(self, name, n=1, **labels):
+        key = self._key(name, labels)
+        with self.lock:
+            self.counters[key] += n
+
+    def observe(self, name, seconds, **labels):
+        key = self._key(name, labels)
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(seconds)
+
+    def gauge(self, name, fn, **labels):
+        self.gauges[self._key(name, labels)] = fn
+
+    def gauge_values(self):
+        values = {}
+        for key, fn in list(self.gauges.items()):
+            try:
+                values[key] = fn()
+            except Exception:
+                continue
+        return values
+
+    # --- Lecture ---
+    def render(self):
+        # Format texte d'exposition de Prometheus
+        lines = []
+        with self.lock:
+            counters = sorted(self.counters.items())
+            histograms = sorted((key, (list(h.counts), h.sum, h.count)) for key, h in self.histograms.items())
+        for (name, labels), value in counters:
+            lines.append(f"{name}{format_labels(labels)} {value}")
+        for (name, labels), value in sorted(self.gauge_values().items()):
+            lines.append(f"{name}{format_labels(labels)} {value}")
+        for (name, labels), (counts, total, count) in histograms:
+            cumulative = 0
+            for bound, n in zip(BOUNDS + (float("inf"),), counts):
+                cumulative += n
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{name}_bucket{format_labels(labels + (('le', le),))} {cumulative}")
+            lines.append(f"{name}_sum{format_labels(labels)} {total}")
+            lines.append(f"{name}_count{format_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self):
+        with self.lock:
+            counters = [[name, dict(labels), value] for (name, labels), value in sorted(self.counters.items())]
+            histograms = [[name, dict(labels), {"count": h.count, "sum": h.sum, "p50": h.quantile(0.5),
+                                                "p99": h.quantile(0.99)}]
+                          for (name, labels), h in sorted(self.histograms.items())]
+        gauges = [[name, dict(labels), value] for (name, labels), value in sorted(self.gauge_values().items())]
+        return {"counters": counters, "gauges": gauges, "histograms": histograms}
+
+
+def watch_node(metrics, node):
+    # Jauges communes aux trois interfaces ; les composants absents ou désactivés sont ignorés
+    metrics.gauge("store_keys", lambda: len(node.data))
+    metrics.gauge("journal_events", lambda: node.journal.seq)
+    metrics.gauge("coalescer_pending", lambda: len(node.coalescer.pending))
+    metrics.gauge("wal_unsynced", lambda: node.wal.seq - node.wal.durable_seq)
+    metrics.gauge("hints_pending", lambda: len(node.quorum.hints))
+    metrics.gauge("gossip_view_size", lambda: len(node.gossip.view))
+    metrics.gauge("conflicts_pending", lambda: len(node.conflicts))
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in labels) + "}"
+
+
+class Sampler:
+    # Profileur par échantillonnage : relève périodiquement la pile de tous les threads
+    # (boucle asyncio, pool de traitement, Tk), activable et désactivable à chaud
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        self.interval = interval
+        self.own = Counter()  # fonction en cours d'exécution
+        self.total = Counter()  # fonction présente dans la pile
+        self.samples = 0
+        self.thread = None
+        self.running = False
+
+    def start(self):
+        if self.running:
+            return False
+        self.own.clear()
+        self.total.clear()
+        self.samples = 0
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        return True
+
+    def stop(self):
+        if not self.running:
+            return False
+        self.running = False
+        self.thread.join()
+        return True
+
+    def _run(self):
+        me = threading.get_ident()
+        while self.running:
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                self.samples += 1
+                self.own[describe(frame)] += 1
+                seen = set()
+                while frame is not None:
+                    where = describe(frame)
+                    if where not in seen:
+                        seen.add(where)
+                        self.total[where] += 1
+                    frame = frame.f_back
+            time.sleep(self.interval)
+
+    def report(self, top=TOP):
+        lines = [f"{self.samples} échantillon(s), toutes les {self.interval * 1000:.0f} ms"
+                 f"{' (en cours)' if self.running else ''}", "", "propre  cumulé  fonction"]
+        samples = max(self.samples, 1)
+        for where, own in self.own.most_common(top):
+            lines.append(f"{own / samples:6.1%} {self.total[where] / samples:6.1%}  {where}")
+        return "\n".join(lines) + "\n"
+
+
+def describe(frame):
+    code = frame.f_code
+    return f"{code.co_filename.rsplit('/', 1)[-1]}:{code.co_firstlineno} {code.co_name}"
+
+
+class MetricsServer:
+    # Point d'accès HTTP local : /metrics (texte), /metrics.json, /profile/start, /profile/stop,
+    # /profile (rapport du profileur)
+    def __init__(self, metrics, port, host="localhost", sampler=None):
+        self.metrics = metrics
+        self.sampler = sampler if sampler is not None else Sampler()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                status, body, content_type = server.route(self.path)
+                payload = body.encode()
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def route(self, path):
+        text = "text/plain; charset=utf-8"
+        if path == "/metrics":
+            return 200, self.metrics.render(), text
+        if path == "/metrics.json":
+            return 200, json.dumps(self.metrics.snapshot(), ensure_ascii=False), "application/json"
+        if path == "/profile/start":
+            started = self.sampler.start()
+            return 200, "Profilage démarré\n" if started else "Profilage déjà en cours\n", text
+        if path == "/profile/stop":
+            self.sampler.stop()
+            return 200, self.sampler.report(), text
+        if path == "/profile":
+            return 200, self.sampler.report(), text
+        return 404, "Inconnu : /metrics, /metrics.json, /profile/start, /profile/stop, /profile\n", text
+
+    def stop(self):
+        self.sampler.stop()
+        self.httpd.shutdown()
+        self.httpd.server_close()
@@ -1,74 +1,137 @@
 import tkinter as tk
-from tkinter import ttk, messagebox, simpledialog
-import socket
-import threading
+from tkinter import ttk, messagebox, simpledialog, filedialog
 import json
 import os
+import sys
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from vector_clock import VectorClock, compare, AFTER, CONCURRENT
+from runtime import NodeRuntime
+from codec import SUPPORTED
+from sync import delta_for, entries_for
+from engine import ApplyEngine
+from ingest import IngestPool
+from merkle import MerkleTree
+from causal import CausalIndex
+from placement import Placement, drop, after_delivery
+from quorum import Quorum, TYPES as QUORUM_TYPES
+from batching import WriteCoalescer
+from wal import open_wal
+from storage import open_store
+from render import RenderLoop, DataView, LogView, ConflictPanel
+from conflicts import ConflictStore
+from resolvers import ResolverTable, counter_add, counter_total
+from gossip import Gossip
+from membership import Membership, forget, rename
+from metrics import Metrics, MetricsServer, watch_node
+from service import ClientServer
+from journal import EventJournal, INFO, WRITE, RECEIVE, CONFLICT, IGNORED, SYNC, RENAME, ERROR
 
 CONFIG_FILE = "config.json"
+FILTERS = ("Toutes les clés", "Modifiées depuis", "Concurrentes à")
 
-# --- Vector Clock ---
-class VectorClock:
-    def __init__(self, node_id, all_nodes):
-        self.node_id = node_id
-        self.clock = {nid: 0 for nid in all_nodes}
-
-    def increment(self):
-        self.clock[self.node_id] += 1
-
-    def update(self, received_clock):
-        for node, ts in received_clock.items():
-            self.clock[node] = max(self.clock.get(node, 0), ts)
-        self.increment()
-
-    def rename_node(self, old_id, new_id):
-        if old_id in self.clock:
-            self.clock[new_id] = self.clock.pop(old_id)
-        else:
-            self.clock[new_id] = 0
-        if self.node_id == old_id:
-            self.node_id = new_id
+# --- Message creation (encodage à la frontière réseau, cf. codec.py) ---
+def create_message(sender, clock, key, value, msg_type="data", password=None):
+    return {
+        "type": msg_type,
+        "sender": sender,
+        "clock": clock,
+        "key": key,
+        "value": value,
+        "password": password
+    }
 
-    def happens_before(self, other_clock):
-        return all(self.clock.get(k, 0) <= other_clock.get(k, 0) for k in other_clock) and any(self.clock.get(k, 0) < other_clock.get(k, 0) for k in other_clock)
+def create_batch_message(sender, entries, password=None):
+    return {
+        "type": "batch",
+        "sender": sender,
+        "entries": entries,
+        "password": password
+    }
 
-    def to_dict(self):
-        return self.clock.copy()
+def create_gossip_message(sender, entries, ttl, view=None, origin=None, password=None):
+    return {
+        "type": "gossip",
+        "sender": sender,
+        "entries": entries,
+        "ttl": ttl,
+        "view": view,
+        "origin": origin,
+        "password": password
+    }
 
-    def __repr__(self):
-        return str(self.clock)
+def create_forward_message(sender, entries, op=None, password=None):
+    return {
+        "type": "forward",
+        "sender": sender,
+        "entries": entries,
+        "op": op,
+        "password": password
+    }
 
-# --- Message creation/parsing ---
-def create_message(sender, clock, key, value, msg_type="data", password=None):
-    return json.dumps({
+def create_quorum_message(msg_type, sender, rid, reply_to=None, entries=None, keys=None, key=None, value=None,
+                          w=None, ok=True, password=None):
+    return {
         "type": msg_type,
         "sender": sender,
-        "clock": clock,
+        "rid": rid,
+        "reply_to": reply_to,
+        "entries": entries,
+        "keys": keys,
         "key": key,
         "value": value,
+        "w": w,
+        "ok": ok,
         "password": password
-    }).encode()
+    }
 
 def create_rename_message(old_id, new_id, password=None):
-    return json.dumps({
+    return {
         "type": "rename",
         "old_id": old_id,
         "new_id": new_id,
         "password": password
-    }).encode()
+    }
 
-def create_conflict_resolution_message(sender, key, value, clock, password=None):
-    return json.dumps({
-        "type": "conflict_resolution",
+def create_membership_message(sender, epoch, retiring, retired, password=None):
+    return {
+        "type": "membership",
+        "sender": sender,
+        "epoch": epoch,
+        "retiring": retiring,
+        "retired": retired,
+        "password": password
+    }
+
+def create_membership_ack(sender, epoch, seen, password=None):
+    return {
+        "type": "membership_ack",
+        "sender": sender,
+        "epoch": epoch,
+        "seen": seen,
+        "password": password
+    }
+
+def create_sync_request(sender, clock=None, tree=None, password=None):
+    return {
+        "type": "sync_request",
         "sender": sender,
-        "key": key,
-        "value": value,
         "clock": clock,
+        "tree": tree,
         "password": password
-    }).encode()
+    }
 
-def parse_message(raw_data):
-    return json.loads(raw_data.decode())
+def create_sync_response(sender, data, clock=None, buckets=None, password=None):
+    return {
+        "type": "sync_response",
+        "sender": sender,
+        "data": data,
+        "clock": clock,
+        "buckets": buckets,
+        "password": password
+    }
 
 # --- Main App ---
 class NodeApp:
@@ -81,13 +144,76 @@ class NodeApp:
         self.port = self.config.get("port", 5000)
 
         self.all_nodes = list(self.peers.keys()) + [self.node_id]
+        # Répartition des clés sur un anneau de hachage cohérent : "replication": {"replicas": 2, "vnodes": 64} ;
+        # chaque clé n'est gardée que par ses détenteurs parmi les pairs configurés (tous gardent tout si absent)
+        self.placement = None
+        if self.config.get("replication") is not None:
+            self.placement = Placement(self.node_id, self.peers, **self.config["replication"])
         self.vc = VectorClock(self.node_id, self.all_nodes)
-        self.data = {}
-
-        self.conflict_windows = {}  # Ajouté : dictionnaire pour gérer les fenêtres de conflit ouvertes
+        # Époques d'appartenance : les nœuds retirés sont effacés des horloges une fois que tous
+        # les membres vivants ont vu leur dernier compteur
+        self.membership = Membership(**self.config.get("membership", {}))
+        self.vc.registry.retired.update(self.membership.retired)
+        self.tree = MerkleTree()
+        self.journal = EventJournal(registry=self.vc.registry)
+        self.metrics = Metrics()
+        # Conflits en attente : la réception n'attend jamais l'utilisateur
+        self.conflicts = ConflictStore()
+        # "resolvers": {"compteur:": "counter", "tags:": "set", "": "lww"} ; "manual" par défaut
+        self.resolvers = ResolverTable(self.config.get("resolvers"), default="manual")
+        # Index causal des horloges stockées (changed_since / concurrent_with)
+        self.history = CausalIndex()
+        # Application des écritures par partitions de clés : les threads de réception ne se
+        # croisent que sur une même partition
+        self.engine = ApplyEngine(self)
+        # Stockage sur disque (mmap) : "store_dir": "store" ; en mémoire si absent
+        self.data = open_store(self, self.config.get("store_dir"))
+
+        # Décodage et classement des grands lots sur processus : "ingest": {"workers": 4, "min_entries": 512}
+        self.ingest = IngestPool(**self.config["ingest"]) if self.config.get("ingest") is not None else None
+        # Pool de threads borné pour le traitement (au lieu d'un thread par connexion). "codecs" : encodages
+        # proposés aux pairs, ["json"] pour se passer du binaire (trames plus grosses, encodage en C) ;
+        # "host" : interface d'écoute, toutes par défaut
+        self.runtime = NodeRuntime(self.config.get("host", ''), self.port, self.handle_message, on_send_error=self.on_send_error,
+                                   executor=ThreadPoolExecutor(max_workers=8), timeout=5, metrics=self.metrics,
+                                   ingest=self.ingest, codecs=self.config.get("codecs") or SUPPORTED)
+        # Requêtes à quorum des autres nœuds (réponse à l'adresse configurée de l'émetteur) et indices
+        # pour les pairs injoignables : "quorum": {"timeout": 5.0, "hint_interval": 1.0, "max_hints": 10000}
+        self.quorum = Quorum(self, lambda: self.peers, self.create_quorum, **self.config.get("quorum", {}))
+        # Regroupement optionnel des écritures : "coalesce": {"window_ms": 5, "max_entries": 256}
+        self.coalescer = None
+        coalesce = self.config.get("coalesce")
+        if coalesce:
+            self.coalescer = WriteCoalescer(self.runtime, self.send_batch,
+                                            coalesce.get("window_ms", 5) / 1000, coalesce.get("max_entries", 256))
+        # Diffusion épidémique optionnelle : "gossip": {"fanout": 3, "interval": 1.0, "view_size": 8, "ttl": 6}
+        self.gossip = None
+        if self.config.get("gossip") is not None:
+            self.gossip = Gossip(self, self.peers.values(), self.create_gossip, self.reconcile_with,
+                                 apply=self.apply_gossip, **self.config["gossip"])
+
+        # Journal d'écritures sur disque : "data_dir": "data" (désactivé si absent)
+        self.wal = None
+        replayed = 0
+        if self.config.get("data_dir"):
+            self.wal, replayed = open_wal(self, self.config["data_dir"])
 
         self.setup_ui()
-        threading.Thread(target=self.listen, daemon=True).start()
+        self.root.protocol("WM_DELETE_WINDOW", self.close)
+        if self.wal is not None:
+            self.log_event(f"💾 État restauré : {len(self.data)} clé(s), {replayed} écriture(s) rejouée(s)", "blue")
+        self.runtime.start()
+        if self.gossip is not None:
+            self.gossip.start()
+        # Métriques et profilage : "metrics_port": 9100 -> http://localhost:9100/metrics, /profile/start...
+        watch_node(self.metrics, self)
+        self.metrics_server = None
+        if self.config.get("metrics_port"):
+            self.metrics_server = MetricsServer(self.metrics, self.config["metrics_port"]).start()
+        # Protocole client local (get/set/scan/stats, cf. client.py) : "client": {"port": 6000} ou {"path": "..."}
+        self.client_server = None
+        if self.config.get("client"):
+            self.client_server = ClientServer(self, **self.config["client"]).start()
 
     def load_config(self):
         if os.path.exists(CONFIG_FILE):
@@ -106,6 +232,7 @@ class NodeApp:
         self.config["port"] = self.port
         self.config["password"] = self.password
         self.config["peers"] = self.peers
+        self.config["membership"] = self.membership.state()
         with open(CONFIG_FILE, "w") as f:
             json.dump(self.config, f, indent=2)
 
@@ -134,6 +261,7 @@ class NodeApp:
 
         ttk.Button(frm_input, text="Enregistrer", command=self.set_key).grid(row=0, column=4, padx=10)
         ttk.Button(frm_input, text="Synchroniser", command=self.broadcast_data).grid(row=0, column=5)
+        ttk.Button(frm_input, text="Réconcilier", command=self.reconcile).grid(row=0, column=6, padx=(5, 0))
 
         self.clock_label = ttk.Label(self.tab_data, text="", font=("Courier", 10))
         self.clock_label.pack(pady=5)
@@ -141,16 +269,35 @@ class NodeApp:
         frm_data = ttk.LabelFrame(self.tab_data, text="Données stockées", padding=(10, 5))
         frm_data.pack(fill="both", expand=True, padx=10, pady=5)
 
-        self.data_display = tk.Text(frm_data, height=10, wrap="none", bg="#f0f0f0")
-        self.data_display.pack(fill="both", expand=True)
+        # Filtre causal sur une horloge saisie, ex. "A:3, B:1" (requête sur l'index, sans parcours)
+        frm_filter = ttk.Frame(frm_data)
+        frm_filter.pack(fill="x", pady=(0, 5))
+        self.filter_mode = ttk.Combobox(frm_filter, values=FILTERS, state="readonly", width=18)
+        self.filter_mode.current(0)
+        self.filter_mode.pack(side="left")
+        self.filter_entry = ttk.Entry(frm_filter, width=30)
+        self.filter_entry.pack(side="left", padx=5)
+        ttk.Button(frm_filter, text="Filtrer", command=self.apply_view_filter).pack(side="left")
+        self.view_filter = None  # (mode, horloge) ou None
+
+        # Vue virtualisée : seules les lignes visibles sont dessinées
+        self.data_view = DataView(frm_data, self.row_for, height=10)
+        self.data_view.pack(fill="both", expand=True)
 
         frm_log = ttk.LabelFrame(self.tab_data, text="Journal des événements", padding=(10, 5))
         frm_log.pack(fill="both", expand=True, padx=10, pady=5)
 
-        self.log_display = tk.Text(frm_log, height=7, wrap="word", bg="#fff8dc", fg="black")
-        self.log_display.pack(fill="both", expand=True)
+        ttk.Button(frm_log, text="💾 Exporter", command=self.export_journal).pack(anchor="e")
+        self.log_view = LogView(frm_log, self.journal, height=7)
+        self.log_view.pack(fill="both", expand=True)
+
+        # --- Tab 2: Conflits ---
+        self.tab_conflicts = ttk.Frame(self.tabs)
+        self.tabs.add(self.tab_conflicts, text="Conflits (0)")
+        self.conflict_panel = ConflictPanel(self.tab_conflicts, self.conflicts, self.resolve_conflicts)
+        self.conflict_panel.pack(fill="both", expand=True, padx=10, pady=10)
 
-        # --- Tab 2: Configuration ---
+        # --- Tab 3: Configuration ---
         self.tab_config = ttk.Frame(self.tabs)
         self.tabs.add(self.tab_config, text="Configuration")
 
@@ -193,111 +340,261 @@ class NodeApp:
         ttk.Button(frm_peer_buttons, text="Supprimer", command=self.remove_peer).pack(fill="x", pady=5)
 
         self.refresh_peers_ui()
+        self.ui = RenderLoop(self.root, self.render)
+        self.data_view.load(self.data.keys())
         self.refresh_ui()
 
     # ========== DATA TAB ===========
-    def refresh_ui(self):
+    def refresh_ui(self, rows=False):
+        # Appelable depuis n'importe quel thread : le rendu a lieu à la prochaine trame Tk
+        self.ui.refresh(rows)
+
+    def render(self, keys, rows):
         self.clock_label.config(text=f"🕒 Horloge vectorielle locale : {self.vc}")
-        self.data_display.delete("1.0", tk.END)
-        for k, v in self.data.items():
-            val = v['value']
-            clock = v['clock']
-            self.data_display.insert(tk.END, f"{k:<10} = {val:<10}  |  horloge: {clock}\n")
-
-    def log_event(self, msg, color="black"):
-        self.log_display.insert(tk.END, f"{msg}\n", ("tag",))
-        self.log_display.tag_config("tag", foreground=color)
-        self.log_display.see(tk.END)
-
-    def listen(self):
-        s = socket.socket()
-        s.bind(('', self.port))  # écoute sur toutes interfaces
-        s.listen()
-        while True:
-            conn, _ = s.accept()
-            threading.Thread(target=self.handle_connection, args=(conn,), daemon=True).start()
-
-    def handle_connection(self, conn):
-        with conn:
-            data = conn.recv(4096)
-            if not data:
-                return
-            try:
-                msg = parse_message(data)
-            except:
-                return
-            # Auth
-            if msg.get("password") != self.password:
-                self.log_event(f"🔒 Authentification échouée de {msg.get('sender')}", "red")
-                return
+        if self.view_filter is not None:
+            keys = {key for key in keys if self.matches_filter(key)}
+        self.data_view.update(keys, full=rows)
+        self.log_view.render()
+        self.conflict_panel.render()
+        self.tabs.tab(self.tab_conflicts, text=f"Conflits ({len(self.conflicts)})")
+
+    def apply_view_filter(self):
+        mode = self.filter_mode.get()
+        if mode == FILTERS[0]:
+            self.view_filter = None
+            self.data_view.load(self.data.keys())
+            return
+        index = self.vc.registry.index
+        clock = array('Q', bytes(8 * len(self.vc.registry)))
+        try:
+            for part in self.filter_entry.get().split(","):
+                if part.strip():
+                    name, ts = part.split(":")
+                    clock[index[name.strip()]] = int(ts)
+        except (KeyError, ValueError):
+            messagebox.showerror("Erreur", "Horloge attendue sous la forme A:3, B:1 (nœuds connus uniquement).")
+            return
+        self.view_filter = (mode, clock)
+        if mode == FILTERS[1]:
+            keys = self.history.changed_since(clock)
+        else:
+            keys = self.history.concurrent_with(clock)
+        self.data_view.load(keys)
+
+    def matches_filter(self, key):
+        # Clé modifiée depuis le dernier filtrage : reclassée face à l'horloge du filtre
+        mode, clock = self.view_filter
+        entry = self.data.get(key)
+        if entry is None:
+            return False
+        order = compare(entry["clock"], clock)
+        return order == CONCURRENT if mode == FILTERS[2] else order in (AFTER, CONCURRENT)
+
+    def row_for(self, key):
+        entry = self.data.get(key)
+        if entry is None:
+            return None
+        value = entry["value"]
+        conflict = self.conflicts.get(key)
+        if conflict is not None:
+            value = f"{value} ⚠️ {len(conflict.remotes) + 1} versions"
+        return key, value, self.vc.registry.decode(entry["clock"])
+
+    def log_event(self, msg, color="black", kind=INFO, key=None, sender=None, clock=None):
+        self.journal.record(kind, msg, key=key, sender=sender, clock=clock, color=color)
+        self.metrics.inc("events_total", kind=kind)
+        self.ui.refresh()
+
+    def export_journal(self):
+        path = filedialog.asksaveasfilename(title="Exporter le journal", defaultextension=".jsonl",
+                                            initialfile=f"journal_{self.node_id}.jsonl")
+        if path:
+            count = self.journal.export(path)
+            self.log_event(f"💾 Journal exporté : {count} événement(s) → {path}", "blue")
+
+    def show_node_id(self):
+        self.root.title(f"Nœud {self.node_id}")
+        self.rename_entry.delete(0, tk.END)
+        self.rename_entry.insert(0, self.node_id)
 
-            if msg.get("type") == "rename":
-                old_id = msg["old_id"]
-                new_id = msg["new_id"]
-                self.vc.rename_node(old_id, new_id)
-                if old_id == self.node_id:
-                    self.node_id = new_id
-                    self.config["node_id"] = new_id
-                    self.root.title(f"Nœud {self.node_id}")
-                    self.rename_entry.delete(0, tk.END)
-                    self.rename_entry.insert(0, new_id)
-                self.log_event(f"🔄 Nœud renommé (reçu) : {old_id} → {new_id}", "purple")
-                self.refresh_ui()
-                self.save_config()
-                return
+    def handle_message(self, msg):
+        # Auth
+        if msg.get("password") != self.password:
+            self.log_event(f"🔒 Authentification échouée de {msg.get('sender')}", "red", kind=ERROR, sender=msg.get("sender"))
+            return
 
-            elif msg.get("type") == "conflict_resolution":
-                key = msg["key"]
-                value = msg["value"]
-                clock = msg["clock"]
-                self.data[key] = {"value": value, "clock": clock}
-                self.log_event(f"🛠️ Conflit résolu à distance : {key} = {value}", "purple")
-                self.refresh_ui()
-                return
+        if msg.get("type") == "rename":
+            old_id = msg["old_id"]
+            new_id = msg["new_id"]
+            with self.engine.exclusive():
+                rename(self, old_id, new_id, self.conflicts.clocks())
+            if self.wal is not None:
+                self.wal.append("rename", old_id, new_id)
+            if old_id == self.node_id:
+                self.node_id = new_id
+                self.config["node_id"] = new_id
+                self.ui.call(self.show_node_id)
+                if self.placement is not None:
+                    self.rebalance(self.placement.rename(old_id, new_id))
+            self.log_event(f"🔄 Nœud renommé (reçu) : {old_id} → {new_id}", "purple", kind=RENAME)
+            self.refresh_ui(rows=True)
+            self.save_config()
+            return
 
-            # Type "data"
-            sender = msg["sender"]
-            clock = msg["clock"]
+        elif msg.get("type") == "conflict_resolution":
+            # Envoyé par les versions précédentes ; une résolution circule désormais comme un lot
             key = msg["key"]
             value = msg["value"]
+            clock = self.vc.registry.encode(msg["clock"])
+            self.store(key, value, clock)
+            self.log_event(f"🛠️ Conflit résolu à distance : {key} = {value}", "purple", kind=CONFLICT, key=key, clock=clock)
+            self.refresh_ui()
+            return
 
-            conflict = False
-            if key in self.data:
-                existing_clock = self.data[key]["clock"]
-                if not self.vc.happens_before(clock) and not self.happens_after(clock, existing_clock):
-                    conflict = True
-
-            if conflict:
-                # Fenêtre modale pour choix utilisateur (bloquante)
-                choice = self.ask_user_conflict(
-                    key,
-                    self.data[key]["value"], self.data[key]["clock"],
-                    value, clock
-                )
-                if choice == "local":
-                    self.log_event(f"⚠️ Conflit sur '{key}': conservé localement.", "orange")
-                    # Propager la résolution locale à pairs (forcer à garder local)
-                    res_msg = create_conflict_resolution_message(self.node_id, key,
-                        self.data[key]["value"], self.data[key]["clock"], password=self.password)
-                else:
-                    self.data[key] = {"value": value, "clock": clock}
-                    self.log_event(f"⚠️ Conflit sur '{key}': remplacé par la version distante.", "red")
-                    res_msg = create_conflict_resolution_message(self.node_id, key, value, clock, password=self.password)
+        elif msg.get("type") == "sync_request":
+            self.handle_sync_request(msg)
+            return
 
-                self.refresh_ui()
+        elif msg.get("type") == "sync_response":
+            self.handle_sync_response(msg)
+            return
+
+        elif msg.get("type") == "membership":
+            self.handle_membership(msg)
+            return
 
-                # Propager la résolution aux pairs
-                for peer_name, (host, port) in self.peers.items():
-                    self.send_message(host, port, res_msg)
+        elif msg.get("type") == "membership_ack":
+            self.membership.acknowledge(msg["sender"], msg["seen"])
+            self.check_membership()
+            return
 
+        elif msg.get("type") == "gossip":
+            if self.gossip is not None:
+                self.gossip.receive(msg)
             else:
-                self.vc.update(clock)
-                self.data[key] = {"value": value, "clock": clock}
-                self.log_event(f"✅ Donnée reçue : {key} = {value} de {sender}", "green")
+                self.apply_gossip(msg["sender"], msg["entries"])
+            return
+
+        elif msg.get("type") == "batch":
+            self.engine.apply_batch(msg["sender"], msg["entries"])
+            self.log_event(f"📦 Lot de {len(msg['entries'])} écriture(s) reçu de {msg['sender']}", "green", kind=RECEIVE, sender=msg["sender"])
+            self.refresh_ui()
+            return
+
+        elif msg.get("type") in QUORUM_TYPES:
+            self.quorum.receive(msg)
+            self.refresh_ui()
+            return
+
+        elif msg.get("type") == "forward":
+            # Écritures d'un pair qui ne détient pas ces clés : écrites ici sans second renvoi
+            self.set_local(msg["entries"], update=self.counter_update if msg.get("op") == "incr" else None)
+            self.log_event(f"↪️ {len(msg['entries'])} écriture(s) transmise(s) par {msg['sender']}", "green", kind=RECEIVE, sender=msg["sender"])
+            return
+
+        # Type "data"
+        self.engine.apply(msg["sender"], msg["key"], msg["value"], self.vc.registry.encode(msg["clock"]))
+
+    def apply_gossip(self, sender, entries):
+        if entries:
+            self.engine.apply_batch(sender, entries)
+            self.log_event(f"📣 Rumeur de {len(entries)} écriture(s) reçue de {sender}", "green", kind=RECEIVE, sender=sender)
+            self.refresh_ui()
+
+    def create_gossip(self, sender, entries, ttl, view=None, origin=None):
+        # Le mot de passe est lu à l'envoi : il peut changer depuis l'onglet Configuration
+        return create_gossip_message(sender, entries, ttl, view=view, origin=origin, password=self.password)
+
+    def create_quorum(self, msg_type, sender, rid, **fields):
+        return create_quorum_message(msg_type, sender, rid, password=self.password, **fields)
+
+    def apply(self, sender, key, value, clock, order, merge=True):
+        # Appelé par self.engine, sous le verrou de la partition de key
+        if order == CONCURRENT:
+            local = self.data[key]
+            policy, resolved = self.resolvers.resolve(key, (local["value"], local["clock"]), (value, clock), self.vc.registry)
+            self.engine.merge(clock)
+            if resolved is not None:
+                if resolved[1] is not local["clock"]:
+                    self.store(key, *resolved)
+                self.log_event(f"🤝 Conflit sur '{key}' avec {sender} résolu ({policy}) : {resolved[0]}", "purple", kind=CONFLICT, key=key, sender=sender, clock=resolved[1])
                 self.refresh_ui()
+                return
+            # Stratégie manuelle : les deux versions sont gardées en attente ; la résolution se fait dans l'onglet Conflits
+            self.conflicts.add(key, local["value"], local["clock"], sender, value, clock)
+            self.ui.touch(key)
+            self.log_event(f"⚠️ Conflit sur '{key}' avec {sender} : en attente de résolution.", "red", kind=CONFLICT, key=key, sender=sender, clock=clock)
+            self.refresh_ui()
+
+        elif order == AFTER:
+            if merge:
+                self.engine.update(clock)
+            self.store(key, value, clock)
+            self.log_event(f"✅ Donnée reçue : {key} = {value} de {sender}", "green", kind=RECEIVE, key=key, sender=sender, clock=clock)
+            self.refresh_ui()
+
+        else:
+            self.log_event(f"↩️ Version déjà connue de '{key}' ignorée ({sender})", "gray", kind=IGNORED, key=key, sender=sender, clock=clock)
+
+    def store(self, key, value, clock):
+        self.data[key] = {"value": value, "clock": clock}
+        self.history.update(key, clock)
+        if key in self.conflicts:
+            self.conflicts.settle(key, value, clock)
+        wire_clock = self.vc.registry.decode(clock)
+        self.tree.update(key, value, wire_clock)
+        if self.wal is not None:
+            self.wal.append("put", key, value, wire_clock)
+        self.ui.touch(key)
+
+    def handle_sync_request(self, msg):
+        sender = msg["sender"]
+        if sender not in self.peers:
+            self.log_event(f"❓ Synchronisation demandée par un pair inconnu : {sender}", "gray", kind=SYNC, sender=sender)
+            return
+        host, port = self.peers[sender]
+        if msg.get("tree") is not None:
+            self.handle_tree_step(host, port, msg["tree"], sender)
+            return
+        delta = delta_for(self.data, self.vc.registry.encode(msg["clock"]), self.vc.registry, self.history)
+        delta = self.owned_by(sender, delta)
+        reply = create_sync_response(self.node_id, delta, clock=self.vc.to_dict(), password=self.password)
+        self.runtime.send(host, port, reply)
+        self.log_event(f"🔁 Synchronisation demandée par {sender} : {len(delta)} entrée(s) envoyée(s)", "purple", kind=SYNC, sender=sender)
+
+    def handle_sync_response(self, msg):
+        sender = msg["sender"]
+        if msg.get("clock") is not None and sender in self.peers:
+            # Le pair attend en retour ce qu'il n'a pas encore vu (calculé avant d'appliquer sa réponse)
+            host, port = self.peers[sender]
+            delta = delta_for(self.data, self.vc.registry.encode(msg["clock"]), self.vc.registry, self.history)
+            delta = self.owned_by(sender, delta)
+            if delta:
+                self.runtime.send(host, port, create_sync_response(self.node_id, delta, password=self.password))
+        if msg.get("buckets") is not None and sender in self.peers:
+            host, port = self.peers[sender]
+            entries = self.owned_by(sender, entries_for(self.data, self.tree.keys_in(msg["buckets"]), self.vc.registry))
+            self.runtime.send(host, port, create_sync_response(self.node_id, entries, password=self.password))
+        self.engine.apply_batch(sender, msg["data"])
+        self.log_event(f"🔁 Synchronisation avec {sender} : {len(msg['data'])} entrée(s) reçue(s)", "purple", kind=SYNC, sender=sender)
+
+    def handle_tree_step(self, host, port, tree_msg, sender):
+        # Descente uniquement dans les sous-arbres dont les condensés diffèrent
+        level, mismatched = self.tree.diverging(tree_msg)
+        if not mismatched:
+            return
+        if level < self.tree.depth:
+            reply = create_sync_request(self.node_id, tree=self.tree.descend(level, mismatched), password=self.password)
+        else:
+            entries = self.owned_by(sender, entries_for(self.data, self.tree.keys_in(mismatched), self.vc.registry))
+            reply = create_sync_response(self.node_id, entries, buckets=mismatched, password=self.password)
+        self.runtime.send(host, port, reply)
 
-    def happens_after(self, c1, c2):
-        return all(c1.get(k, 0) >= c2.get(k, 0) for k in c1) and any(c1.get(k, 0) > c2.get(k, 0) for k in c1)
+    def owned_by(self, sender, entries):
+        # Réponses de synchronisation : seulement les clés que le pair détient
+        if self.placement is None:
+            return entries
+        return self.placement.filter(entries, sender)
 
     def set_key(self):
         key = self.key_entry.get().strip()
@@ -305,32 +602,227 @@ class NodeApp:
         if not key or not value:
             messagebox.showinfo("Entrée invalide", "Veuillez remplir les deux champs.")
             return
-        self.vc.increment()
-        clock = self.vc.to_dict()
-        self.data[key] = {"value": value, "clock": clock}
-        self.log_event(f"📤 Mise à jour locale : {key} = {value}", "blue")
+        if self.placement is not None and not self.placement.owns(key):
+            self.set_many([(key, value)])
+            return
+        with self.engine.locked([key]):
+            self.absorb_conflicts([key])
+            clock = self.engine.tick()
+            self.store(key, value, clock)
+        wire_clock = self.vc.registry.decode(clock)
+        self.log_event(f"📤 Mise à jour locale : {key} = {value}", "blue", kind=WRITE, key=key, clock=clock)
         self.refresh_ui()
 
-        msg = create_message(self.node_id, clock, key, value, msg_type="data", password=self.password)
-        for peer_name, (host, port) in self.peers.items():
-            self.send_message(host, port, msg)
+        if self.coalescer is not None:
+            self.coalescer.add(key, value, wire_clock)
+            return
+        if self.placement is not None or self.gossip is not None:
+            self.send_batch([[key, value, wire_clock]])
+            return
+        msg = create_message(self.node_id, wire_clock, key, value, msg_type="data", password=self.password)
+        self.quorum.push(self.peers.values(), msg, [[key, value, wire_clock]])
+
+    def set_many(self, items):
+        items = dict(items)
+        if self.placement is not None:
+            # Clés détenues ailleurs : transmises à leur primaire, qui les horodate et les réplique
+            mine, forwards = self.placement.split(items.items())
+            for (host, port), entries in forwards.items():
+                self.runtime.send(host, port, create_forward_message(self.node_id, entries, password=self.password))
+                self.log_event(f"↪️ {len(entries)} écriture(s) transmise(s) à leur détenteur ({host}:{port})", "blue", kind=WRITE)
+            items = dict(mine)
+        if items:
+            self.set_local(items)
+
+    def set_local(self, items, propagate=True, update=None):
+        # Un seul événement d'horloge pour l'ensemble des clés écrites ; propagate=False : la
+        # réplication est laissée à l'appelant (quorum). update(version locale ou None, valeur) :
+        # valeur à écrire, calculée sous le verrou de la clé
+        items = dict(items)
+        entries = []
+        with self.engine.locked(items):
+            if update is not None:
+                items = {key: update(self.data.get(key), value) for key, value in items.items()}
+            self.absorb_conflicts(items)
+            clock = self.engine.tick()
+            wire_clock = self.vc.registry.decode(clock)
+            for key, value in items.items():
+                self.store(key, value, clock)
+                entries.append([key, value, wire_clock])
+        self.log_event(f"📤 Mise à jour locale groupée : {len(entries)} clé(s)", "blue", kind=WRITE, clock=clock)
+        self.refresh_ui()
+        if not propagate:
+            return entries
+        if self.coalescer is not None:
+            for key, value, _ in entries:
+                self.coalescer.add(key, value, wire_clock)
+        elif entries:
+            self.send_batch(entries)
+        return entries
+
+    # --- Compteurs (client local : op "incr") ---
+    def incr(self, key, amount=1):
+        return self.add_counters({key: amount}).get(key)
+
+    def add_counters(self, amounts):
+        # Seule la part de ce nœud augmente : les ajouts concurrents s'additionnent sous la stratégie "counter"
+        amounts = dict(amounts)
+        if self.placement is not None:
+            mine, forwards = self.placement.split(amounts.items())
+            for (host, port), entries in forwards.items():
+                self.runtime.send(host, port, create_forward_message(self.node_id, entries, op="incr", password=self.password))
+            amounts = dict(mine)
+        entries = self.set_local(amounts, update=self.counter_update) if amounts else []
+        return {key: counter_total(value) for key, value, _ in entries}
+
+    def counter_update(self, current, amount):
+        return counter_add(current["value"] if current is not None else None, self.node_id, amount)
+
+    def absorb_conflicts(self, keys):
+        # Écrire une clé en conflit la résout : la nouvelle version doit dominer toutes ses sœurs
+        for key in keys:
+            conflict = self.conflicts.take(key)
+            if conflict is not None:
+                self.engine.merge(conflict.merged_clock())
+
+    def resolve_conflicts(self, keys, choice):
+        items = {}
+        for key in keys:
+            conflict = self.conflicts.get(key)
+            if conflict is not None:
+                items[key] = conflict.value if choice == "local" else conflict.latest_remote()
+        if items:
+            self.set_many(items.items())
+            label = "version locale" if choice == "local" else "version distante"
+            self.log_event(f"🛠️ {len(items)} conflit(s) résolu(s) : {label} conservée", "purple", kind=CONFLICT)
+
+    def send_batch(self, entries):
+        if self.placement is not None:
+            # Copies vers les seuls autres détenteurs de chaque clé (la rumeur les disperserait)
+            for address, routed in self.placement.route(entries).items():
+                self.quorum.push([address], create_batch_message(self.node_id, routed, password=self.password), routed)
+            return
+        if self.gossip is not None:
+            self.gossip.publish(entries)
+            return
+        self.quorum.push(self.peers.values(), create_batch_message(self.node_id, entries, password=self.password), entries)
 
     def broadcast_data(self):
-        for key, val in self.data.items():
-            msg = create_message(self.node_id, val["clock"], key, val["value"], msg_type="data", password=self.password)
-            for peer_name, (host, port) in self.peers.items():
-                self.send_message(host, port, msg)
-        self.log_event("🔁 Synchronisation forcée avec les pairs", "purple")
+        # Échange de résumés : seules les entrées non vues par chaque côté circulent
+        msg = create_sync_request(self.node_id, self.vc.to_dict(), password=self.password)
+        self.runtime.broadcast(self.peers.values(), msg)
+        self.log_event("🔁 Synchronisation forcée avec les pairs", "purple", kind=SYNC)
+        if self.membership.retiring:
+            # Les membres en retard accusent à nouveau réception une fois rattrapés
+            self.announce_membership()
+
+    def reconcile_with(self, host, port):
+        # La réponse part vers l'adresse connue de l'émetteur : seuls les pairs configurés sont servis
+        self.runtime.send(host, port, create_sync_request(self.node_id, tree=self.tree.start(), password=self.password))
+
+    def reconcile(self):
+        msg = create_sync_request(self.node_id, tree=self.tree.start(), password=self.password)
+        self.runtime.broadcast(self.peers.values(), msg)
+        self.log_event("🌳 Réconciliation par arbre de Merkle lancée", "purple", kind=SYNC)
+
+    def rebalance(self, before):
+        # Seules les clés dont les détenteurs changent circulent ; celles que ce nœud ne détient
+        # plus sont effacées une fois reçues par leurs nouveaux détenteurs
+        sends, drops = self.placement.handoff(list(self.data), before)
+        futures = [self.runtime.send(host, port, create_batch_message(
+                       self.node_id, entries_for(self.data, keys, self.vc.registry), password=self.password))
+                   for (host, port), keys in sends.items()]
+
+        def finish(delivered):
+            if not delivered:
+                self.log_event(f"❌ Rééquilibrage incomplet : {len(drops)} clé(s) conservée(s)", "red", kind=ERROR)
+                return
+            dropped = drop(self, drops)
+            for key in dropped:
+                self.conflicts.take(key)
+            self.ui.call(self.apply_view_filter)
+            self.log_event(f"⚖️ Rééquilibrage : {sum(len(k) for k in sends.values())} copie(s) envoyée(s), "
+                           f"{len(dropped)} clé(s) cédée(s)", "purple", kind=INFO)
+            self.refresh_ui()
+
+        after_delivery(futures, finish)
+
+    # ========== MEMBERSHIP ===========
+    def live_members(self):
+        return [name for name in self.peers if name not in self.membership.retiring] + [self.node_id]
+
+    def retire_node(self, name):
+        if name == self.node_id or not self.membership.retire(name, self.membership_counter(name)):
+            return
+        self.log_event(f"👋 Nœud retiré : {name} (époque {self.membership.epoch})", "purple", kind=INFO)
+        self.save_config()
+        self.announce_membership()
+        self.check_membership()
+
+    def membership_counter(self, name):
+        idx = self.vc.registry.index.get(name)
+        counters = self.vc.snapshot()
+        return counters[idx] if idx is not None else 0
+
+    def announce_membership(self):
+        state = self.membership.state()
+        msg = create_membership_message(self.node_id, state["epoch"], state["retiring"], state["retired"],
+                                        password=self.password)
+        self.runtime.broadcast(self.peers.values(), msg)
+
+    def handle_membership(self, msg):
+        sender = msg["sender"]
+        collected = self.membership.adopt(msg["epoch"], msg["retiring"], msg["retired"])
+        if collected:
+            self.collect_nodes(collected)
+        self.save_config()
+        # Accusé : ce que ce nœud a vu de chaque nœud en cours de retrait
+        if sender in self.peers:
+            host, port = self.peers[sender]
+            ack = create_membership_ack(self.node_id, self.membership.epoch, self.membership.seen(self.vc),
+                                        password=self.password)
+            self.runtime.send(host, port, ack)
+
+    def check_membership(self):
+        self.membership.acknowledge(self.node_id, self.membership.seen(self.vc))
+        names = self.membership.collectable(self.live_members())
+        if names:
+            self.membership.collect(names)
+            self.collect_nodes(names)
+            self.save_config()
+            self.announce_membership()
+
+    def collect_nodes(self, names):
+        rewritten = forget(self, names, self.conflicts.clocks())
+        if self.wal is not None:
+            self.wal.append("forget", names)
+        self.log_event(f"🧹 Entrées d'horloge effacées pour {', '.join(names)} ({rewritten} clé(s) réécrite(s))",
+                       "purple", kind=INFO)
+        self.refresh_ui(rows=True)
+
+    def close(self):
+        if self.metrics_server is not None:
+            self.metrics_server.stop()
+        if self.client_server is not None:
+            self.client_server.stop()
+        if self.gossip is not None:
+            self.gossip.stop()
+        self.quorum.stop()
+        self.runtime.stop()
+        if self.ingest is not None:
+            self.ingest.close()
+        if self.wal is not None:
+            self.wal.close()
+        self.data.close()
+        self.root.destroy()
 
     def send_message(self, host, port, msg):
-        try:
-            s = socket.socket()
-            s.settimeout(5)
-            s.connect((host, port))
-            s.send(msg)
-            s.close()
-        except Exception as e:
-            self.log_event(f"❌ Erreur d'envoi vers {host}:{port} ({e})", "gray")
+        self.runtime.send(host, port, msg)
+
+    def on_send_error(self, host, port, e):
+        self.log_event(f"❌ Erreur d'envoi vers {host}:{port} ({e})", "gray", kind=ERROR)
+        if self.gossip is not None:
+            self.gossip.remove(host, port)
 
     # ========== CONFIG TAB ===========
     def refresh_peers_ui(self):
@@ -345,9 +837,16 @@ class NodeApp:
             if name in self.peers:
                 messagebox.showerror("Erreur", "Ce nom de pair existe déjà.")
                 return
+            if name in self.membership.retired:
+                messagebox.showerror("Erreur", "Ce nom a été retiré du cluster, choisissez-en un autre.")
+                return
             self.peers[name] = (ip, int(port))
+            if self.gossip is not None:
+                self.gossip.merge_view([self.peers[name]])
             self.all_nodes = list(self.peers.keys()) + [self.node_id]
-            self.vc.clock = {nid: self.vc.clock.get(nid, 0) for nid in self.all_nodes}
+            self.vc.registry.intern(name)
+            if self.placement is not None:
+                self.rebalance(self.placement.add(name, self.peers[name]))
             self.save_config()
             self.refresh_peers_ui()
 
@@ -364,10 +863,24 @@ class NodeApp:
             if new_name != name and new_name in self.peers:
                 messagebox.showerror("Erreur", "Ce nom de pair existe déjà.")
                 return
+            if new_name in self.membership.retired:
+                messagebox.showerror("Erreur", "Ce nom a été retiré du cluster, choisissez-en un autre.")
+                return
             del self.peers[name]
+            self.runtime.discard(ip, port)
             self.peers[new_name] = (new_ip, int(new_port))
+            if self.gossip is not None:
+                self.gossip.remove(ip, port)
+                self.gossip.merge_view([self.peers[new_name]])
             self.all_nodes = list(self.peers.keys()) + [self.node_id]
-            self.vc.clock = {nid: self.vc.clock.get(nid, 0) for nid in self.all_nodes}
+            self.vc.registry.intern(new_name)
+            if self.placement is not None:
+                before = self.placement.remove(name)
+                self.placement.add(new_name, self.peers[new_name])
+                self.rebalance(before)
+            if new_name != name:
+                # L'ancien nom quitte le cluster : ses entrées seront effacées une fois confirmées
+                self.retire_node(name)
             self.save_config()
             self.refresh_peers_ui()
 
@@ -378,9 +891,14 @@ class NodeApp:
             return
         name = selected[0]
         if messagebox.askyesno("Confirmation", f"Supprimer le pair '{name}' ?"):
-            del self.peers[name]
+            host, port = self.peers.pop(name)
+            self.runtime.discard(host, port)
+            if self.gossip is not None:
+                self.gossip.remove(host, port)
             self.all_nodes = list(self.peers.keys()) + [self.node_id]
-            self.vc.clock = {nid: self.vc.clock.get(nid, 0) for nid in self.all_nodes}
+            if self.placement is not None:
+                self.rebalance(self.placement.remove(name))
+            self.retire_node(name)
             self.save_config()
             self.refresh_peers_ui()
 
@@ -397,68 +915,21 @@ class NodeApp:
 
         old_id = self.node_id
         self.node_id = new_name
-        self.vc.rename_node(old_id, new_name)
+        with self.engine.exclusive():
+            rename(self, old_id, new_name, self.conflicts.clocks())
+        if self.wal is not None:
+            self.wal.append("rename", old_id, new_name)
         self.root.title(f"Nœud {self.node_id}")
-        self.log_event(f"🔧 Nom modifié localement : {old_id} → {new_name}", "blue")
+        if self.placement is not None:
+            self.rebalance(self.placement.rename(old_id, new_name))
+        self.log_event(f"🔧 Nom modifié localement : {old_id} → {new_name}", "blue", kind=RENAME)
         self.save_config()
-        self.refresh_ui()
+        self.refresh_ui(rows=True)
 
         # Informer les pairs
         msg = create_rename_message(old_id, new_name, password=self.password)
-        for peer_name, (host, port) in self.peers.items():
-            self.send_message(host, port, msg)
-
-    # --- Fenêtre modale pour conflit ---
-    def ask_user_conflict(self, key, local_value, local_clock, remote_value, remote_clock):
-        # Fermeture de toutes les autres fenêtres conflit ouvertes dès qu'un choix est fait
-        if key in self.conflict_windows:
-            existing_win = self.conflict_windows[key]
-            existing_win.lift()
-            self.root.wait_window(existing_win)
-            existing_win.destroy()
-            del self.conflict_windows[key]
-
-        dlg = tk.Toplevel(self.root)
-        dlg.title(f"Conflit détecté sur '{key}'")
-
-        ttk.Label(dlg, text="Valeur locale :").pack(anchor="w", padx=10, pady=(10, 0))
-        ttk.Label(dlg, text=f"{local_value} (horloge: {local_clock})", foreground="blue").pack(anchor="w", padx=20)
-
-        ttk.Label(dlg, text="Valeur distante :").pack(anchor="w", padx=10, pady=(10, 0))
-        ttk.Label(dlg, text=f"{remote_value} (horloge: {remote_clock})", foreground="green").pack(anchor="w", padx=20)
-
-        choice = tk.StringVar(value="")
-
-        def close_all_conflict_windows():
-            for k, win in list(self.conflict_windows.items()):
-                if win is not dlg:
-                    win.destroy()
-                    del self.conflict_windows[k]
-
-        def keep_local():
-            choice.set("local")
-            close_all_conflict_windows()
-            dlg.destroy()
-
-        def keep_remote():
-            choice.set("remote")
-            close_all_conflict_windows()
-            dlg.destroy()
-
-        frm_buttons = ttk.Frame(dlg)
-        frm_buttons.pack(pady=15)
-        ttk.Button(frm_buttons, text="Garder local", command=keep_local).pack(side="left", padx=10)
-        ttk.Button(frm_buttons, text="Garder distant", command=keep_remote).pack(side="right", padx=10)
-
-        dlg.grab_set()
-        self.conflict_windows[key] = dlg
-        self.root.wait_window(dlg)
-
-        if key in self.conflict_windows:
-            del self.conflict_windows[key]
-
-        return choice.get()
-    
+        self.runtime.broadcast(self.peers.values(), msg)
+
     # --- Modifier mot de passe ---
     def change_password(self):
         new_pass = self.pass_entry.get().strip()
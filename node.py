@@ -1,71 +1,526 @@
+import argparse
+import json
+import signal
 import socket
 import threading
-from vector_clock import VectorClock
-from message import create_message, parse_message
+
+from vector_clock import VectorClock, CONCURRENT, AFTER
+from message import create_message, create_batch_message, create_gossip_message, create_sync_request, create_sync_response, create_forward_message, \
+    create_quorum_message
+from sync import delta_for, entries_for
+from engine import ApplyEngine
+from ingest import IngestPool
+from concurrent.futures import ThreadPoolExecutor
+from merkle import MerkleTree
+from causal import CausalIndex
+from placement import Placement, drop, after_delivery
+from quorum import Quorum, QuorumError, TYPES as QUORUM_TYPES
+from runtime import NodeRuntime
+from batching import WriteCoalescer
+from wal import open_wal
+from storage import open_store
+from resolvers import ResolverTable, counter_add, counter_total
+from gossip import Gossip
+from journal import EventJournal, INFO, RECEIVE, CONFLICT, IGNORED, ERROR
+from metrics import Metrics, MetricsServer, Sampler, watch_node
+from service import ClientServer
+from codec import SUPPORTED
 
 class Node:
-    def __init__(self, node_id, all_nodes, port, peers):
+    def __init__(self, node_id, all_nodes, port, peers, coalesce_window=None, coalesce_max=256, data_dir=None, store_dir=None,
+                 resolvers=None, gossip=None, runtime_factory=NodeRuntime, metrics_port=None, ingest=None,
+                 replication=None, quorum=None, client=None, codecs=None, host="localhost", advertise=None, workers=4):
         self.node_id = node_id
+        # host : interface d'écoute ; advertise : hôte par lequel les pairs joignent ce nœud, annoncé
+        # dans les reply_to (host par défaut, le nom de la machine si host est une interface joker)
+        self.host = host
+        self.address = (advertise or advertised_host(host), port)
         self.vc = VectorClock(node_id, all_nodes)
-        self.data = {}
+        self.tree = MerkleTree()
+        self.journal = EventJournal(registry=self.vc.registry)
+        # Compteurs et histogrammes, exposés en HTTP sur localhost:metrics_port si demandé
+        self.metrics = Metrics()
+        self.sampler = Sampler()
+        self.metrics_port = metrics_port
+        self.metrics_server = None
+        # Protocole client local (get/set/scan/stats) : {"port": 6000} ou {"path": "/tmp/A.sock"}
+        self.client = client
+        self.client_server = None
+        # Index causal des horloges stockées (changed_since / concurrent_with)
+        self.history = CausalIndex()
+        # Application des écritures par partitions de clés, chacune sous son propre verrou
+        self.engine = ApplyEngine(self)
+        self.data = open_store(self, store_dir)
         self.port = port
-        self.peers = peers  # list of (host, port)
+        # peers : [(hôte, port)] ou {nom: (hôte, port)} ; les noms sont ceux des nœuds (node_id)
+        self.members = {name: tuple(address) for name, address in peers.items()} if isinstance(peers, dict) else None
+        self.peers = list(self.members.values()) if self.members is not None else peers  # list of (host, port)
+        # Répartition des clés sur un anneau de hachage cohérent : {"replicas": 2, "vnodes": 64} ; chaque
+        # clé n'est gardée que par ses détenteurs. Les membres de l'anneau sont les noms des nœuds, les
+        # mêmes partout : les pairs doivent alors être nommés. Sans elle, tous gardent tout.
+        self.placement = None
+        if replication is not None:
+            if self.members is None:
+                raise ValueError("Répartition des clés : pairs à nommer ({nom: (hôte, port)})")
+            self.placement = Placement(node_id, self.members, **replication)
+        # Stratégie de résolution des conflits par préfixe de clé, ex. {"compteur:": "counter"}
+        self.resolvers = ResolverTable(resolvers, default="lww")
+        # Décodage et classement des grands lots sur un pool de processus : {"workers": 4, "min_entries": 512}.
+        # Les lots de plusieurs pairs sont alors traités par autant de threads, chacun attendant son processus.
+        self.ingest = IngestPool(**ingest) if ingest is not None else None
+        # Traitement des messages sur un pool de threads borné, hors de la boucle réseau : self.engine
+        # sérialise les écritures d'une même partition, les autres s'appliquent en parallèle
+        if self.ingest is not None:
+            workers = max(workers, self.ingest.workers)
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        # runtime_factory : NodeRuntime (sockets) ou SimNetwork.runtime (réseau simulé, cf. simulate.py).
+        # codecs : encodages proposés aux pairs par ordre de préférence, ["json"] pour se passer du
+        # binaire (trames plus grosses mais encodage en C, cf. codec.SUPPORTED)
+        self.runtime = runtime_factory(host, port, self.handle_message, on_send_error=self.on_send_error,
+                                       metrics=self.metrics, executor=self.executor, ingest=self.ingest,
+                                       codecs=codecs or SUPPORTED)
+        # Lectures/écritures à quorum (put/get) et indices pour les pairs injoignables :
+        # {"timeout": 5.0, "hint_interval": 1.0, "max_hints": 10000}
+        self.quorum = Quorum(self, self.named_peers, create_quorum_message, address=self.address,
+                             **(quorum or {}))
+        # Fenêtre de regroupement des écritures sortantes (en secondes), désactivée par défaut
+        self.coalescer = None
+        if coalesce_window is not None:
+            self.coalescer = WriteCoalescer(self.runtime, self.send_batch, coalesce_window, coalesce_max)
+        # Mode gossip : {"fanout": 3, "interval": 1.0, "view_size": 8, "ttl": 6} ; peers sert de vue initiale
+        self.gossip = None
+        if gossip is not None:
+            self.gossip = Gossip(self, self.peers, create_gossip_message, self.reconcile_with,
+                                 address=self.address, **gossip)
+        # Journal d'écritures sur disque, désactivé par défaut
+        self.wal = None
+        if data_dir is not None:
+            self.wal, replayed = open_wal(self, data_dir)
+            self.log_event(f"💾 État restauré : {len(self.data)} clé(s), {replayed} écriture(s) rejouée(s)")
+
+    def start(self, interactive=True):
+        self.runtime.start()
+        watch_node(self.metrics, self)
+        if self.metrics_port is not None:
+            self.metrics_server = MetricsServer(self.metrics, self.metrics_port, sampler=self.sampler).start()
+        if self.client is not None:
+            self.client_server = ClientServer(self, **self.client).start()
+        if self.gossip is not None:
+            self.gossip.start()
+        if interactive:
+            print(f"[{self.node_id}] Démarré sur le port {self.port}")
+            self.repl()
 
-    def start(self):
-        threading.Thread(target=self.listen, daemon=True).start()
-        print(f"[{self.node_id}] Démarré sur le port {self.port}")
+    def repl(self):
         while True:
             cmd = input(">>> ")
             if cmd.startswith("set"):
                 _, key, value = cmd.split()
                 self.set_key(key, value)
-
-    def listen(self):
-        s = socket.socket()
-        s.bind(('localhost', self.port))
-        s.listen()
-        while True:
-            conn, _ = s.accept()
-            data = conn.recv(4096)
-            if data:
-                msg = parse_message(data)
-                self.handle_message(msg)
+            elif cmd.startswith("put"):
+                # put clé valeur [w] ; w trop grand ou délai dépassé : erreur affichée, la session continue
+                args = cmd.split()
+                try:
+                    print(f"[{self.node_id}] ✅ {args[1]} écrit : {self.put(args[1], args[2], *map(int, args[3:]))}")
+                except (ValueError, QuorumError) as e:
+                    print(f"[{self.node_id}] ❌ {e}")
+            elif cmd.startswith("get"):
+                # get clé [r]
+                args = cmd.split()
+                try:
+                    print(f"[{self.node_id}] {args[1]} = {self.get(args[1], *map(int, args[2:]))}")
+                except (ValueError, QuorumError) as e:
+                    print(f"[{self.node_id}] ❌ {e}")
+            elif cmd.startswith("incr"):
+                # incr clé [quantité] : compteur (stratégie "counter"), seule la part de ce nœud change
+                args = cmd.split()
+                try:
+                    print(f"[{self.node_id}] {args[1]} = {self.incr(args[1], *map(int, args[2:]))}")
+                except ValueError as e:
+                    print(f"[{self.node_id}] ❌ {e}")
+            elif cmd.startswith("mset"):
+                args = cmd.split()[1:]
+                self.set_many(zip(args[::2], args[1::2]))
+            elif cmd == "sync":
+                self.sync()
+            elif cmd == "reconcile":
+                self.reconcile()
+            elif cmd == "metrics":
+                print(self.metrics.render(), end="")
+            elif cmd == "profile start":
+                self.sampler.start()
+                print(f"[{self.node_id}] 🔬 Profilage démarré")
+            elif cmd == "profile stop":
+                self.sampler.stop()
+                print(self.sampler.report(), end="")
+            elif cmd.startswith("export"):
+                _, path = cmd.split()
+                print(f"[{self.node_id}] 💾 {self.journal.export(path)} événement(s) exporté(s) vers {path}")
 
     def handle_message(self, msg):
+        msg_type = msg.get("type", "data")
+        if msg_type == "sync_request":
+            self.handle_sync_request(msg)
+            return
+        if msg_type == "sync_response":
+            self.handle_sync_response(msg)
+            return
+        if msg_type == "gossip":
+            if self.gossip is not None:
+                self.gossip.receive(msg)
+            else:
+                self.engine.apply_batch(msg["sender"], msg["entries"])
+            return
+        if msg_type == "batch":
+            self.engine.apply_batch(msg["sender"], msg["entries"])
+            return
+        if msg_type in QUORUM_TYPES:
+            self.quorum.receive(msg)
+            return
+        if msg_type == "forward":
+            # Écritures transmises par un nœud qui ne détient pas ces clés : pas de second renvoi
+            self.set_local(msg["entries"], update=self.counter_update if msg.get("op") == "incr" else None)
+            return
+
+        self.engine.apply(msg["sender"], msg["key"], msg["value"], self.vc.registry.encode(msg["clock"]))
+
+    def apply(self, sender, key, value, clock, order, merge=True):
+        # Appelé par self.engine, sous le verrou de la partition de key
+        if order == CONCURRENT:
+            local = self.data[key]
+            policy, resolved = self.resolvers.resolve(key, (local["value"], local["clock"]), (value, clock), self.vc.registry)
+            self.engine.merge(clock)
+            if resolved is None:
+                self.log_event(f"⚠️ Conflit détecté sur {key} avec {sender} : version locale conservée", kind=CONFLICT, key=key, sender=sender, clock=clock)
+                return
+            if resolved[1] is not local["clock"]:
+                self.store(key, *resolved)
+            self.log_event(f"🤝 Conflit sur {key} avec {sender} résolu ({policy}) : {resolved[0]}", kind=CONFLICT, key=key, sender=sender, clock=resolved[1])
+        elif order == AFTER:
+            if merge:
+                self.engine.update(clock)
+            self.store(key, value, clock)
+            self.log_event(f"✅ Reçu {key} = {value} de {sender}", kind=RECEIVE, key=key, sender=sender, clock=clock)
+        else:
+            self.log_event(f"↩️ Version déjà connue de {key} ignorée ({sender})", kind=IGNORED, key=key, sender=sender, clock=clock)
+
+    def log_event(self, msg, kind=INFO, key=None, sender=None, clock=None):
+        self.journal.record(kind, msg, key=key, sender=sender, clock=clock)
+        self.metrics.inc("events_total", kind=kind)
+        print(f"[{self.node_id}] {msg}")
+
+    def store(self, key, value, clock):
+        self.data[key] = {"value": value, "clock": clock}
+        self.history.update(key, clock)
+        wire_clock = self.vc.registry.decode(clock)
+        self.tree.update(key, value, wire_clock)
+        if self.wal is not None:
+            self.wal.append("put", key, value, wire_clock)
+
+    def sync(self):
+        msg = create_sync_request(self.node_id, self.vc.to_dict(), reply_to=self.address)
+        self.runtime.broadcast(self.peers, msg)
+
+    def reconcile_with(self, host, port):
+        msg = create_sync_request(self.node_id, reply_to=self.address, tree=self.tree.start())
+        self.runtime.send(host, port, msg)
+
+    def reconcile(self):
+        msg = create_sync_request(self.node_id, reply_to=self.address, tree=self.tree.start())
+        self.runtime.broadcast(self.peers, msg)
+
+    def handle_sync_request(self, msg):
+        host, port = msg["reply_to"]
+        if msg.get("tree") is not None:
+            self.handle_tree_step(msg["sender"], host, port, msg["tree"])
+            return
+        delta = delta_for(self.data, self.vc.registry.encode(msg["clock"]), self.vc.registry, self.history)
+        delta = self.owned_by(msg["sender"], delta)
+        reply = create_sync_response(self.node_id, delta, clock=self.vc.to_dict(), reply_to=self.address)
+        self.runtime.send(host, port, reply)
+
+    def handle_sync_response(self, msg):
         sender = msg["sender"]
-        clock = msg["clock"]
-        key = msg["key"]
-        value = msg["value"]
-
-        conflict = False
-        if key in self.data:
-            existing_clock = self.data[key]["clock"]
-            if not self.vc.happens_before(clock) and not self.happens_after(clock, existing_clock):
-                conflict = True
-
-        if conflict:
-            print(f"[{self.node_id}] ⚠️ Conflit détecté sur {key} avec {sender}")
-            self.data[key] = {"value": value, "clock": clock}
+        if msg.get("clock") is not None:
+            # Le pair attend en retour ce qu'il n'a pas encore vu (calculé avant d'appliquer sa réponse)
+            host, port = msg["reply_to"]
+            delta = delta_for(self.data, self.vc.registry.encode(msg["clock"]), self.vc.registry, self.history)
+            delta = self.owned_by(sender, delta)
+            if delta:
+                self.runtime.send(host, port, create_sync_response(self.node_id, delta))
+        if msg.get("buckets") is not None:
+            host, port = msg["reply_to"]
+            entries = entries_for(self.data, self.tree.keys_in(msg["buckets"]), self.vc.registry)
+            self.runtime.send(host, port, create_sync_response(self.node_id, self.owned_by(sender, entries)))
+        self.engine.apply_batch(sender, msg["data"])
+
+    def handle_tree_step(self, sender, host, port, tree_msg):
+        # Descente uniquement dans les sous-arbres dont les condensés diffèrent
+        level, mismatched = self.tree.diverging(tree_msg)
+        if not mismatched:
+            return
+        if level < self.tree.depth:
+            reply = create_sync_request(self.node_id, reply_to=self.address,
+                                        tree=self.tree.descend(level, mismatched))
         else:
-            self.vc.update(clock)
-            self.data[key] = {"value": value, "clock": clock}
-            print(f"[{self.node_id}] ✅ Reçu {key} = {value} de {sender}")
+            entries = self.owned_by(sender, entries_for(self.data, self.tree.keys_in(mismatched), self.vc.registry))
+            reply = create_sync_response(self.node_id, entries, reply_to=self.address, buckets=mismatched)
+        self.runtime.send(host, port, reply)
+
+    def named_peers(self):
+        # {nom: adresse} ; des pairs non nommés sont désignés par leur adresse, que leurs accusés (signés
+        # du nom de nœud) ne citent pas : à l'expiration d'un put, ils reçoivent un indice de trop, sans effet
+        if self.members is not None:
+            return self.members
+        return {f"{host}:{port}": (host, port) for host, port in self.peers}
 
-    def happens_after(self, c1, c2):
-        return all(c1[k] >= c2[k] for k in c1) and any(c1[k] > c2[k] for k in c1)
+    def owned_by(self, member, entries):
+        # Réponses de synchronisation : seulement les clés que le pair (nom de nœud) détient
+        if self.placement is None:
+            return entries
+        return self.placement.filter(entries, member)
 
     def set_key(self, key, value):
-        self.vc.increment()
-        self.data[key] = {"value": value, "clock": self.vc.to_dict()}
-        msg = create_message(self.node_id, self.vc.to_dict(), key, value)
-        for host, port in self.peers:
-            self.send_message(host, port, msg)
+        if self.placement is not None:
+            self.set_many([(key, value)])
+            return
+        with self.engine.locked([key]):
+            clock = self.engine.tick()
+            self.store(key, value, clock)
+        wire_clock = self.vc.registry.decode(clock)
+        if self.coalescer is not None:
+            self.coalescer.add(key, value, wire_clock)
+            return
+        if self.gossip is not None:
+            self.gossip.publish([[key, value, wire_clock]])
+            return
+        msg = create_message(self.node_id, wire_clock, key, value)
+        self.quorum.push(self.peers, msg, [[key, value, wire_clock]])
+
+    def set_many(self, items):
+        items = dict(items)
+        if self.placement is not None:
+            # Clés détenues ailleurs : transmises à leur primaire, qui les horodate et les réplique
+            mine, forwards = self.placement.split(items.items())
+            for (host, port), entries in forwards.items():
+                self.runtime.send(host, port, create_forward_message(self.node_id, entries))
+            items = dict(mine)
+        if items:
+            self.set_local(items)
+
+    def set_local(self, items, propagate=True, update=None):
+        # Un seul événement d'horloge pour l'ensemble des clés écrites ; propagate=False : la
+        # réplication est laissée à l'appelant (quorum). update(version locale ou None, valeur) :
+        # valeur à écrire, calculée sous le verrou de la clé
+        items = dict(items)
+        entries = []
+        with self.engine.locked(items):
+            if update is not None:
+                items = {key: update(self.data.get(key), value) for key, value in items.items()}
+            clock = self.engine.tick()
+            wire_clock = self.vc.registry.decode(clock)
+            for key, value in items.items():
+                self.store(key, value, clock)
+                entries.append([key, value, wire_clock])
+        if not propagate:
+            return entries
+        if self.coalescer is not None:
+            for key, value, _ in entries:
+                self.coalescer.add(key, value, wire_clock)
+        elif entries:
+            self.send_batch(entries)
+        return entries
+
+    # --- Compteurs ---
+    def incr(self, key, amount=1):
+        # Rend le total local (None : clé détenue ailleurs, ajout transmis à son primaire)
+        return self.add_counters({key: amount}).get(key)
+
+    def add_counters(self, amounts):
+        # Compteurs à parts par nœud (resolvers.counter_add) : les ajouts concurrents de nœuds
+        # différents s'additionnent à la fusion, si la clé relève de la stratégie "counter"
+        amounts = dict(amounts)
+        if self.placement is not None:
+            mine, forwards = self.placement.split(amounts.items())
+            for (host, port), entries in forwards.items():
+                self.runtime.send(host, port, create_forward_message(self.node_id, entries, op="incr"))
+            amounts = dict(mine)
+        entries = self.set_local(amounts, update=self.counter_update) if amounts else []
+        return {key: counter_total(value) for key, value, _ in entries}
+
+    def counter_update(self, current, amount):
+        return counter_add(current["value"] if current is not None else None, self.node_id, amount)
+
+    def send_batch(self, entries):
+        if self.placement is not None:
+            # Copies vers les seuls autres détenteurs de chaque clé (la rumeur les disperserait)
+            for address, routed in self.placement.route(entries).items():
+                self.quorum.push([address], create_batch_message(self.node_id, routed), routed)
+            return
+        if self.gossip is not None:
+            self.gossip.publish(entries)
+            return
+        self.quorum.push(self.peers, create_batch_message(self.node_id, entries), entries)
+
+    # --- Quorum ---
+    def put(self, key, value, w=1, timeout=None):
+        # Rend l'horloge de la version écrite une fois w répliques l'ayant acquittée (QuorumError sinon)
+        return self.quorum.put(key, value, w).result(timeout)
+
+    def get(self, key, r=1, timeout=None):
+        # Versions [[valeur, horloge]] réconciliées sur r réponses : vide si absente, plusieurs si concurrentes
+        return self.quorum.get(key, r).result(timeout)
+
+    # --- Membres ---
+    def add_peer(self, host, port, name=None):
+        # Nom vérifié avant tout changement : un refus ne laisse pas de pair à moitié inscrit
+        if self.placement is not None and name is None:
+            raise ValueError("Répartition des clés : nom du pair requis")
+        if (host, port) not in self.peers:
+            self.peers.append((host, port))
+        if name is not None and self.members is not None:
+            self.members[name] = (host, port)
+        if self.gossip is not None:
+            self.gossip.merge_view([(host, port)])
+        if self.placement is not None:
+            self.rebalance(self.placement.add(name, (host, port)))
+
+    def remove_peer(self, host, port):
+        if (host, port) in self.peers:
+            self.peers.remove((host, port))
+        name = None
+        if self.members is not None:
+            name = next((n for n, address in self.members.items() if address == (host, port)), None)
+            self.members.pop(name, None)
+        self.runtime.discard(host, port)
+        if self.gossip is not None:
+            self.gossip.remove(host, port)
+        if self.placement is not None and name is not None:
+            self.rebalance(self.placement.remove(name))
+
+    def rebalance(self, before):
+        # Seules les clés dont les détenteurs changent circulent ; celles que ce nœud ne détient
+        # plus sont effacées une fois reçues par leurs nouveaux détenteurs
+        sends, drops = self.placement.handoff(list(self.data), before)
+        futures = [self.runtime.send(host, port, create_batch_message(self.node_id, entries_for(self.data, keys, self.vc.registry)))
+                   for (host, port), keys in sends.items()]
+
+        def finish(delivered):
+            if not delivered:
+                self.log_event(f"❌ Rééquilibrage incomplet : {len(drops)} clé(s) conservée(s)", kind=ERROR)
+                return
+            dropped = drop(self, drops)
+            self.log_event(f"⚖️ Rééquilibrage : {sum(len(k) for k in sends.values())} copie(s) envoyée(s), "
+                           f"{len(dropped)} clé(s) cédée(s)")
+
+        after_delivery(futures, finish)
+
+    def stop(self):
+        if self.metrics_server is not None:
+            self.metrics_server.stop()
+        if self.client_server is not None:
+            self.client_server.stop()
+        if self.gossip is not None:
+            self.gossip.stop()
+        self.quorum.stop()
+        self.runtime.stop()
+        self.executor.shutdown(wait=False)
+        if self.ingest is not None:
+            self.ingest.close()
+        if self.wal is not None:
+            self.wal.close()
+        self.data.close()
 
     def send_message(self, host, port, msg):
+        self.runtime.send(host, port, msg)
+
+    def on_send_error(self, host, port, error):
+        self.log_event(f"❌ Échec d'envoi à {host}:{port}", kind=ERROR)
+        if self.gossip is not None:
+            self.gossip.remove(host, port)
+
+
+# --- Point d'entrée : python3 node.py A 5000 B:5001,C:5002 [--config config.json] [--headless] ---
+def parse_peer(spec):
+    # "B:5001" (localhost) ou "B:hôte:5001"
+    parts = spec.split(":")
+    name, host, port = (parts[0], "localhost", parts[1]) if len(parts) == 2 else parts
+    return name, (host, int(port))
+
+
+def advertised_host(host):
+    # Écoute sur toutes les interfaces : les pairs joignent ce nœud par le nom de la machine
+    return socket.gethostname() if host in ("", "0.0.0.0", "::") else host
+
+
+def node_options(config):
+    # Clés du config.json de l'application multi-machines ; mot de passe ignoré
+    options = {name: config[name] for name in ("data_dir", "store_dir", "resolvers", "gossip", "metrics_port",
+                                               "ingest", "replication", "quorum", "client", "codecs", "advertise", "workers")
+               if config.get(name)}
+    if config.get("host") is not None:
+        # "" : toutes les interfaces
+        options["host"] = config["host"]
+    coalesce = config.get("coalesce")
+    if coalesce:
+        options["coalesce_window"] = coalesce.get("window_ms", 5) / 1000
+        options["coalesce_max"] = coalesce.get("max_entries", 256)
+    return options
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Nœud à horloges vectorielles, en REPL ou en démon sans affichage")
+    parser.add_argument("node_id", nargs="?")
+    parser.add_argument("port", nargs="?", type=int)
+    parser.add_argument("peers", nargs="?", default="", help="B:5001,C:5002 ou B:hôte:5001,...")
+    parser.add_argument("--config", help="fichier JSON au format de config.json (multi_machine)")
+    parser.add_argument("--headless", action="store_true", help="sans REPL, jusqu'à SIGINT/SIGTERM")
+    parser.add_argument("--client-port", type=int, help="protocole client sur localhost:PORT")
+    parser.add_argument("--client-socket", help="protocole client sur une socket Unix")
+    parser.add_argument("--data-dir")
+    parser.add_argument("--store-dir")
+    parser.add_argument("--metrics-port", type=int)
+    parser.add_argument("--host", help="interface d'écoute (localhost par défaut, 0.0.0.0 : toutes)")
+    parser.add_argument("--advertise", help="hôte annoncé aux pairs pour les réponses (défaut : --host)")
+    args = parser.parse_args(argv)
+
+    config = {}
+    if args.config:
+        with open(args.config) as f:
+            config = json.load(f)
+    node_id = args.node_id or config.get("node_id")
+    port = args.port or config.get("port")
+    if node_id is None or port is None:
+        parser.error("nom du nœud et port requis (arguments ou --config)")
+    peers = {name: tuple(address) for name, address in config.get("peers", {}).items()}
+    peers.update(parse_peer(spec) for spec in args.peers.split(",") if spec)
+    options = node_options(config)
+    for name in ("data_dir", "store_dir", "metrics_port", "host", "advertise"):
+        if getattr(args, name) is not None:
+            options[name] = getattr(args, name)
+    if args.client_port is not None:
+        options["client"] = {"port": args.client_port}
+    elif args.client_socket is not None:
+        options["client"] = {"path": args.client_socket}
+
+    node = Node(node_id, [node_id, *peers], port, peers, **options)
+    node.start(interactive=False)
+    print(f"[{node_id}] Démarré sur le port {port}")
+    if not args.headless:
         try:
-            s = socket.socket()
-            s.connect((host, port))
-            s.send(msg)
-            s.close()
-        except:
-            print(f"[{self.node_id}] ❌ Échec d'envoi à {host}:{port}")
+            node.repl()
+        except (EOFError, KeyboardInterrupt):
+            pass
+        node.stop()
+        return
+    stopping = threading.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, lambda *_: stopping.set())
+    while not stopping.wait(1):
+        pass
+    print(f"[{node_id}] Arrêt")
+    node.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+import bisect
+import hashlib
+import threading
+
+VNODES = 64
+REPLICAS = 3
+
+
+def position(label):
+    return int.from_bytes(hashlib.blake2b(label.encode(), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    # Anneau de hachage cohérent : chaque membre y pose `vnodes` points ; une clé appartient aux
+    # `replicas` premiers membres distincts rencontrés après son hachage. Ajouter ou retirer un
+    # membre ne déplace que les arcs voisins de ses points.
+    def __init__(self, members=(), vnodes=VNODES, replicas=REPLICAS):
+        self.vnodes = vnodes
+        self.replicas = replicas
+        self.members = set()
+        self.points = []  # positions triées
+        self.holders = []  # membre de chaque position
+        for member in members:
+            self.add(member)
+
+    def add(self, member):
+        if member in self.members:
+            return
+        self.members.add(member)
+        for i in range(self.vnodes):
+            point = position(f"{member}#{i}")
+            at = bisect.bisect(self.points, point)
+            self.points.insert(at, point)
+            self.holders.insert(at, member)
+
+    def remove(self, member):
+        if member not in self.members:
+            return
+        self.members.discard(member)
+        kept = [(p, m) for p, m in zip(self.points, self.holders) if m != member]
+        self.points = [p for p, _ in kept]
+        self.holders = [m for _, m in kept]
+
+    def copy(self):
+        ring = HashRing(vnodes=self.vnodes, replicas=self.replicas)
+        ring.members = set(self.members)
+        ring.points = list(self.points)
+        ring.holders = list(self.holders)
+        return ring
+
+    def owners(self, key):
+        # Détenteurs de key, le premier (primaire) en tête
+        if not self.points:
+            return []
+        wanted = min(self.replicas, len(self.members))
+        start = bisect.bisect(self.points, position(key))
+        found = []
+        for i in range(len(self.points)):
+            member = self.holders[(start + i) % len(self.points)]
+            if member not in found:
+                found.append(member)
+                if len(found) == wanted:
+                    break
+        return found
+
+
+class Placement:
+    # Répartition des clés sur l'anneau : ce nœud (`me`) ne garde que les clés dont il est l'un des
+    # détenteurs, n'envoie ses copies qu'aux autres détenteurs et transmet au primaire les écritures
+    # locales des clés qu'il ne détient pas. peers : {membre: (hôte, port)}.
+    def __init__(self, me, peers, replicas=REPLICAS, vnodes=VNODES):
+        self.me = me
+        self.peers = {member: tuple(address) for member, address in peers.items()}
+        self.ring = HashRing([me, *self.peers], vnodes, replicas)
+        self.lock = threading.Lock()
+
+    def owners(self, key):
+        with self.lock:
+            return self.ring.owners(key)
+
+    def owns(self, key):
+        return self.me in self.owners(key)
+
+    def primary(self, key):
+        # Adresse du premier détenteur (None : ce nœud)
+        owner = self.owners(key)[0]
+        return self.peers.get(owner) if owner != self.me else None
+
+    def route(self, entries):
+        # {adresse: entrées} vers les autres détenteurs de chaque clé ; entries : [[clé, ...], ...]
+        routes = {}
+        with self.lock:
+            for entry in entries:
+                for owner in self.ring.owners(entry[0]):
+                    if owner != self.me and owner in self.peers:
+                        routes.setdefault(self.peers[owner], []).append(entry)
+        return routes
+
+    def split(self, items):
+        # Écritures locales : (détenues ici, {adresse du primaire: [[clé, valeur], ...]})
+        mine, forwards = [], {}
+        for key, value in items:
+            address = self.primary(key)
+            if address is None:
+                mine.append((key, value))
+            else:
+                forwards.setdefault(address, []).append([key, value])
+        return mine, forwards
+
+    def filter(self, entries, member):
+        # Réponses de synchronisation : seulement les clés que member détient (tout pour un inconnu)
+        with self.lock:
+            if member not in self.ring.members:
+                return entries
+            return [entry for entry in entries if member in self.ring.owners(entry[0])]
+
+    # --- Changements de membres ---
+    def add(self, member, address):
+        with self.lock:
+            before = self.ring.copy()
+            self.peers[member] = tuple(address)
+            self.ring.add(member)
+            return before
+
+    def remove(self, member):
+        with self.lock:
+            before = self.ring.copy()
+            self.peers.pop(member, None)
+            self.ring.remove(member)
+            return before
+
+    def rename(self, old, new):
+        # Changement du nom de ce nœud : ses points changent de place
+        with self.lock:
+            before = self.ring.copy()
+            self.ring.remove(old)
+            self.ring.add(new)
+            self.me = new
+            return before
+
+    def handoff(self, keys, before):
+        # Clés dont les détenteurs ont changé depuis `before` : le premier ancien détenteur encore
+        # présent envoie aux nouveaux venus ({adresse: [clés]}) ; celles que ce nœud ne détient
+        # plus sont à effacer une fois les copies reçues
+        sends, drops = {}, []
+        with self.lock:
+            for key in keys:
+                old, new = before.owners(key), self.ring.owners(key)
+                if old == new:
+                    continue
+                sender = next((m for m in old if m in self.ring.members), None)
+                if sender == self.me:
+                    for owner in new:
+                        if owner not in old and owner in self.peers:
+                            sends.setdefault(self.peers[owner], []).append(key)
+                if self.me not in new:
+                    drops.append(key)
+        return sends, drops
+
+
+def drop(node, keys):
+    # Efface les versions locales des clés passées à d'autres détenteurs (stockage, index, arbre,
+    # journal) ; une clé redevenue détenue entre-temps est gardée
+    keys = list(keys)
+    with node.engine.locked(keys):
+        keys = [key for key in keys if key in node.data and not node.placement.owns(key)]
+        for key in keys:
+            del node.data[key]
+            node.history.remove(key)
+            node.tree.remove(key)
+        if node.wal is not None and keys:
+            node.wal.append("drop", keys)
+    return keys
+
+
+def after_delivery(futures, callback):
+    # callback(ok) une fois tous les envois terminés ; None = envoi sans accusé (réseau simulé)
+    pending = [f for f in futures if f is not None]
+    if not pending:
+        callback(True)
+        return
+    state = {"left": len(pending), "ok": True}
+    lock = threading.Lock()
+
+    def done(future):
+        ok = not future.cancelled() and future.exception() is None and future.result() is not False
+        with lock:
+            state["ok"] = state["ok"] and ok
+            state["left"] -= 1
+            if state["left"]:
+                return
+        callback(state["ok"])
+
+    for future in pending:
+        future.add_done_callback(done)
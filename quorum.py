@@ -0,0 +1,361 @@
+import itertools
+import threading
+from collections import OrderedDict
+
+from sync import entries_for
+from vector_clock import compare, AFTER, BEFORE, EQUAL
+
+TIMEOUT = 5.0
+HINT_INTERVAL = 1.0
+MAX_HINTS = 10000
+# Messages traités par Quorum.receive
+TYPES = ("put", "replicate", "read", "reply")
+
+
+class QuorumError(Exception):
+    pass
+
+
+def delivered(future):
+    # Résultat d'un runtime.send : False = pair injoignable (None : réseau simulé, sans accusé)
+    return not future.cancelled() and future.exception() is None and future.result() is not False
+
+
+class Pending:
+    # Requête en attente de `needed` réponses parmi `total` répliques ; échoue dès que trop de
+    # répliques sont injoignables ou à l'expiration du délai
+    def __init__(self, rid, needed, total, callback=None):
+        self.rid = rid
+        self.needed = needed
+        self.total = total
+        self.callback = callback
+        self.replies = []  # (nom du nœud ou None pour ce nœud, entrées)
+        self.answered = set()  # noms de toutes les répliques ayant répondu, y compris après la fin
+        self.failed = 0
+        self.ok = False
+        self.value = None
+        self.done = threading.Event()
+        self.lock = threading.Lock()
+        self.finished = False
+
+    def reply(self, member, entries=None):
+        with self.lock:
+            self.answered.add(member)
+            if self.finished:
+                return
+            self.replies.append((member, entries or []))
+            if len(self.replies) < self.needed:
+                return
+            self.finished = True
+        self._finish(True)
+
+    def fail(self):
+        with self.lock:
+            if self.finished:
+                return
+            self.failed += 1
+            if self.total - self.failed >= self.needed:
+                return
+            self.finished = True
+        self._finish(False)
+
+    def expire(self):
+        with self.lock:
+            if self.finished:
+                return
+            self.finished = True
+        self._finish(False)
+
+    def _finish(self, ok):
+        self.ok = ok
+        try:
+            if self.callback is not None:
+                self.callback(self)
+        finally:
+            self.done.set()
+
+    def result(self, timeout=None):
+        if not self.done.wait(timeout):
+            self.expire()
+        if not self.ok:
+            raise QuorumError(f"Quorum non atteint : {len(self.replies)}/{self.needed} réponse(s), "
+                              f"{self.failed} réplique(s) injoignable(s)")
+        return self.value
+
+
+class Hints:
+    # Écritures destinées à des pairs injoignables, rejouées quand ils répondent à nouveau. Par clé,
+    # seules les versions non dominées sont gardées (une seule en général) : le rejeu n'envoie jamais
+    # une version plus ancienne après la plus récente. Bornées par pair : au-delà, les clés les plus
+    # anciennes sont oubliées et la réconciliation de Merkle rattrape.
+    def __init__(self, limit=MAX_HINTS):
+        self.limit = limit
+        self.entries = {}  # adresse -> {clé: [entrées [clé, valeur, horloge]]}, clés par ancienneté
+        self.lock = threading.Lock()
+
+    def add(self, address, entries):
+        with self.lock:
+            keys = self.entries.setdefault(tuple(address), OrderedDict())
+            for entry in entries:
+                kept = keys.pop(entry[0], [])
+                orders = [compare(entry[2], other[2]) for other in kept]
+                if any(order in (BEFORE, EQUAL) for order in orders):
+                    keys[entry[0]] = kept
+                    continue
+                keys[entry[0]] = [other for other, order in zip(kept, orders) if order != AFTER] + [entry]
+            while len(keys) > self.limit:
+                keys.popitem(last=False)
+
+    def take(self):
+        with self.lock:
+            taken, self.entries = self.entries, {}
+        return {address: [entry for versions in keys.values() for entry in versions] for address, keys in taken.items()}
+
+    def __len__(self):
+        with self.lock:
+            return sum(len(versions) for keys in self.entries.values() for versions in keys.values())
+
+
+def reconcile(replies, registry):
+    # Versions non dominées parmi les réponses : une seule en général, plusieurs si concurrentes
+    versions = []  # (valeur, horloge, compteurs)
+    for _, entries in replies:
+        for _, value, clock in entries:
+            counters = registry.encode(clock)
+            orders = [compare(counters, kept) for _, _, kept in versions]
+            if any(order in (BEFORE, EQUAL) for order in orders):
+                continue
+            versions = [version for version, order in zip(versions, orders) if order != AFTER]
+            versions.append((value, clock, counters))
+    return versions
+
+
+class Quorum:
+    # Écritures et lectures à consistance réglable : put(w) rend la main après w accusés de
+    # répliques (ce nœud compris s'il en est une), get(r) après r réponses, réconciliées par
+    # horloge vectorielle ; les répliques en retard reçoivent la version gagnante. Un envoi qui
+    # échoue laisse un indice, rejoué toutes les hint_interval secondes jusqu'au retour du pair
+    # (le runtime espace déjà les reconnexions). Les répliques sont désignées par leur nom de nœud :
+    # accusés et réponses se rapportent à l'émetteur (sender), joint à l'adresse configurée pour ce
+    # nom plutôt qu'à celle qu'il annonce (reply_to n'est qu'un recours pour un émetteur inconnu).
+    def __init__(self, node, members, create, address=None, timeout=TIMEOUT,
+                 hint_interval=HINT_INTERVAL, max_hints=MAX_HINTS):
+        self.node = node
+        self.members = members  # () -> {nom: adresse} des pairs (répliques sans répartition des clés)
+        self.create = create  # (type, sender, rid, **champs) -> message
+        self.address = tuple(address) if address is not None else None
+        self.timeout = timeout
+        self.hint_interval = hint_interval
+        self.hints = Hints(max_hints)
+        self.pending = {}
+        self.ids = itertools.count(1)
+        self.lock = threading.Lock()
+        self.replay_due = False
+        self.closed = False
+
+    # --- Répliques ---
+    def replicas(self, key):
+        # (ce nœud est-il une réplique, {nom: adresse} des autres répliques)
+        placement = self.node.placement
+        if placement is None:
+            return True, {member: tuple(address) for member, address in self.members().items()}
+        owners = placement.owners(key)
+        return placement.me in owners, {m: placement.peers[m] for m in owners if m != placement.me and m in placement.peers}
+
+    def locate(self, msg):
+        # Adresse de l'émetteur : celle de son nom dans la configuration, sinon celle qu'il annonce
+        sender = msg.get("sender")
+        placement = self.node.placement
+        address = self.members().get(sender)
+        if address is None and placement is not None:
+            address = placement.peers.get(sender)
+        if address is None:
+            address = msg.get("reply_to")
+        return tuple(address) if address is not None else None
+
+    def open(self, needed, total, callback=None, on_expire=None):
+        # La requête reste ouverte jusqu'au délai (les réponses tardives sont comptées dans
+        # answered) ; on_expire(requête) est alors appelé
+        if needed > total:
+            raise ValueError(f"{needed} réponse(s) demandée(s) pour {total} réplique(s)")
+        rid = f"{self.node.node_id}:{next(self.ids)}"
+        pending = self.pending[rid] = Pending(rid, needed, total, callback)
+        loop = self.node.runtime.loop
+        loop.call_soon_threadsafe(loop.call_later, self.timeout, self._expire, rid, on_expire)
+        return pending
+
+    def _expire(self, rid, on_expire):
+        pending = self.pending.pop(rid, None)
+        if pending is not None:
+            pending.expire()
+            if on_expire is not None:
+                on_expire(pending)
+
+    def send(self, address, msg, entries=None, on_fail=None):
+        future = self.node.runtime.send(*address, msg)
+        if future is None:
+            return
+
+        def done(future):
+            if not delivered(future):
+                if entries:
+                    self.hint(address, entries)
+                if on_fail is not None:
+                    on_fail()
+
+        future.add_done_callback(done)
+
+    def push(self, addresses, msg, entries):
+        # Réplication sans accusé (écritures courantes) : un indice par pair injoignable
+        addresses = [tuple(a) for a in addresses]
+        if not addresses:
+            return
+        future = self.node.runtime.broadcast(addresses, msg)
+        if future is None:
+            return
+
+        def done(future):
+            results = future.result() if not future.cancelled() and future.exception() is None else []
+            for address, ok in zip(addresses, results):
+                if ok is False:
+                    self.hint(address, entries)
+
+        future.add_done_callback(done)
+
+    def message(self, msg_type, rid, **fields):
+        return self.create(msg_type, self.node.node_id, rid, reply_to=self.address, **fields)
+
+    # --- Écriture ---
+    def put(self, key, value, w=1, callback=None, forward=True):
+        # Rend une requête dont le résultat est l'horloge de la version écrite
+        local, replicas = self.replicas(key)
+        if not local and forward:
+            return self._forward(key, value, w, callback)
+        entries = []
+
+        def missed(pending):
+            # Répliques muettes jusqu'au délai (injoignables ou connexion perdue) : indices
+            for member, address in replicas.items():
+                if member not in pending.answered:
+                    self.hint(address, entries)
+
+        pending = self.open(w, len(replicas) + 1, callback, missed)
+        entries.extend(self.node.set_local({key: value}, propagate=False))
+        pending.value = entries[0][2]
+        pending.reply(None, entries)
+        msg = self.message("replicate", pending.rid, entries=entries)
+        for address in replicas.values():
+            self.send(address, msg, on_fail=pending.fail)
+        return pending
+
+    def _forward(self, key, value, w, callback):
+        # Ce nœud ne détient pas key : le premier détenteur joignable coordonne l'écriture
+        owners = list(self.replicas(key)[1].values())
+
+        def finish(pending):
+            if pending.ok:
+                pending.value = pending.replies[0][1][0][2]
+            if callback is not None:
+                callback(pending)
+
+        pending = self.open(1, 1, finish)
+        msg = self.message("put", pending.rid, key=key, value=value, w=w)
+
+        def attempt(owners):
+            if not owners:
+                pending.fail()
+                return
+            self.send(owners[0], msg, on_fail=lambda: attempt(owners[1:]))
+
+        attempt(owners)
+        return pending
+
+    # --- Lecture ---
+    def get(self, key, r=1, callback=None):
+        local, replicas = self.replicas(key)
+
+        def finish(pending):
+            versions = reconcile(pending.replies, self.node.vc.registry)
+            if pending.ok:
+                self.repair(key, versions, pending.replies, replicas)
+            pending.value = [[value, clock] for value, clock, _ in versions]
+            if callback is not None:
+                callback(pending)
+
+        pending = self.open(r, len(replicas) + local, finish)
+        msg = self.message("read", pending.rid, keys=[key])
+        for address in replicas.values():
+            self.send(address, msg, on_fail=pending.fail)
+        if local:
+            pending.reply(None, entries_for(self.node.data, [key], self.node.vc.registry))
+        return pending
+
+    def repair(self, key, versions, replies, replicas):
+        # Les répliques ayant répondu avec une version dominée (ou aucune) reçoivent la gagnante
+        if len(versions) != 1:
+            return
+        value, clock, counters = versions[0]
+        entry = [[key, value, clock]]
+        registry = self.node.vc.registry
+        for member, entries in replies:
+            if entries and compare(registry.encode(entries[0][2]), counters) == EQUAL:
+                continue
+            if member is None:
+                self.node.engine.apply_batch(self.node.node_id, entry)
+            elif member in replicas:
+                self.send(replicas[member], self.message("replicate", None, entries=entry), entry)
+
+    # --- Réception ---
+    def receive(self, msg):
+        kind = msg["type"]
+        rid = msg.get("rid")
+        if kind == "reply":
+            pending = self.pending.get(rid)
+            if pending is None:
+                return
+            if msg.get("ok", True):
+                pending.reply(msg["sender"], msg.get("entries"))
+            else:
+                pending.fail()
+            return
+        address = self.locate(msg)
+        if kind == "replicate":
+            self.node.engine.apply_batch(msg["sender"], msg["entries"])
+            if rid is not None and address is not None:
+                self.node.runtime.send(*address, self.message("reply", rid))
+        elif kind == "read":
+            entries = entries_for(self.node.data, msg["keys"], self.node.vc.registry)
+            if address is not None:
+                self.node.runtime.send(*address, self.message("reply", rid, entries=entries))
+        elif kind == "put":
+            # Coordination pour le compte d'un nœud non détenteur ; réponse une fois w accusés
+            def answer(pending):
+                if address is not None:
+                    reply = self.message("reply", rid, ok=pending.ok, entries=pending.replies[0][1] if pending.ok else None)
+                    self.node.runtime.send(*address, reply)
+
+            try:
+                self.put(msg["key"], msg["value"], msg["w"], callback=answer, forward=False)
+            except ValueError:
+                answer(Pending(rid, 1, 0))
+
+    # --- Indices ---
+    def hint(self, address, entries):
+        self.hints.add(address, entries)
+        with self.lock:
+            if self.replay_due or self.closed:
+                return
+            self.replay_due = True
+        loop = self.node.runtime.loop
+        loop.call_soon_threadsafe(loop.call_later, self.hint_interval, self._replay)
+
+    def _replay(self):
+        # Un envoi par pair ; ceux qui échouent encore reviennent dans les indices (et reprogramment)
+        with self.lock:
+            self.replay_due = False
+        for address, entries in self.hints.take().items():
+            self.send(address, self.message("replicate", None, entries=entries), entries)
+
+    def stop(self):
+        with self.lock:
+            self.closed = True
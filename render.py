@@ -0,0 +1,243 @@
+import bisect
+import queue
+import tkinter as tk
+from tkinter import ttk
+from concurrent.futures import Future
+
+FRAME_MS = 16
+MAX_EVENTS_PER_FRAME = 50000
+
+MAX_LOG_LINES = 500
+
+# Types d'événements transmis des threads réseau au thread Tk
+TOUCH, REFRESH, CALL = range(3)
+
+
+class RenderLoop:
+    # Les threads réseau ne touchent jamais Tk : ils déposent des événements dans une file que
+    # la boucle Tk vide à chaque trame (after). Une rafale de mises à jour donne un seul rendu.
+    def __init__(self, root, render, interval_ms=FRAME_MS):
+        self.root = root
+        self.render = render
+        self.interval_ms = interval_ms
+        self.events = queue.SimpleQueue()
+        self.root.after(self.interval_ms, self._poll)
+
+    def touch(self, key):
+        self.events.put((TOUCH, key))
+
+    def refresh(self, rows=False):
+        # rows=True : toutes les lignes visibles sont à redessiner (renommage d'un nœud...)
+        self.events.put((REFRESH, rows))
+
+    def call(self, fn, *args):
+        # Exécute fn dans le thread Tk ; le Future permet à l'appelant d'attendre le résultat
+        future = Future()
+        self.events.put((CALL, (future, fn, args)))
+        return future
+
+    def _poll(self):
+        # Reprogrammé d'emblée : un appel modal (wait_window) ne suspend pas le rendu
+        self.root.after(self.interval_ms, self._poll)
+        keys, calls = set(), []
+        refresh = rows = False
+        try:
+            for _ in range(MAX_EVENTS_PER_FRAME):
+                kind, payload = self.events.get_nowait()
+                if kind == TOUCH:
+                    keys.add(payload)
+                elif kind == REFRESH:
+                    refresh = True
+                    rows = rows or payload
+                else:
+                    calls.append(payload)
+        except queue.Empty:
+            pass
+        if keys or refresh:
+            self.render(keys, rows)
+        for future, fn, args in calls:
+            try:
+                future.set_result(fn(*args))
+            except Exception as e:
+                future.set_exception(e)
+
+
+class DataView:
+    # ttk.Treeview virtualisé : seules `height` lignes existent dans le widget, réaffectées aux
+    # clés visibles au défilement. Une mise à jour ne redessine que les lignes concernées.
+    COLUMNS = (("key", "Clé", 120), ("value", "Valeur", 150), ("clock", "Horloge", 280))
+
+    def __init__(self, parent, row_for, height=10):
+        self.row_for = row_for  # clé -> (clé, valeur, horloge) ou None
+        self.height = height
+        self.keys = []  # triées
+        self.offset = 0
+        self.shown = [None] * height  # clé affichée dans chaque ligne
+
+        self.frame = ttk.Frame(parent)
+        self.tree = ttk.Treeview(self.frame, columns=[c for c, _, _ in self.COLUMNS], show="headings",
+                                 height=height, selectmode="browse")
+        for column, title, width in self.COLUMNS:
+            self.tree.heading(column, text=title)
+            self.tree.column(column, width=width, anchor="w")
+        for slot in range(height):
+            self.tree.insert("", tk.END, iid=str(slot), values=("", "", ""))
+        self.scrollbar = ttk.Scrollbar(self.frame, orient="vertical", command=self.on_scroll)
+        self.tree.pack(side="left", fill="both", expand=True)
+        self.scrollbar.pack(side="left", fill="y")
+        for sequence in ("<MouseWheel>", "<Button-4>", "<Button-5>"):
+            self.tree.bind(sequence, self.on_wheel)
+        self.update_scrollbar()
+
+    def pack(self, **options):
+        self.frame.pack(**options)
+
+    def load(self, keys):
+        self.keys = sorted(keys)
+        self.offset = 0
+        self.repaint()
+        self.update_scrollbar()
+
+    def update(self, changed, full=False):
+        inserted = [k for k in changed if k not in self.shown and not self._has(k)]
+        for key in inserted:
+            bisect.insort(self.keys, key)
+        if inserted:
+            self.update_scrollbar()
+        # Une insertion avant la fin de la fenêtre décale les lignes visibles
+        window_end = self.keys[min(self.offset + self.height, len(self.keys)) - 1] if self.keys else None
+        if full or any(window_end is None or k <= window_end for k in inserted):
+            self.repaint()
+            return
+        for slot, key in enumerate(self.shown):
+            if key in changed:
+                self.paint(slot, key)
+
+    def _has(self, key):
+        i = bisect.bisect_left(self.keys, key)
+        return i < len(self.keys) and self.keys[i] == key
+
+    def repaint(self):
+        visible = self.keys[self.offset:self.offset + self.height]
+        for slot in range(self.height):
+            self.paint(slot, visible[slot] if slot < len(visible) else None)
+
+    def paint(self, slot, key):
+        row = self.row_for(key) if key is not None else None
+        self.shown[slot] = key if row is not None else None
+        self.tree.item(str(slot), values=row if row is not None else ("", "", ""))
+
+    def scroll_to(self, offset):
+        offset = max(0, min(offset, len(self.keys) - self.height))
+        if offset != self.offset:
+            self.offset = offset
+            self.repaint()
+            self.update_scrollbar()
+
+    def update_scrollbar(self):
+        total = max(len(self.keys), 1)
+        self.scrollbar.set(self.offset / total, min(1.0, (self.offset + self.height) / total))
+
+    def on_scroll(self, action, amount, unit=None):
+        if action == "moveto":
+            self.scroll_to(int(float(amount) * len(self.keys)))
+        elif unit == "pages":
+            self.scroll_to(self.offset + int(amount) * self.height)
+        else:
+            self.scroll_to(self.offset + int(amount))
+
+    def on_wheel(self, event):
+        if event.num == 4 or getattr(event, "delta", 0) > 0:
+            self.scroll_to(self.offset - 3)
+        else:
+            self.scroll_to(self.offset + 3)
+        return "break"
+
+
+class LogView:
+    # Affichage incrémental d'un EventJournal : à chaque trame, seuls les événements nouveaux sont
+    # ajoutés (au plus max_lines) et les lignes les plus anciennes du widget sont retirées.
+    def __init__(self, parent, journal, height=6, max_lines=MAX_LOG_LINES):
+        self.journal = journal
+        self.max_lines = max_lines
+        self.last_seq = 0
+        self.text = tk.Text(parent, height=height, wrap="word", bg="#fff8dc", fg="black")
+        self.text.tag_config("gray", foreground="gray")
+        self.colors = {"gray"}
+
+    def pack(self, **options):
+        self.text.pack(**options)
+
+    def render(self):
+        events = self.journal.since(self.last_seq, self.max_lines)
+        if not events:
+            return
+        skipped = events[0].seq - self.last_seq - 1
+        self.last_seq = events[-1].seq
+        if skipped > 0:
+            self.text.insert(tk.END, f"… {skipped} événement(s) non affiché(s)\n", ("gray",))
+        for event in events:
+            if event.color not in self.colors:
+                self.text.tag_config(event.color, foreground=event.color)
+                self.colors.add(event.color)
+            self.text.insert(tk.END, f"{event.message}\n", (event.color,))
+        lines = int(self.text.index("end-1c").split(".")[0]) - 1
+        if lines > self.max_lines:
+            self.text.delete("1.0", f"{lines - self.max_lines + 1}.0")
+        self.text.see(tk.END)
+
+
+class ConflictPanel:
+    # Panneau unique de résolution : liste des conflits en attente (mise à jour incrémentale) et
+    # résolution de la sélection ou de tous les conflits en une seule opération.
+    COLUMNS = (("key", "Clé", 120), ("local", "Local", 150), ("remote", "Distant(s)", 220), ("count", "Versions", 70))
+
+    def __init__(self, parent, conflicts, on_resolve, height=8):
+        self.conflicts = conflicts
+        self.on_resolve = on_resolve  # (clés, "local" | "remote")
+        self.frame = ttk.Frame(parent)
+        frm_list = ttk.Frame(self.frame)
+        frm_list.pack(fill="both", expand=True)
+        self.tree = ttk.Treeview(frm_list, columns=[c for c, _, _ in self.COLUMNS], show="headings",
+                                 height=height, selectmode="extended")
+        for column, title, width in self.COLUMNS:
+            self.tree.heading(column, text=title)
+            self.tree.column(column, width=width, anchor="w")
+        scrollbar = ttk.Scrollbar(frm_list, orient="vertical", command=self.tree.yview)
+        self.tree.configure(yscroll=scrollbar.set)
+        self.tree.pack(side="left", fill="both", expand=True)
+        scrollbar.pack(side="left", fill="y")
+
+        frm_buttons = ttk.Frame(self.frame)
+        frm_buttons.pack(pady=5)
+        ttk.Button(frm_buttons, text="Garder local", command=lambda: self.resolve_selected("local")).pack(side="left", padx=5)
+        ttk.Button(frm_buttons, text="Garder distant", command=lambda: self.resolve_selected("remote")).pack(side="left", padx=5)
+        ttk.Button(frm_buttons, text="Tout local", command=lambda: self.resolve_all("local")).pack(side="left", padx=5)
+        ttk.Button(frm_buttons, text="Tout distant", command=lambda: self.resolve_all("remote")).pack(side="left", padx=5)
+
+    def pack(self, **options):
+        self.frame.pack(**options)
+
+    def render(self):
+        for key in self.conflicts.drain_changed():
+            conflict = self.conflicts.get(key)
+            if conflict is None:
+                if self.tree.exists(key):
+                    self.tree.delete(key)
+                continue
+            row = (key, conflict.value, " | ".join(f"{v} ({s})" for s, v, _ in conflict.remotes),
+                   len(conflict.remotes) + 1)
+            if self.tree.exists(key):
+                self.tree.item(key, values=row)
+            else:
+                self.tree.insert("", tk.END, iid=key, values=row)
+
+    def resolve_selected(self, choice):
+        keys = list(self.tree.selection())
+        if keys:
+            self.on_resolve(keys, choice)
+
+    def resolve_all(self, choice):
+        keys = self.conflicts.keys()
+        if keys:
+            self.on_resolve(keys, choice)
@@ -0,0 +1,164 @@
+import abc
+import json
+from array import array
+
+from vector_clock import compare, merge_into, BEFORE
+
+# Résolution automatique des écritures concurrentes. Chaque stratégie est une fonction pure des
+# deux versions (indépendante de celle qui est locale) : tous les réplicas aboutissent au même
+# résultat sans message de résolution supplémentaire.
+
+
+# Clé réservée des ensembles de versions sœurs (MultiValue) : {SIBLINGS: [[valeur, horloge], ...]}.
+# Les clients ne peuvent pas écrire de valeur qui la contient (cf. check_value).
+SIBLINGS = "\x00siblings"
+
+
+def check_value(value):
+    if isinstance(value, dict) and SIBLINGS in value:
+        raise ValueError("Valeur invalide : clé réservée aux versions concurrentes")
+    return value
+
+
+def canonical(value):
+    return json.dumps(value, sort_keys=True, separators=(",", ":"))
+
+
+def nonzero(clock, registry):
+    # Forme indépendante du registre local (les nœuds inconnus d'un réplica y valent zéro)
+    return {n: ts for n, ts in sorted(registry.decode(clock).items()) if ts}
+
+
+def joined(a, b):
+    clock = array('Q')
+    merge_into(clock, a)
+    merge_into(clock, b)
+    return clock
+
+
+class Resolver(abc.ABC):
+    name = None
+
+    @abc.abstractmethod
+    def resolve(self, local, remote, registry):
+        # local, remote : (valeur, horloge) ; rend (valeur, horloge) ou None (résolution manuelle)
+        pass
+
+
+class Manual(Resolver):
+    name = "manual"
+
+    def resolve(self, local, remote, registry):
+        return None
+
+
+class LastWriterWins(Resolver):
+    # La version de plus grand rang l'emporte avec sa propre horloge : la somme des compteurs,
+    # puis les paires (nœud, compteur) triées par identifiant de nœud pour départager.
+    name = "lww"
+
+    def rank(self, clock, registry):
+        return sum(clock), list(nonzero(clock, registry).items())
+
+    def resolve(self, local, remote, registry):
+        return max(local, remote, key=lambda version: self.rank(version[1], registry))
+
+
+class MultiValue(Resolver):
+    # Registre multi-valeur : toutes les versions concurrentes sont gardées, chacune avec son
+    # horloge ; celles dominées par une autre disparaissent.
+    name = "mv"
+
+    def siblings(self, value, clock, registry):
+        if isinstance(value, dict) and SIBLINGS in value:
+            return [(v, registry.encode(c)) for v, c in value[SIBLINGS]]
+        return [(value, clock)]
+
+    def resolve(self, local, remote, registry):
+        versions = self.siblings(*local, registry) + self.siblings(*remote, registry)
+        kept = {}
+        for value, clock in versions:
+            if any(compare(clock, other) == BEFORE for _, other in versions):
+                continue
+            wire = nonzero(clock, registry)
+            kept[(canonical(value), canonical(wire))] = [value, wire]
+        return {SIBLINGS: [kept[k] for k in sorted(kept)]}, joined(local[1], remote[1])
+
+
+def contributions(value):
+    # Parts par nœud d'un compteur : {"p": {nœud: ajouts}, "n": {nœud: retraits}} (PN-counter) ;
+    # un dict {nœud: ajouts} (G-counter) est accepté. None pour toute autre valeur.
+    if isinstance(value, dict) and set(value) <= {"p", "n"} and all(isinstance(v, dict) for v in value.values()):
+        return value.get("p", {}), value.get("n", {})
+    if isinstance(value, dict) and all(isinstance(v, int) for v in value.values()):
+        return value, {}
+    return None
+
+
+def counter_add(value, node_id, amount):
+    # Nouvelle valeur du compteur après ajout de amount (négatif : retrait) par node_id : chaque nœud
+    # n'augmente que ses propres parts, ce qui rend la fusion par maximum sans perte
+    parts = contributions(value) if value is not None else ({}, {})
+    if parts is None:
+        raise ValueError(f"Valeur de compteur invalide : {value!r}")
+    p, n = dict(parts[0]), dict(parts[1])
+    side = p if amount >= 0 else n
+    side[node_id] = side.get(node_id, 0) + abs(amount)
+    return {"p": p, "n": n}
+
+
+def counter_total(value):
+    p, n = contributions(value)
+    return sum(p.values()) - sum(n.values())
+
+
+class CounterMerge(Resolver):
+    # Compteur à parts par nœud (cf. counter_add) fusionné par maximum par nœud et par sens : les
+    # incréments concurrents de nœuds différents s'additionnent. Une valeur numérique simple ne dit
+    # pas qui a ajouté quoi, son maximum perdrait des incréments : résolution manuelle.
+    name = "counter"
+
+    def resolve(self, local, remote, registry):
+        a, b = contributions(local[0]), contributions(remote[0])
+        if a is None or b is None:
+            return None
+        value = {}
+        for side, x, y in (("p", a[0], b[0]), ("n", a[1], b[1])):
+            value[side] = {node: max(x.get(node, 0), y.get(node, 0)) for node in sorted(set(x) | set(y))}
+        return value, joined(local[1], remote[1])
+
+
+class SetMerge(Resolver):
+    # Ensemble à ajout seul : union des éléments, triée pour un résultat identique partout
+    name = "set"
+
+    def resolve(self, local, remote, registry):
+        items = {}
+        for value in (local[0], remote[0]):
+            for item in (value if isinstance(value, list) else [value]):
+                items[canonical(item)] = item
+        return [items[k] for k in sorted(items)], joined(local[1], remote[1])
+
+
+BUILTIN = {r.name: r for r in (Manual(), LastWriterWins(), MultiValue(), CounterMerge(), SetMerge())}
+
+
+class ResolverTable:
+    # Stratégie par préfixe de clé, le plus long préfixe l'emporte ; "" sert de défaut.
+    # policies : {"compteur:": "counter", "tags:": "set", "": "lww"} (noms ou instances de Resolver)
+    def __init__(self, policies=None, default="lww"):
+        policies = dict(policies or {})
+        policies.setdefault("", default)
+        self.policies = sorted(((prefix, BUILTIN[p] if isinstance(p, str) else p)
+                                for prefix, p in policies.items()),
+                               key=lambda item: len(item[0]), reverse=True)
+
+    def policy_for(self, key):
+        for prefix, resolver in self.policies:
+            if key.startswith(prefix):
+                return resolver
+
+    def resolve(self, key, local, remote, registry):
+        # Rend (nom de la stratégie, (valeur, horloge) ou None)
+        resolver = self.policy_for(key)
+        return resolver.name, resolver.resolve(local, remote, registry)
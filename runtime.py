@@ -0,0 +1,290 @@
+import asyncio
+import json
+import threading
+import time
+import zlib
+
+from transport import HEADER, MAX_FRAME
+from codec import JsonCodec, BinaryEncoder, Decoder, negotiate, SUPPORTED, BINARY
+from metrics import Metrics
+
+JSON_CODEC = JsonCodec()
+
+
+async def read_frame(reader):
+    try:
+        header = await reader.readexactly(HEADER.size)
+        (size,) = HEADER.unpack(header)
+        if size > MAX_FRAME:
+            return None
+        return await reader.readexactly(size)
+    except (asyncio.IncompleteReadError, ConnectionError):
+        return None
+
+
+class AsyncPeer:
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.writer = None
+        self.codec = JSON_CODEC
+        self.watcher = None
+        self.lock = asyncio.Lock()
+        self.failures = 0
+        self.retry_at = 0.0
+
+
+class NodeRuntime:
+    # Moteur réseau asyncio : une seule boucle pour tous les pairs, pilotée depuis
+    # n'importe quel thread (Tk, REPL) via send/broadcast/submit.
+    def __init__(self, host, port, on_message, on_send_error=None, queue_size=1024,
+                 executor=None, timeout=5, min_backoff=0.1, max_backoff=5.0, codecs=SUPPORTED, metrics=None,
+                 ingest=None):
+        self.host = host
+        self.port = port
+        self.on_message = on_message
+        self.codecs = list(codecs)
+        self.on_send_error = on_send_error
+        self.queue_size = queue_size
+        self.executor = executor
+        # IngestPool optionnel : les grandes trames sont décodées dans un processus de travail
+        self.ingest = ingest
+        self.timeout = timeout
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.loop = asyncio.new_event_loop()
+        self.peers = {}
+        self.inbound = set()
+        self.server = None
+        self.ready = threading.Event()
+        self.error = None
+        self.thread = None
+        self.messages_sent = 0
+        self.bytes_sent = 0
+        # Compteurs par pair, durées d'envoi et de traitement, profondeur des files de réception
+        self.metrics = metrics if metrics is not None else Metrics()
+        self.queues = set()
+        self.pending = 0
+        self.metrics.gauge("inbound_queue_depth", lambda: sum(q.qsize() for q in list(self.queues)))
+        self.metrics.gauge("messages_pending", lambda: self.pending)
+        self.metrics.gauge("peer_connections", lambda: sum(1 for p in list(self.peers.values()) if p.writer is not None))
+
+    # --- Pont thread-safe ---
+    def start(self):
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        self.ready.wait()
+        if self.error is not None:
+            self.thread = None
+            raise self.error
+        return self
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.loop.run_until_complete(self._serve())
+        except OSError as e:
+            self.error = e
+            return
+        finally:
+            self.ready.set()
+        self.loop.run_forever()
+
+    def submit(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def send(self, host, port, msg):
+        return self.submit(self._send(host, port, msg))
+
+    def broadcast(self, addresses, msg):
+        return self.submit(self._broadcast(list(addresses), msg))
+
+    def discard(self, host, port):
+        return self.submit(self._discard(host, port))
+
+    def stop(self):
+        if self.thread is None:
+            return
+        self.submit(self._shutdown()).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.thread = None
+
+    # --- Réception ---
+    async def _serve(self):
+        self.server = await asyncio.start_server(self._handle_peer, self.host, self.port)
+
+    async def _handle_peer(self, reader, writer):
+        # File bornée par pair : quand elle est pleine, la lecture s'arrête et TCP
+        # répercute la contre-pression sur l'émetteur.
+        queue = asyncio.Queue(self.queue_size)
+        consumer = asyncio.ensure_future(self._consume(queue))
+        decoder = Decoder()
+        self.inbound.add(writer)
+        self.queues.add(queue)
+        try:
+            while True:
+                frame = await read_frame(reader)
+                if frame is None:
+                    break
+                self.metrics.inc("bytes_received_total", HEADER.size + len(frame))
+                try:
+                    if self.ingest is not None and len(frame) >= self.ingest.min_frame:
+                        msg = await self.ingest.decode(self.loop, frame, decoder)
+                    else:
+                        msg = decoder.decode(frame)
+                except (ValueError, KeyError, IndexError, zlib.error) as e:
+                    print(f"[runtime] Trame illisible ignorée : {e!r}")
+                    self.metrics.inc("decode_errors_total")
+                    continue
+                if isinstance(msg, dict) and msg.get("type") == "hello":
+                    # Négociation du format : réponse en JSON sur la même connexion
+                    chosen = negotiate([c for c in msg.get("codecs", []) if c in self.codecs])
+                    ack = json.dumps({"type": "hello_ack", "codec": chosen}).encode()
+                    writer.write(HEADER.pack(len(ack)) + ack)
+                    continue
+                self.metrics.inc("messages_received_total")
+                self.pending += 1
+                await queue.put(msg)
+        finally:
+            await queue.put(None)
+            await consumer
+            self.queues.discard(queue)
+            self.inbound.discard(writer)
+            writer.close()
+
+    async def _consume(self, queue):
+        while True:
+            msg = await queue.get()
+            if msg is None:
+                return
+            kind = msg.get("type", "data") if isinstance(msg, dict) else "?"
+            start = time.perf_counter()
+            try:
+                if self.executor is None:
+                    self.on_message(msg)
+                else:
+                    await self.loop.run_in_executor(self.executor, self.on_message, msg)
+            except Exception as e:
+                print(f"[runtime] Erreur de traitement d'un message : {e!r}")
+                self.metrics.inc("handle_errors_total", type=kind)
+            finally:
+                self.pending -= 1
+                self.metrics.observe("handle_seconds", time.perf_counter() - start, type=kind)
+
+    # --- Émission ---
+    def _peer(self, host, port):
+        peer = self.peers.get((host, port))
+        if peer is None:
+            peer = self.peers[(host, port)] = AsyncPeer(host, port)
+        return peer
+
+    async def _connect(self, peer):
+        if time.monotonic() < peer.retry_at:
+            raise ConnectionError(f"{peer.host}:{peer.port} indisponible, reconnexion différée")
+        try:
+            reader, peer.writer = await asyncio.wait_for(
+                asyncio.open_connection(peer.host, peer.port), self.timeout)
+        except (OSError, asyncio.TimeoutError):
+            self.metrics.inc("connect_failures_total", peer=f"{peer.host}:{peer.port}")
+            peer.failures += 1
+            delay = min(self.max_backoff, self.min_backoff * 2 ** (peer.failures - 1))
+            peer.retry_at = time.monotonic() + delay
+            raise
+        peer.failures = 0
+        peer.retry_at = 0.0
+        self.metrics.inc("connects_total", peer=f"{peer.host}:{peer.port}")
+        if BINARY in self.codecs:
+            # JSON tant que le pair n'a pas confirmé : un ancien nœud ne répond jamais
+            hello = json.dumps({"type": "hello", "codecs": self.codecs}).encode()
+            peer.writer.write(HEADER.pack(len(hello)) + hello)
+        peer.watcher = asyncio.ensure_future(self._watch(peer, reader, peer.writer))
+
+    async def _watch(self, peer, reader, writer):
+        # Seule la réponse au hello circule dans ce sens : la fin de flux signale un pair fermé ou
+        # redémarré, la connexion est abandonnée sans attendre qu'une écriture s'y perde
+        frame = await read_frame(reader)
+        if frame is not None:
+            try:
+                ack = json.loads(frame.decode())
+            except ValueError:
+                ack = {}
+            if ack.get("type") == "hello_ack" and ack.get("codec") == BINARY:
+                peer.codec = BinaryEncoder()
+            while await read_frame(reader) is not None:
+                pass
+        if peer.writer is writer:
+            peer.watcher = None
+            self._drop(peer)
+
+    def _drop(self, peer):
+        if peer.watcher is not None:
+            peer.watcher.cancel()
+            peer.watcher = None
+        peer.codec = JSON_CODEC
+        if peer.writer is not None:
+            peer.writer.close()
+            peer.writer = None
+
+    async def _write(self, peer, payload):
+        peer.writer.write(HEADER.pack(len(payload)) + payload)
+        self.messages_sent += 1
+        self.bytes_sent += HEADER.size + len(payload)
+        self.metrics.inc("bytes_sent_total", HEADER.size + len(payload), peer=f"{peer.host}:{peer.port}")
+        await asyncio.wait_for(peer.writer.drain(), self.timeout)
+
+    def _encode(self, peer, msg, cache):
+        # Le JSON est encodé une seule fois par diffusion ; le binaire dépend de l'état de la connexion
+        if isinstance(msg, bytes):
+            return msg
+        if peer.codec is JSON_CODEC:
+            if JSON_CODEC not in cache:
+                cache[JSON_CODEC] = JSON_CODEC.encode(msg)
+            return cache[JSON_CODEC]
+        return peer.codec.encode(msg)
+
+    async def _send(self, host, port, msg, cache=None):
+        peer = self._peer(host, port)
+        label = f"{host}:{port}"
+        cache = {} if cache is None else cache
+        start = time.perf_counter()
+        try:
+            async with peer.lock:
+                for attempt in range(2):
+                    fresh = peer.writer is None
+                    if fresh:
+                        await self._connect(peer)
+                    try:
+                        await self._write(peer, self._encode(peer, msg, cache))
+                        self.metrics.inc("messages_sent_total", peer=label)
+                        self.metrics.observe("send_seconds", time.perf_counter() - start, peer=label)
+                        return True
+                    except (OSError, asyncio.TimeoutError):
+                        self._drop(peer)
+                        if fresh or attempt:
+                            raise
+                        self.metrics.inc("send_retries_total", peer=label)
+        except (OSError, asyncio.TimeoutError) as e:
+            self.metrics.inc("send_failures_total", peer=label)
+            if self.on_send_error is not None:
+                self.on_send_error(host, port, e)
+            return False
+
+    async def _broadcast(self, addresses, msg):
+        cache = {}
+        return await asyncio.gather(*(self._send(host, port, msg, cache) for host, port in addresses))
+
+    async def _discard(self, host, port):
+        peer = self.peers.pop((host, port), None)
+        if peer is not None:
+            self._drop(peer)
+
+    async def _shutdown(self):
+        for peer in self.peers.values():
+            self._drop(peer)
+        self.peers.clear()
+        if self.server is not None:
+            self.server.close()
+            for writer in list(self.inbound):
+                writer.close()
+            await self.server.wait_closed()
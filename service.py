@@ -0,0 +1,162 @@
+import asyncio
+import heapq
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from runtime import read_frame
+from transport import HEADER
+from sync import entries_for
+from quorum import QuorumError
+from journal import ERROR
+from resolvers import check_value
+
+WORKERS = 4
+SCAN_LIMIT = 1000
+
+
+class ClientServer:
+    # Protocole client local, sur TCP (localhost) ou socket Unix : trames longueur + JSON
+    # {"id", "op", ...} -> {"id", "ok", "result" | "error"}. Les requêtes d'une connexion sont
+    # traitées dans l'ordre ; toutes celles déjà arrivées (pipeline) partent ensemble vers le pool
+    # de threads et leurs réponses repartent en une seule écriture. La boucle asyncio est celle du
+    # runtime réseau ; les opérations bloquantes (quorum) n'y tournent jamais.
+    def __init__(self, node, port=None, host="localhost", path=None, workers=WORKERS):
+        self.node = node
+        self.port = port
+        self.host = host
+        self.path = path
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.server = None
+        self.writers = set()
+        self.ops = {"get": self.get, "set": self.set, "mset": self.mset, "incr": self.incr, "scan": self.scan, "stats": self.stats}
+
+    def start(self):
+        self.node.runtime.submit(self._serve()).result()
+        return self
+
+    def stop(self):
+        if self.server is not None:
+            self.node.runtime.submit(self._close()).result()
+            self.server = None
+        self.executor.shutdown(wait=False)
+
+    async def _serve(self):
+        if self.path is not None:
+            if os.path.exists(self.path):
+                os.remove(self.path)
+            self.server = await asyncio.start_unix_server(self._handle, self.path)
+        else:
+            self.server = await asyncio.start_server(self._handle, self.host, self.port)
+
+    async def _close(self):
+        self.server.close()
+        for writer in list(self.writers):
+            writer.close()
+        await self.server.wait_closed()
+        if self.path is not None and os.path.exists(self.path):
+            os.remove(self.path)
+
+    # --- Connexions ---
+    async def _handle(self, reader, writer):
+        queue = asyncio.Queue()
+        consumer = asyncio.ensure_future(self._respond(queue, writer))
+        self.writers.add(writer)
+        try:
+            while True:
+                frame = await read_frame(reader)
+                if frame is None:
+                    break
+                await queue.put(frame)
+        finally:
+            await queue.put(None)
+            await consumer
+            self.writers.discard(writer)
+            writer.close()
+
+    async def _respond(self, queue, writer):
+        loop = asyncio.get_running_loop()
+        while True:
+            frames = [await queue.get()]
+            while not queue.empty():
+                frames.append(queue.get_nowait())
+            closing = frames[-1] is None
+            frames = [f for f in frames if f is not None]
+            if frames:
+                # execute ne lève pas : une requête invalide a sa réponse d'erreur, la connexion continue
+                replies = await loop.run_in_executor(self.executor, self.execute_all, frames)
+                try:
+                    writer.write(b"".join(HEADER.pack(len(r)) + r for r in replies))
+                    await writer.drain()
+                except ConnectionError:
+                    return
+            if closing:
+                return
+
+    def execute_all(self, frames):
+        return [self.encode(self.execute(frame)) for frame in frames]
+
+    def encode(self, reply):
+        try:
+            return json.dumps(reply).encode()
+        except (TypeError, ValueError) as e:
+            return json.dumps({"id": reply["id"], "ok": False, "error": f"{type(e).__name__}: {e}"}).encode()
+
+    def execute(self, frame):
+        # Toute erreur devient une réponse {"ok": false} ; les imprévues sont aussi journalisées
+        rid = None
+        try:
+            request = json.loads(frame.decode())
+            if not isinstance(request, dict):
+                raise ValueError("Requête attendue sous forme d'objet JSON")
+            rid = request.get("id")
+            op = self.ops.get(request.get("op"))
+            if op is None:
+                raise ValueError(f"Opération inconnue : {request.get('op')}")
+            return {"id": rid, "ok": True, "result": op(request)}
+        except (KeyError, ValueError, TypeError, QuorumError) as e:
+            self.node.metrics.inc("client_errors_total")
+            return {"id": rid, "ok": False, "error": f"{type(e).__name__}: {e}"}
+        except Exception as e:
+            self.node.metrics.inc("client_errors_total")
+            self.node.log_event(f"❌ Requête client en échec : {type(e).__name__}: {e}", kind=ERROR)
+            return {"id": rid, "ok": False, "error": f"{type(e).__name__}: {e}"}
+
+    # --- Opérations ---
+    def get(self, request):
+        # Versions [[valeur, horloge]] : lecture locale, ou à quorum si r est donné
+        key = request["key"]
+        if request.get("r"):
+            return self.node.quorum.get(key, request["r"]).result()
+        entry = self.node.data.get(key)
+        return [[entry["value"], self.node.vc.registry.decode(entry["clock"])]] if entry is not None else []
+
+    def set(self, request):
+        # Sans w : écriture locale répliquée en fond ; avec w : horloge écrite, après w accusés
+        value = check_value(request["value"])
+        if request.get("w"):
+            return self.node.quorum.put(request["key"], value, request["w"]).result()
+        self.node.set_many([(request["key"], value)])
+        return None
+
+    def mset(self, request):
+        items = [(key, check_value(value)) for key, value in request["items"]]
+        self.node.set_many(items)
+        return len(items)
+
+    def incr(self, request):
+        # Ajout à un compteur : total local après l'ajout (None : transmis au primaire de la clé)
+        return self.node.incr(request["key"], request.get("amount", 1))
+
+    def scan(self, request):
+        # Entrées [clé, valeur, horloge] par ordre de clé, à partir de start, limitées au préfixe
+        prefix = request.get("prefix", "")
+        start = request.get("start", "")
+        limit = request.get("limit") or SCAN_LIMIT
+        keys = heapq.nsmallest(limit, (k for k in list(self.node.data) if k.startswith(prefix) and k >= start))
+        return entries_for(self.node.data, keys, self.node.vc.registry)
+
+    def stats(self, request):
+        node = self.node
+        return {"node": node.node_id, "keys": len(node.data), "clock": node.vc.to_dict(),
+                "hints": len(node.quorum.hints), "metrics": node.metrics.snapshot()}
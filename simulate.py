@@ -0,0 +1,395 @@
+import argparse
+import heapq
+import json
+import multiprocessing
+import random
+import time
+from itertools import accumulate
+
+from node import Node
+from codec import BinaryEncoder, Decoder
+from transport import HEADER
+from journal import INFO, CONFLICT
+
+BASE_PORT = 6000
+SETTLE = 5.0
+STEP = 0.05
+
+
+# --- Réseau simulé ---
+class SimNetwork:
+    # Réseau déterministe en temps virtuel : une file d'événements ordonnée par (instant, n° d'ordre),
+    # une latence et une gigue tirées d'un générateur initialisé, des pertes injectées et l'ordre
+    # FIFO par lien d'une connexion TCP. Les messages sont encodés au format binaire, avec un état
+    # par lien comme une connexion réelle (une perte équivaut à une reconnexion). Sert aussi de boucle d'événements aux nœuds (call_later...).
+    # Résultats reproductibles à graine et PYTHONHASHSEED fixées.
+    def __init__(self, latency=0.001, jitter=0.0005, loss=0.0, seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.loss = loss
+        self.rng = random.Random(seed)
+        self.now = 0.0
+        self.events = []
+        self.seq = 0
+        self.nodes = {}  # (hôte, port) -> SimRuntime
+        self.links = {}  # (source, destination) -> [dernière arrivée, encodeur, décodeur]
+        self.dropped = 0
+
+    # --- Boucle d'événements ---
+    def call_later(self, delay, fn, *args):
+        self.seq += 1
+        heapq.heappush(self.events, (self.now + delay, self.seq, fn, args))
+
+    def call_soon_threadsafe(self, fn, *args):
+        self.call_later(0, fn, *args)
+
+    call_soon = call_soon_threadsafe
+
+    def time(self):
+        return self.now
+
+    def run(self, until=None):
+        while self.events and (until is None or self.events[0][0] <= until):
+            self.now, _, fn, args = heapq.heappop(self.events)
+            fn(*args)
+        if until is not None:
+            self.now = max(self.now, until)
+
+    # --- Transport ---
+    def runtime(self, host, port, on_message, on_send_error=None, **options):
+        return SimRuntime(self, (host, port), on_message, on_send_error)
+
+    def transmit(self, source, address, msg):
+        target = self.nodes.get(tuple(address))
+        if target is None:
+            if source.on_send_error is not None:
+                self.call_soon(source.on_send_error, address[0], address[1], ConnectionRefusedError(address))
+            return
+        link = self.links.get((source.address, target.address))
+        if link is None:
+            link = self.links[(source.address, target.address)] = [0.0, BinaryEncoder(), Decoder()]
+        payload = link[1].encode(msg)
+        source.messages_sent += 1
+        source.bytes_sent += HEADER.size + len(payload)
+        if self.loss and self.rng.random() < self.loss:
+            self.dropped += 1
+            # Connexion rompue : le lien repart avec un nouvel état d'encodage
+            link[1:] = [BinaryEncoder(), Decoder()]
+            return
+        link[0] = max(self.now + self.latency + self.rng.uniform(0, self.jitter), link[0])
+        self.call_later(link[0] - self.now, target.deliver, payload, link[2])
+
+
+class SimRuntime:
+    # Même interface que NodeRuntime ; les messages circulent sérialisés, comme sur le réseau
+    def __init__(self, network, address, on_message, on_send_error=None):
+        self.network = network
+        self.loop = network
+        self.address = address
+        self.on_message = on_message
+        self.on_send_error = on_send_error
+        self.messages_sent = 0
+        self.bytes_sent = 0
+
+    def start(self):
+        self.network.nodes[self.address] = self
+        return self
+
+    def send(self, host, port, msg):
+        self.network.transmit(self, (host, port), msg)
+
+    def broadcast(self, addresses, msg):
+        for address in addresses:
+            self.network.transmit(self, address, msg)
+
+    def discard(self, host, port):
+        pass
+
+    def stop(self):
+        self.network.nodes.pop(self.address, None)
+
+    def deliver(self, payload, decoder):
+        if self.network.nodes.get(self.address) is not self:
+            return
+        try:
+            self.on_message(decoder.decode(payload))
+        except Exception as e:
+            print(f"[sim] Erreur de traitement d'un message : {e!r}")
+
+
+# --- Nœud instrumenté ---
+class BenchNode(Node):
+    # Node sans affichage, qui mesure la latence de réplication (chaque valeur écrite porte son
+    # instant d'émission), les conflits détectés et le temps CPU passé à écrire et à traiter
+    def __init__(self, *args, now=time.perf_counter, **options):
+        self.now = now
+        self.sequence = 0
+        self.writes = 0
+        self.applied = 0
+        self.conflicts = 0
+        self.cpu = 0.0
+        self.latencies = []
+        self.seen = set()
+        super().__init__(*args, **options)
+
+    def log_event(self, msg, kind=INFO, key=None, sender=None, clock=None):
+        if kind == CONFLICT:
+            self.conflicts += 1
+
+    def handle_message(self, msg):
+        start = time.thread_time()
+        try:
+            super().handle_message(msg)
+        finally:
+            self.cpu += time.thread_time() - start
+
+    def write(self, key):
+        start = time.thread_time()
+        self.sequence += 1
+        self.writes += 1
+        self.set_key(key, {"w": self.node_id, "n": self.sequence, "t": self.now()})
+        self.cpu += time.thread_time() - start
+
+    def store(self, key, value, clock):
+        super().store(key, value, clock)
+        if isinstance(value, dict) and "t" in value and value["w"] != self.node_id:
+            version = (value["w"], value["n"])
+            if version not in self.seen:
+                self.seen.add(version)
+                self.applied += 1
+                self.latencies.append(self.now() - value["t"])
+
+    def root(self):
+        return format(self.tree.digest(0, 0), "x")
+
+    def report(self):
+        return {"node": self.node_id, "writes": self.writes, "applied": self.applied, "conflicts": self.conflicts,
+                "cpu": self.cpu, "messages": self.runtime.messages_sent, "bytes": self.runtime.bytes_sent,
+                "keys": len(self.data), "root": self.root(), "latencies": self.latencies}
+
+
+# --- Charge ---
+def schedule(nodes, writes, rate, keys=1000, skew=0.0, conflict_ratio=0.0, seed=0):
+    # [(instant, index du nœud, clé)] : arrivées de Poisson au débit `rate` (0 : toutes à t=0),
+    # clés tirées selon une loi de Zipf d'exposant `skew` (0 : uniforme). Avec la probabilité
+    # conflict_ratio, la même clé est aussi écrite au même instant par un autre nœud.
+    rng = random.Random(seed)
+    weights = list(accumulate(1 / (rank + 1) ** skew for rank in range(keys)))
+    plan = []
+    t = 0.0
+    while len(plan) < writes:
+        if rate:
+            t += rng.expovariate(rate)
+        key = f"k{rng.choices(range(keys), cum_weights=weights)[0]}"
+        node = rng.randrange(nodes)
+        plan.append((t, node, key))
+        if nodes > 1 and len(plan) < writes and rng.random() < conflict_ratio:
+            plan.append((t, (node + rng.randrange(1, nodes)) % nodes, key))
+    return plan
+
+
+def node_options(args):
+    options = {"resolvers": {"": args.policy}}
+    if args.coalesce_ms:
+        options["coalesce_window"] = args.coalesce_ms / 1000
+    if args.gossip_fanout:
+        options["gossip"] = {"fanout": args.gossip_fanout, "interval": args.gossip_interval}
+    return options
+
+
+def cluster_node(args, index, **options):
+    # Maillage complet sur localhost : N0..N{n-1} sur les ports BASE_PORT + i
+    names = [f"N{i}" for i in range(args.nodes)]
+    ports = [BASE_PORT + i for i in range(args.nodes)]
+    return BenchNode(names[index], names, ports[index], [("localhost", p) for p in ports if p != ports[index]],
+                     **node_options(args), **options)
+
+
+def cluster(args, **options):
+    return [cluster_node(args, i, **options) for i in range(args.nodes)]
+
+
+def converged(nodes):
+    return len({node.root() for node in nodes}) == 1
+
+
+def anti_entropy(loop, nodes, interval):
+    # Réconciliation de Merkle périodique de chaque nœud avec ses pairs (rattrape les pertes ; la
+    # synchro delta par horloge suppose une livraison causale et ne suffit pas ici)
+    def round_():
+        for node in nodes:
+            node.reconcile()
+        loop.call_later(interval, round_)
+    loop.call_later(interval, round_)
+
+
+# --- Modes d'exécution ---
+def run_simulated(args, plan):
+    random.seed(args.seed)  # tirages du gossip
+    network = SimNetwork(args.latency / 1000, args.jitter / 1000, args.loss, args.seed)
+    nodes = cluster(args, runtime_factory=network.runtime, now=network.time)
+    for node in nodes:
+        node.start(interactive=False)
+    for t, index, key in plan:
+        network.call_later(t, nodes[index].write, key)
+    if args.sync_interval:
+        anti_entropy(network, nodes, args.sync_interval)
+    end = plan[-1][0] if plan else 0.0
+    started = time.perf_counter()
+    network.run(until=end)
+    while network.now < end + args.settle and not converged(nodes):
+        network.run(until=network.now + STEP)
+    wall = time.perf_counter() - started
+    for node in nodes:
+        node.stop()
+    return {"mode": "sim", "duration": end, "settled": network.now - end, "wall": wall,
+            "dropped": network.dropped, "nodes": [node.report() for node in nodes]}
+
+
+def run_threads(args, plan):
+    nodes = cluster(args)
+    for node in nodes:
+        node.start(interactive=False)
+    if args.sync_interval:
+        for node in nodes:
+            node.runtime.loop.call_soon_threadsafe(anti_entropy, node.runtime.loop, [node], args.sync_interval)
+    started = time.perf_counter()
+    for t, index, key in plan:
+        delay = started + t - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        loop = nodes[index].runtime.loop
+        # Écriture exécutée dans la boucle du nœud, comme le traitement des messages reçus
+        loop.call_soon_threadsafe(nodes[index].write, key)
+    end = time.perf_counter() - started
+    deadline = time.perf_counter() + args.settle
+    while time.perf_counter() < deadline and not converged(nodes):
+        time.sleep(STEP)
+    wall = time.perf_counter() - started
+    for node in nodes:
+        node.stop()
+    return {"mode": "threads", "duration": end, "settled": wall - end, "wall": wall,
+            "nodes": [node.report() for node in nodes]}
+
+
+def _process_node(args, index, plan, start_at, results):
+    node = cluster_node(args, index, now=time.time)
+    node.start(interactive=False)
+    loop = node.runtime.loop
+    if args.sync_interval:
+        loop.call_soon_threadsafe(anti_entropy, loop, [node], args.sync_interval)
+    while time.time() < start_at:
+        time.sleep(0.001)
+    for t, target, key in plan:
+        if target != index:
+            continue
+        delay = start_at + t - time.time()
+        if delay > 0:
+            time.sleep(delay)
+        loop.call_soon_threadsafe(node.write, key)
+    end = plan[-1][0] if plan else 0.0
+    # Tous les processus relèvent leur état au même instant pour comparer les racines de Merkle
+    time.sleep(max(0.0, start_at + end + args.settle - time.time()))
+    report = node.report()
+    node.stop()
+    report["cpu"] = time.process_time()
+    results.put(report)
+
+
+def run_processes(args, plan):
+    results = multiprocessing.Queue()
+    start_at = time.time() + 1.0 + 0.05 * args.nodes  # le temps que chaque processus ouvre son port
+    processes = [multiprocessing.Process(target=_process_node, args=(args, i, plan, start_at, results))
+                 for i in range(args.nodes)]
+    for p in processes:
+        p.start()
+    reports = sorted((results.get() for _ in processes), key=lambda r: int(r["node"][1:]))
+    for p in processes:
+        p.join()
+    end = plan[-1][0] if plan else 0.0
+    return {"mode": "processes", "duration": end, "settled": args.settle, "wall": time.time() - start_at,
+            "nodes": reports}
+
+
+# --- Rapport ---
+def percentile(samples, q):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def summarize(result):
+    reports = result["nodes"]
+    latencies = [x for r in reports for x in r["latencies"]]
+    writes = sum(r["writes"] for r in reports)
+    summary = {
+        "mode": result["mode"],
+        "nodes": len(reports),
+        "writes": writes,
+        "throughput": writes / result["duration"] if result["duration"] else 0.0,
+        "applied_per_s": sum(r["applied"] for r in reports) / result["wall"] if result["wall"] else 0.0,
+        "latency_p50_ms": percentile(latencies, 0.50) * 1000,
+        "latency_p99_ms": percentile(latencies, 0.99) * 1000,
+        "conflicts": sum(r["conflicts"] for r in reports),
+        "messages": sum(r["messages"] for r in reports),
+        "bytes": sum(r["bytes"] for r in reports),
+        "converged": len({r["root"] for r in reports}) == 1,
+        "per_node": [{k: v for k, v in r.items() if k != "latencies"} for r in reports],
+    }
+    if "dropped" in result:
+        summary["dropped"] = result["dropped"]
+    return summary
+
+
+def print_summary(summary):
+    print(f"🧪 Mode {summary['mode']} : {summary['nodes']} nœud(s), {summary['writes']} écriture(s)")
+    print(f"   Débit : {summary['throughput']:.0f} écritures/s, {summary['applied_per_s']:.0f} applications/s (horloge murale)")
+    print(f"   Latence de réplication : p50 {summary['latency_p50_ms']:.2f} ms, p99 {summary['latency_p99_ms']:.2f} ms")
+    print(f"   Conflits détectés : {summary['conflicts']}")
+    print(f"   Envoyés : {summary['messages']} message(s), {summary['bytes'] / 1024:.1f} Kio")
+    if "dropped" in summary:
+        print(f"   Pertes injectées : {summary['dropped']} message(s)")
+    print(f"   Convergence : {'✅ oui' if summary['converged'] else '❌ non'}")
+    for r in summary["per_node"]:
+        print(f"   [{r['node']}] {r['writes']} écrites, {r['applied']} reçues, {r['keys']} clés, "
+              f"CPU {r['cpu'] * 1000:.0f} ms, {r['bytes'] / 1024:.1f} Kio")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Banc d'essai multi-nœuds sans interface graphique")
+    parser.add_argument("--mode", choices=("sim", "threads", "processes"), default="sim",
+                        help="réseau simulé déterministe, nœuds dans ce processus ou un processus par nœud")
+    parser.add_argument("--nodes", type=int, default=3)
+    parser.add_argument("--writes", type=int, default=1000)
+    parser.add_argument("--rate", type=float, default=1000.0, help="écritures/s au total (0 : au plus vite)")
+    parser.add_argument("--keys", type=int, default=1000)
+    parser.add_argument("--skew", type=float, default=0.0, help="exposant de Zipf sur les clés")
+    parser.add_argument("--conflict-ratio", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--latency", type=float, default=1.0, help="ms, réseau simulé")
+    parser.add_argument("--jitter", type=float, default=0.5, help="ms, réseau simulé")
+    parser.add_argument("--loss", type=float, default=0.0, help="probabilité de perte, réseau simulé")
+    parser.add_argument("--settle", type=float, default=SETTLE, help="s d'attente de la convergence")
+    parser.add_argument("--sync-interval", type=float, default=0.0, help="s entre deux réconciliations de Merkle")
+    parser.add_argument("--policy", default="lww", help="stratégie de résolution des conflits")
+    parser.add_argument("--coalesce-ms", type=float, default=0.0)
+    parser.add_argument("--gossip-fanout", type=int, default=0)
+    parser.add_argument("--gossip-interval", type=float, default=1.0)
+    parser.add_argument("--json", help="écrit le résumé dans ce fichier")
+    return parser.parse_args(argv)
+
+
+def run(args):
+    plan = schedule(args.nodes, args.writes, args.rate, args.keys, args.skew, args.conflict_ratio, args.seed)
+    runner = {"sim": run_simulated, "threads": run_threads, "processes": run_processes}[args.mode]
+    return summarize(runner(args, plan))
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    summary = run(args)
+    print_summary(summary)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(summary, f, indent=2)
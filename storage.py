@@ -0,0 +1,322 @@
+import json
+import mmap
+import os
+import struct
+import threading
+from array import array
+
+from vector_clock import merge_into, trimmed
+
+# En-tête d'un enregistrement : longueur de la clé, longueur de la valeur (JSON), largeur de l'horloge.
+# Suivent les compteurs (largeur × 8 octets), la clé puis la valeur. Une valeur vide marque une
+# suppression (une valeur JSON fait au moins un octet).
+RECORD = struct.Struct("!IIH")
+COUNTER = array('Q').itemsize
+LOG = "data.log"
+INDEX = "index.json"
+STATE = "state.json"
+NODES = "nodes.json"
+REMAP_STEP = 1024 * 1024
+COMPACT_MIN = 4 * 1024 * 1024
+
+
+class MemoryStore(dict):
+    # Stockage par défaut : {clé: {"value": ..., "clock": array('Q')}} entièrement en mémoire
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class MmapStore:
+    # Stockage sur disque en ajout seul, lu via mmap. Seul l'index clé -> position est gardé en
+    # mémoire ; valeurs et horloges (tableaux d'entiers de largeur fixe) sont lues à la demande.
+    # Même interface que le dict en mémoire : data[key], data[key] = {...}, key in data, items()...
+    def __init__(self, directory, registry, compact_ratio=0.5):
+        self.directory = directory
+        self.registry = registry
+        self.compact_ratio = compact_ratio
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, LOG)
+        self.lock = threading.RLock()
+        self.file = None
+        self.map = None
+        self.mapped = 0
+        self.end = 0
+        self.offsets = {}
+        self.dead = 0
+        self.names = []
+        # Fin du fichier couverte par l'index chargé et clés écrites ou effacées au-delà
+        self.indexed = None
+        self.tail = set()
+        # () -> état dérivé du contenu (horloge, condensés), enregistré avec l'index à la fermeture
+        self.state_source = None
+        self._open()
+        self._load()
+
+    # --- Fichiers ---
+    def _open(self):
+        self.file = open(self.path, "a+b", buffering=0)
+        self.end = os.fstat(self.file.fileno()).st_size
+        self._remap()
+
+    def _remap(self):
+        if self.map is not None:
+            self.map.close()
+        self.map = mmap.mmap(self.file.fileno(), self.end, access=mmap.ACCESS_READ) if self.end else None
+        self.mapped = self.end
+
+    def _read(self, offset, size):
+        if offset + size <= self.mapped:
+            return self.map[offset:offset + size]
+        return os.pread(self.file.fileno(), size, offset)
+
+    def _json_path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _read_json(self, name, default):
+        path = self._json_path(name)
+        if not os.path.exists(path):
+            return default
+        with open(path) as f:
+            return json.load(f)
+
+    def _write_json(self, name, obj):
+        path = self._json_path(name)
+        with open(path + ".tmp", "w") as f:
+            json.dump(obj, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + ".tmp", path)
+
+    def _save_names(self):
+        self.names = list(self.registry.ids)
+        self._write_json(NODES, self.names)
+
+    # --- Chargement ---
+    def _load(self):
+        index = self._read_json(INDEX, None)
+        if index is not None and index["end"] <= self.end:
+            self.offsets, self.dead, start = index["offsets"], index["dead"], index["end"]
+            self.indexed = start
+        else:
+            start = 0
+        # Seule la fin du fichier postérieure à l'index est parcourue (en-têtes et clés uniquement)
+        end = self._scan(start)
+        if end < self.end:
+            # Dernier enregistrement incomplet : écriture interrompue
+            self.file.truncate(end)
+            self.end = end
+            self._remap()
+        positions = [self.registry.intern(n) if n is not None else None for n in self._read_json(NODES, [])]
+        if positions != list(range(len(positions))):
+            self.compact(positions)
+        self._save_names()
+
+    def _scan(self, pos):
+        while pos + RECORD.size <= self.end:
+            klen, vlen, width = RECORD.unpack_from(self.map, pos)
+            size = RECORD.size + width * COUNTER + klen + vlen
+            if pos + size > self.end:
+                break
+            start = pos + RECORD.size + width * COUNTER
+            key = self.map[start:start + klen].decode()
+            self.tail.add(key)
+            if key in self.offsets:
+                self.dead += self._size_at(self.offsets[key])
+            if vlen:
+                self.offsets[key] = pos
+            else:
+                self.offsets.pop(key, None)
+                self.dead += size
+            pos += size
+        return pos
+
+    def _size_at(self, offset):
+        klen, vlen, width = RECORD.unpack(self._read(offset, RECORD.size))
+        return RECORD.size + width * COUNTER + klen + vlen
+
+    # --- Interface de type dict ---
+    def __getitem__(self, key):
+        with self.lock:
+            offset = self.offsets[key]
+            klen, vlen, width = RECORD.unpack(self._read(offset, RECORD.size))
+            body = self._read(offset + RECORD.size, width * COUNTER + klen + vlen)
+        clock = array('Q')
+        clock.frombytes(body[:width * COUNTER])
+        return {"value": json.loads(body[width * COUNTER + klen:]), "clock": clock}
+
+    def __setitem__(self, key, entry):
+        raw_key = key.encode()
+        raw_value = json.dumps(entry["value"]).encode()
+        # Zéros de fin omis : la largeur suit le dernier nœud ayant écrit la clé
+        clock = trimmed(entry["clock"])
+        record = RECORD.pack(len(raw_key), len(raw_value), len(clock)) + clock.tobytes() + raw_key + raw_value
+        with self.lock:
+            if self.registry.ids != self.names:
+                # Nouveau nœud ou renommage : la table des noms doit précéder les horloges qui s'y réfèrent
+                self._save_names()
+            old = self.offsets.get(key)
+            if old is not None:
+                self.dead += self._size_at(old)
+            self.file.write(record)
+            self.offsets[key] = self.end
+            self.end += len(record)
+            if self.end - self.mapped >= REMAP_STEP:
+                self._remap()
+            if self.dead >= COMPACT_MIN and self.dead > self.compact_ratio * self.end:
+                self.compact()
+
+    def __delitem__(self, key):
+        raw_key = key.encode()
+        record = RECORD.pack(len(raw_key), 0, 0) + raw_key
+        with self.lock:
+            self.dead += self._size_at(self.offsets.pop(key)) + len(record)
+            self.file.write(record)
+            self.end += len(record)
+            if self.end - self.mapped >= REMAP_STEP:
+                self._remap()
+
+    def clocks(self):
+        # (clé, horloge) de chaque version, sans lire ni décoder les valeurs
+        for key in list(self.offsets):
+            with self.lock:
+                offset = self.offsets.get(key)
+                if offset is None:
+                    continue
+                width = RECORD.unpack(self._read(offset, RECORD.size))[2]
+                raw = self._read(offset + RECORD.size, width * COUNTER)
+            clock = array('Q')
+            clock.frombytes(raw)
+            yield key, clock
+
+    def state(self):
+        # État dérivé enregistré avec l'index chargé ; None s'il ne lui correspond pas
+        state = self._read_json(STATE, None)
+        if state is None or self.indexed is None or state["end"] != self.indexed:
+            return None
+        return state
+
+    def get(self, key, default=None):
+        return self[key] if key in self.offsets else default
+
+    def __contains__(self, key):
+        return key in self.offsets
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __iter__(self):
+        return iter(list(self.offsets))
+
+    def keys(self):
+        return list(self.offsets)
+
+    def values(self):
+        return (self[k] for k in list(self.offsets))
+
+    def items(self):
+        return ((k, self[k]) for k in list(self.offsets))
+
+    # --- Maintenance ---
+    def compact(self, positions=None):
+        # Réécrit uniquement les versions vivantes ; positions : correspondance des anciens index
+        # d'horloge vers ceux du registre courant
+        with self.lock:
+            tmp = self.path + ".tmp"
+            offsets = {}
+            pos = 0
+            with open(tmp, "wb") as out:
+                for key, offset in sorted(self.offsets.items(), key=lambda item: item[1]):
+                    record = self._read(offset, self._size_at(offset))
+                    if positions is not None:
+                        record = self._remap_record(record, positions)
+                    out.write(record)
+                    offsets[key] = pos
+                    pos += len(record)
+                out.flush()
+                os.fsync(out.fileno())
+            # L'ancien index (et l'état dérivé enregistré avec lui) ne doit jamais être associé au
+            # nouveau fichier
+            for name in (STATE, INDEX):
+                if os.path.exists(self._json_path(name)):
+                    os.remove(self._json_path(name))
+            if self.map is not None:
+                self.map.close()
+                self.map = None
+            self.file.close()
+            os.replace(tmp, self.path)
+            if positions is not None:
+                self._save_names()
+            self.offsets, self.dead = offsets, 0
+            self._open()
+            self._write_json(INDEX, {"end": self.end, "offsets": self.offsets, "dead": 0})
+
+    def _remap_record(self, record, positions):
+        klen, vlen, width = RECORD.unpack_from(record)
+        old = array('Q')
+        old.frombytes(record[RECORD.size:RECORD.size + width * COUNTER])
+        clock = array('Q', bytes(COUNTER * len(self.registry)))
+        for idx, ts in zip(positions, old):
+            if idx is not None:
+                clock[idx] = ts
+        clock = trimmed(clock)
+        return RECORD.pack(klen, vlen, len(clock)) + clock.tobytes() + record[RECORD.size + width * COUNTER:]
+
+    def flush(self):
+        with self.lock:
+            os.fsync(self.file.fileno())
+            self._remap()
+            if self.registry.ids != self.names:
+                self._save_names()
+            self._write_json(INDEX, {"end": self.end, "offsets": self.offsets, "dead": self.dead})
+            if self.state_source is not None:
+                self._write_json(STATE, dict(self.state_source(), end=self.end))
+
+    def close(self):
+        with self.lock:
+            self.flush()
+            if self.map is not None:
+                self.map.close()
+                self.map = None
+            self.file.close()
+
+
+def open_store(node, directory=None):
+    # Sans répertoire : dict en mémoire. Sinon stockage mmap ; l'horloge locale et l'arbre de
+    # Merkle reprennent l'état enregistré à la fermeture, seules les versions écrites depuis sont
+    # relues. L'index causal est reconstruit à sa première requête, à partir des seules horloges.
+    if directory is None:
+        return MemoryStore()
+    store = MmapStore(directory, node.vc.registry)
+    registry = node.vc.registry
+
+    def state():
+        with node.tree.lock:
+            digests = {key: format(digest, "x") for key, digest in node.tree.entries.items()}
+        return {"clock": registry.decode(node.vc.counters), "digests": digests}
+
+    store.state_source = state
+    saved = store.state()
+    if saved is None:
+        # Pas d'état enregistré (arrêt brutal, compaction) : toutes les versions sont relues
+        def items():
+            for key, entry in store.items():
+                merge_into(node.vc.counters, entry["clock"])
+                node.history.update(key, entry["clock"])
+                yield key, entry["value"], registry.decode(entry["clock"])
+
+        node.tree.rebuild(items())
+        return store
+    merge_into(node.vc.counters, registry.encode(saved["clock"]))
+    node.tree.load({key: int(digest, 16) for key, digest in saved["digests"].items()})
+    for key in store.tail:
+        entry = store.get(key)
+        if entry is None:
+            node.tree.remove(key)
+        else:
+            merge_into(node.vc.counters, entry["clock"])
+            node.tree.update(key, entry["value"], registry.decode(entry["clock"]))
+    node.history.defer(store.clocks)
+    return store
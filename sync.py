@@ -0,0 +1,35 @@
+from vector_clock import compare_many, AFTER, CONCURRENT
+
+
+def delta_for(data, summary, registry, history=None):
+    # Entrées que le pair (résumé = son horloge vectorielle) n'a pas causalement vues ; avec un
+    # CausalIndex, seules les clés au-delà du résumé sont lues
+    if history is not None:
+        return entries_for(data, history.changed_since(summary), registry)
+    keys = list(data)
+    clocks = [data[k]["clock"] for k in keys]
+    orders = compare_many(clocks, [summary] * len(keys))
+    return entries_for(data, [k for k, order in zip(keys, orders) if order in (AFTER, CONCURRENT)], registry)
+
+
+def entries_for(data, keys, registry):
+    return [[k, data[k]["value"], registry.decode(data[k]["clock"])] for k in keys if k in data]
+
+
+def classify_entries(data, entries, registry):
+    # Classement en lot des entrées reçues face aux versions locales d'avant le lot : une clé
+    # présente plusieurs fois est à reclasser par l'appelant au fil de l'application
+    incoming = [(key, value, registry.encode(clock)) for key, value, clock in entries]
+    known = [i for i, (key, _, _) in enumerate(incoming) if key in data]
+    orders = [AFTER] * len(incoming)
+    results = compare_many([incoming[i][2] for i in known],
+                           [data[incoming[i][0]]["clock"] for i in known])
+    for i, order in zip(known, results):
+        orders[i] = order
+    return [(key, value, clock, order) for (key, value, clock), order in zip(incoming, orders)]
+
+
+def rebuild_tree(tree, data, registry):
+    # Les noms de nœuds changent après un renommage : condensés à recalculer
+    tree.rebuild((k, v["value"], registry.decode(v["clock"])) for k, v in data.items())
+
@@ -0,0 +1,24 @@
+from batching import WriteCoalescer
+from simulate import SimNetwork
+
+
+class Runtime:
+    def __init__(self, network):
+        self.loop = network
+
+
+def test_window_restarts_after_size_flush():
+    network = SimNetwork()
+    batches = []
+    coalescer = WriteCoalescer(Runtime(network), lambda entries: batches.append((network.now, entries)),
+                               window=1.0, max_entries=2)
+    coalescer.add("a", 1, {})
+    network.run(until=0.2)
+    coalescer.add("b", 2, {})  # plein : vidé sans attendre la fenêtre
+    assert [len(entries) for _, entries in batches] == [2]
+    network.run(until=0.5)
+    coalescer.add("c", 3, {})  # nouvelle fenêtre : jusqu'à 1.5
+    network.run(until=1.4)
+    assert len(batches) == 1
+    network.run(until=2.0)
+    assert [(at, [e[0] for e in entries]) for at, entries in batches[1:]] == [(1.5, ["c"])]
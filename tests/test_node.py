@@ -0,0 +1,92 @@
+import socket
+import threading
+import time
+
+import pytest
+
+from node import Node
+from simulate import SimNetwork
+
+
+def make_node(network, name, port, peers, **options):
+    node = Node(name, ["A", "B"], port, peers, runtime_factory=network.runtime, **options)
+    node.start(interactive=False)
+    return node
+
+
+def test_named_peers_with_gossip():
+    # Pairs nommés ({nom: (hôte, port)}) : la vue de la rumeur ne contient que des adresses
+    network = SimNetwork()
+    a = make_node(network, "A", 5000, {"B": ("localhost", 5001)}, gossip={"interval": 0.1})
+    b = make_node(network, "B", 5001, {"A": ("localhost", 5000)}, gossip={"interval": 0.1})
+    assert a.gossip.view == [("localhost", 5001)]
+    a.set_key("x", "1")
+    network.run(until=1.0)
+    assert b.data["x"]["value"] == "1"
+    # Les tours push-pull ont tourné sans erreur et rattrapent une écriture non diffusée
+    b.store("y", "2", b.engine.tick())
+    network.run(until=3.0)
+    assert a.data["y"]["value"] == "2"
+    a.stop()
+    b.stop()
+
+
+def test_add_peer_without_name_is_rejected_untouched():
+    network = SimNetwork()
+    a = make_node(network, "A", 5000, {"B": ("localhost", 5001)}, replication={"replicas": 2})
+    with pytest.raises(ValueError):
+        a.add_peer("localhost", 5002)
+    assert a.peers == [("localhost", 5001)]
+    assert a.members == {"B": ("localhost", 5001)}
+    assert a.placement.ring.members == {"A", "B"}
+    a.stop()
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("localhost", 0))
+        return s.getsockname()[1]
+
+
+class RecordingNode(Node):
+    def handle_message(self, msg):
+        self.handlers.add(threading.current_thread())
+        super().handle_message(msg)
+
+
+def test_messages_are_handled_off_the_network_loop():
+    ports = [free_port(), free_port()]
+    a = Node("A", ["A", "B"], ports[0], {"B": ("localhost", ports[1])})
+    b = RecordingNode("B", ["A", "B"], ports[1], {"A": ("localhost", ports[0])})
+    b.handlers = set()
+    try:
+        a.start(interactive=False)
+        b.start(interactive=False)
+        a.set_many((f"k{i}", i) for i in range(10))
+        deadline = time.monotonic() + 5
+        while len(b.data) < 10 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert len(b.data) == 10
+        assert b.handlers and b.runtime.thread not in b.handlers
+    finally:
+        a.stop()
+        b.stop()
+
+
+def test_repl_reports_quorum_errors(monkeypatch, capsys):
+    network = SimNetwork()
+    a = make_node(network, "A", 5000, {"B": ("localhost", 5001)})
+    commands = iter(["put k v 5", "get k 9", "set k v"])
+
+    def feed(prompt):
+        try:
+            return next(commands)
+        except StopIteration:
+            raise EOFError
+
+    monkeypatch.setattr("builtins.input", feed)
+    with pytest.raises(EOFError):
+        a.repl()
+    out = capsys.readouterr().out
+    assert out.count("❌") == 2
+    assert a.data["k"]["value"] == "v"
@@ -0,0 +1,68 @@
+import json
+
+from node import Node
+from resolvers import SIBLINGS, counter_total
+from service import ClientServer
+from simulate import SimNetwork
+
+
+def make_node(network, name, port, peer_port):
+    node = Node(name, ["A", "B"], port, {("B" if name == "A" else "A"): ("localhost", peer_port)},
+                runtime_factory=network.runtime, resolvers={"c:": "counter"})
+    node.start(interactive=False)
+    return node
+
+
+def test_concurrent_increments_merge_to_the_sum():
+    network = SimNetwork()
+    a = make_node(network, "A", 5000, 5001)
+    b = make_node(network, "B", 5001, 5000)
+    assert a.incr("c:hits") == 1
+    assert b.incr("c:hits", 2) == 2
+    network.run(until=1.0)
+    for node in (a, b):
+        assert counter_total(node.data["c:hits"]["value"]) == 3
+    assert a.incr("c:hits") == 4
+
+
+def test_incr_client_op():
+    network = SimNetwork()
+    a = make_node(network, "A", 5000, 5001)
+    server = ClientServer(a)
+    try:
+        reply = server.execute(json.dumps({"id": 1, "op": "incr", "key": "c:n", "amount": 5}).encode())
+        assert reply == {"id": 1, "ok": True, "result": 5}
+        a.set_key("plain", "x")
+        reply = server.execute(json.dumps({"id": 2, "op": "incr", "key": "plain"}).encode())
+        assert not reply["ok"] and "ValueError" in reply["error"]
+    finally:
+        server.executor.shutdown()
+
+
+def test_multi_value_keeps_user_dicts_as_values():
+    # Une valeur utilisateur de la forme {"mv": ...} n'est pas prise pour un ensemble de sœurs
+    network = SimNetwork()
+    nodes = []
+    for name, port, peer_port in (("A", 5000, 5001), ("B", 5001, 5000)):
+        node = Node(name, ["A", "B"], port, {("B" if name == "A" else "A"): ("localhost", peer_port)},
+                    runtime_factory=network.runtime, resolvers={"": "mv"})
+        node.start(interactive=False)
+        nodes.append(node)
+    a, b = nodes
+    a.set_key("k", {"mv": 1})
+    b.set_key("k", "x")
+    network.run(until=1.0)
+    a.set_key("other", 1)
+    b.set_key("other", {"mv": [["y", {}]]})
+    network.run(until=2.0)
+    for node in nodes:
+        siblings = node.data["k"]["value"][SIBLINGS]
+        assert sorted(json.dumps(v) for v, _ in siblings) == [json.dumps("x"), json.dumps({"mv": 1})]
+        assert sorted(json.dumps(v) for v, _ in node.data["other"]["value"][SIBLINGS]) == \
+            [json.dumps(1), json.dumps({"mv": [["y", {}]]})]
+    server = ClientServer(a)
+    try:
+        reply = server.execute(json.dumps({"id": 1, "op": "set", "key": "k", "value": {SIBLINGS: []}}).encode())
+        assert not reply["ok"]
+    finally:
+        server.executor.shutdown()
@@ -1,29 +1,209 @@
+import threading
+from array import array
+from itertools import zip_longest
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+BEFORE = "before"
+AFTER = "after"
+EQUAL = "equal"
+CONCURRENT = "concurrent"
+
+# En dessous de ce nombre de paires, la boucle Python reste plus rapide que NumPy
+BATCH_MIN_NUMPY = 64
+
+
+# Registre partagé nom de nœud -> index dans les tableaux d'horloges
+class NodeRegistry:
+    def __init__(self, node_ids=()):
+        self.ids = []  # None : emplacement libéré
+        self.index = {}
+        self.free = []
+        self.retired = set()  # nœuds retirés du cluster : ignorés dans les horloges reçues
+        self.lock = threading.Lock()
+        for nid in node_ids:
+            self.intern(nid)
+
+    def intern(self, node_id):
+        idx = self.index.get(node_id)
+        if idx is not None:
+            return idx
+        # Nouveau nom : plusieurs threads de réception peuvent le découvrir en même temps
+        with self.lock:
+            idx = self.index.get(node_id)
+            if idx is None:
+                if self.free:
+                    idx = self.free.pop()
+                    self.ids[idx] = node_id
+                else:
+                    idx = len(self.ids)
+                    self.ids.append(node_id)
+                self.index[node_id] = idx
+            return idx
+
+    def release(self, node_id):
+        # À n'appeler qu'une fois le compteur remis à zéro dans toutes les horloges : l'emplacement
+        # est réutilisé par le prochain nœud, la largeur des horloges suit les membres vivants
+        idx = self.index.pop(node_id, None)
+        if idx is not None:
+            self.ids[idx] = None
+            self.free.append(idx)
+
+    def rename(self, old_id, new_id, clocks=()):
+        # Le renommage ne déplace aucun compteur : seul le nom associé à l'index change. Si new_id
+        # est déjà enregistré, le compteur de old_id est replié (max) sur le sien dans chaque
+        # horloge de clocks (modifiées en place), puis l'emplacement de old_id est libéré
+        with self.lock:
+            old, new = self.index.get(old_id), self.index.get(new_id)
+            if old is not None and new is None:
+                del self.index[old_id]
+                self.ids[old] = new_id
+                self.index[new_id] = old
+                return
+        if old is None or old == new:
+            self.intern(new_id)
+            return
+        for counters in clocks:
+            if old < len(counters) and counters[old]:
+                if new >= len(counters):
+                    counters.frombytes(bytes(8 * (new + 1 - len(counters))))
+                counters[new] = max(counters[new], counters[old])
+                counters[old] = 0
+        self.release(old_id)
+
+    def encode(self, clock_dict):
+        counters = array('Q', bytes(8 * len(self.ids)))
+        for node, ts in clock_dict.items():
+            if node in self.retired:
+                continue
+            idx = self.intern(node)
+            if idx >= len(counters):
+                counters.frombytes(bytes(8 * (idx + 1 - len(counters))))
+            counters[idx] = ts
+        return counters
+
+    def decode(self, counters, full=False):
+        # Forme transmise : seuls les compteurs non nuls (un nœud absent vaut zéro) ;
+        # full=True garde les zéros des membres connus (affichage)
+        return {self.ids[i]: ts for i, ts in enumerate(counters) if (ts or full) and self.ids[i] is not None}
+
+    def __len__(self):
+        return len(self.ids)
+
+
+def trimmed(counters):
+    # Sans les zéros de fin : un tableau plus court se compare et se fusionne à l'identique
+    end = len(counters)
+    while end and not counters[end - 1]:
+        end -= 1
+    return counters if end == len(counters) else counters[:end]
+
+
+def as_counters(clock, registry):
+    if isinstance(clock, VectorClock):
+        return clock.counters
+    if isinstance(clock, dict):
+        return registry.encode(clock)
+    return clock
+
+
+def compare(a, b):
+    # Un seul passage, arrêt dès que les deux sens de dépassement sont vus
+    if isinstance(a, VectorClock):
+        a = a.counters
+    if isinstance(b, VectorClock):
+        b = b.counters
+    if isinstance(a, dict):
+        pairs = ((a.get(k, 0), b.get(k, 0)) for k in a.keys() | b.keys())
+    else:
+        pairs = zip_longest(a, b, fillvalue=0)
+    less = greater = False
+    for x, y in pairs:
+        if x < y:
+            if greater:
+                return CONCURRENT
+            less = True
+        elif x > y:
+            if less:
+                return CONCURRENT
+            greater = True
+    if less:
+        return BEFORE
+    if greater:
+        return AFTER
+    return EQUAL
+
+
+def compare_many(local_clocks, remote_clocks):
+    # Classement en lot de paires (local, distant), vectorisé si NumPy est disponible
+    if np is None or len(local_clocks) < BATCH_MIN_NUMPY:
+        return [compare(a, b) for a, b in zip(local_clocks, remote_clocks)]
+    width = max(max(map(len, local_clocks), default=0), max(map(len, remote_clocks), default=0))
+    local = np.zeros((len(local_clocks), width), dtype=np.uint64)
+    remote = np.zeros((len(remote_clocks), width), dtype=np.uint64)
+    for row, counters in enumerate(local_clocks):
+        local[row, :len(counters)] = counters
+    for row, counters in enumerate(remote_clocks):
+        remote[row, :len(counters)] = counters
+    less = (local < remote).any(axis=1)
+    greater = (local > remote).any(axis=1)
+    result = np.where(less & greater, CONCURRENT,
+             np.where(less, BEFORE, np.where(greater, AFTER, EQUAL)))
+    return result.tolist()
+
+
+def merge_into(counters, other):
+    if len(counters) < len(other):
+        counters.frombytes(bytes(8 * (len(other) - len(counters))))
+    for i, ts in enumerate(other):
+        if ts > counters[i]:
+            counters[i] = ts
+
+
 class VectorClock:
-    def __init__(self, node_id, all_nodes):
+    def __init__(self, node_id, all_nodes, registry=None):
+        self.registry = registry if registry is not None else NodeRegistry()
+        for nid in all_nodes:
+            self.registry.intern(nid)
         self.node_id = node_id
-        self.clock = {nid: 0 for nid in all_nodes}
+        self.registry.intern(node_id)
+        self.counters = array('Q', bytes(8 * len(self.registry)))
+
+    def _grow(self):
+        missing = len(self.registry) - len(self.counters)
+        if missing > 0:
+            self.counters.frombytes(bytes(8 * missing))
 
     def increment(self):
-        self.clock[self.node_id] += 1
+        idx = self.registry.intern(self.node_id)
+        self._grow()
+        self.counters[idx] += 1
 
     def update(self, received_clock):
-        for node, ts in received_clock.items():
-            self.clock[node] = max(self.clock.get(node, 0), ts)
+        merge_into(self.counters, as_counters(received_clock, self.registry))
         self.increment()
 
-    def rename_node(self, old_id, new_id):
-        if old_id in self.clock:
-            self.clock[new_id] = self.clock.pop(old_id)
-        else:
-            self.clock[new_id] = 0
+    def rename_node(self, old_id, new_id, clocks=()):
+        self.registry.rename(old_id, new_id, [self.counters, *clocks])
+        self._grow()
         if self.node_id == old_id:
             self.node_id = new_id
 
     def happens_before(self, other_clock):
-        return all(self.clock.get(k, 0) <= other_clock.get(k, 0) for k in other_clock) and any(self.clock.get(k, 0) < other_clock.get(k, 0) for k in other_clock)
+        return compare(self.counters, as_counters(other_clock, self.registry)) == BEFORE
+
+    def snapshot(self):
+        # Copie compacte (tableau d'entiers) pour le stockage par clé
+        self._grow()
+        return array('Q', self.counters)
 
     def to_dict(self):
-        return self.clock.copy()
+        self._grow()
+        return self.registry.decode(self.counters)
 
     def __repr__(self):
-        return str(self.clock)
+        self._grow()
+        return str(self.registry.decode(self.counters, full=True))
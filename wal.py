@@ -0,0 +1,208 @@
+import json
+import os
+import struct
+import threading
+import zlib
+from array import array
+
+from transport import HEADER
+from membership import forget, rename
+from vector_clock import merge_into, trimmed
+
+CRC = struct.Struct("!I")
+SNAPSHOT = "snapshot.json"
+
+
+def segment_name(first_seq):
+    return f"wal-{first_seq:012d}.log"
+
+
+def read_segment(path):
+    # Rend les enregistrements valides ; s'arrête (et tronque) à la première écriture partielle
+    records = []
+    with open(path, "r+b") as f:
+        good = 0
+        while True:
+            header = f.read(HEADER.size + CRC.size)
+            if len(header) < HEADER.size + CRC.size:
+                break
+            (size,) = HEADER.unpack_from(header)
+            (crc,) = CRC.unpack_from(header, HEADER.size)
+            payload = f.read(size)
+            if len(payload) < size or zlib.crc32(payload) != crc:
+                break
+            records.append(json.loads(payload.decode()))
+            good = f.tell()
+        f.truncate(good)
+    return records
+
+
+class WriteAheadLog:
+    # Journal en ajout seul avec fsync groupé : un thread de fond regroupe toutes les écritures
+    # arrivées pendant commit_interval en un seul fsync. Un instantané compact est pris toutes les
+    # snapshot_every écritures ; les segments qu'il couvre sont alors supprimés.
+    def __init__(self, directory, snapshot_source=None, commit_interval=0.005,
+                 snapshot_every=10000, sync_commit=False):
+        self.directory = directory
+        self.snapshot_source = snapshot_source
+        self.commit_interval = commit_interval
+        self.snapshot_every = snapshot_every
+        self.sync_commit = sync_commit
+        os.makedirs(directory, exist_ok=True)
+        self.lock = threading.Lock()
+        self.committed = threading.Condition(self.lock)
+        self.seq = 0
+        self.durable_seq = 0
+        self.since_snapshot = 0
+        self.file = None
+        self.closed = False
+        self.snapshotting = False
+        self.flusher = None
+
+    # --- Reprise ---
+    def recover(self):
+        # Rend (instantané ou None, enregistrements postérieurs à l'instantané)
+        snapshot = None
+        path = os.path.join(self.directory, SNAPSHOT)
+        if os.path.exists(path):
+            with open(path) as f:
+                snapshot = json.load(f)
+        base = snapshot["seq"] if snapshot else 0
+        tail = []
+        for name in sorted(n for n in os.listdir(self.directory) if n.startswith("wal-")):
+            tail.extend(r for r in read_segment(os.path.join(self.directory, name)) if r[0] > base)
+        self.seq = self.durable_seq = tail[-1][0] if tail else base
+        self.since_snapshot = len(tail)
+        return snapshot, tail
+
+    def open(self):
+        self.file = open(os.path.join(self.directory, segment_name(self.seq + 1)), "ab")
+        self.flusher = threading.Thread(target=self._flush_loop, daemon=True)
+        self.flusher.start()
+        return self
+
+    # --- Écriture ---
+    def append(self, *record):
+        with self.lock:
+            if self.file is None:
+                raise ValueError("Journal fermé")
+            self.seq += 1
+            seq = self.seq
+            payload = json.dumps([seq, *record]).encode()
+            self.file.write(HEADER.pack(len(payload)) + CRC.pack(zlib.crc32(payload)) + payload)
+            self.since_snapshot += 1
+            snapshot_due = (self.snapshot_source is not None and not self.snapshotting
+                            and self.since_snapshot >= self.snapshot_every)
+            if snapshot_due:
+                self._rotate()
+            if self.sync_commit:
+                while self.durable_seq < seq and not self.closed:
+                    self.committed.wait()
+        if snapshot_due:
+            # Copie de l'état dans le thread appelant (celui qui modifie les données), écriture en fond
+            state = self.snapshot_source()
+            threading.Thread(target=self._write_snapshot, args=(seq, state), daemon=True).start()
+        return seq
+
+    def _commit(self):
+        if self.file is not None and self.durable_seq < self.seq:
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.durable_seq = self.seq
+            self.committed.notify_all()
+
+    def _flush_loop(self):
+        with self.lock:
+            while not self.closed:
+                self.committed.wait(self.commit_interval)
+                self._commit()
+
+    def _rotate(self):
+        self._commit()
+        self.file.close()
+        self.file = open(os.path.join(self.directory, segment_name(self.seq + 1)), "ab")
+        self.since_snapshot = 0
+        self.snapshotting = True
+
+    # --- Instantanés ---
+    def _write_snapshot(self, seq, state):
+        state = dict(state, seq=seq)
+        path = os.path.join(self.directory, SNAPSHOT)
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(state, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+        for name in os.listdir(self.directory):
+            if name.startswith("wal-") and name < segment_name(seq + 1):
+                os.remove(os.path.join(self.directory, name))
+        with self.lock:
+            self.snapshotting = False
+
+    def close(self):
+        with self.lock:
+            self._commit()
+            self.closed = True
+            self.committed.notify_all()
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+
+def snapshot_state(node):
+    # Forme compacte : noms de nœuds une fois, horloges en listes d'entiers positionnelles
+    # (sans les zéros de fin ; null marque un emplacement libéré)
+    return {
+        "nodes": list(node.vc.registry.ids),
+        "clock": node.vc.counters.tolist(),
+        "data": [[k, v["value"], trimmed(v["clock"]).tolist()] for k, v in list(node.data.items())],
+    }
+
+
+def restore(node, wal):
+    # Recharge le dernier instantané puis rejoue la fin du journal
+    snapshot, tail = wal.recover()
+    registry = node.vc.registry
+    if snapshot is not None:
+        positions = [registry.intern(n) if n is not None else None for n in snapshot["nodes"]]
+        identity = positions == list(range(len(positions)))
+
+        def counters_of(values):
+            if identity:
+                return array('Q', values)
+            counters = array('Q', bytes(8 * len(registry)))
+            for idx, ts in zip(positions, values):
+                if idx is not None:
+                    counters[idx] = ts
+            return counters
+
+        for key, value, values in snapshot["data"]:
+            node.data[key] = {"value": value, "clock": counters_of(values)}
+        merge_into(node.vc.counters, counters_of(snapshot["clock"]))
+    for record in tail:
+        kind = record[1]
+        if kind == "put":
+            _, _, key, value, clock = record
+            counters = registry.encode(clock)
+            node.data[key] = {"value": value, "clock": counters}
+            merge_into(node.vc.counters, counters)
+        elif kind == "rename":
+            rename(node, record[2], record[3])
+        elif kind == "forget":
+            forget(node, record[2])
+        elif kind == "drop":
+            for key in record[2]:
+                if key in node.data:
+                    del node.data[key]
+    node.tree.rebuild((k, v["value"], registry.decode(v["clock"])) for k, v in node.data.items())
+    node.history.rebuild((k, v["clock"]) for k, v in node.data.items())
+    return len(tail)
+
+
+def open_wal(node, directory, **options):
+    # Restaure l'état du nœud depuis le répertoire puis ouvre le journal pour les nouvelles écritures
+    wal = WriteAheadLog(directory, snapshot_source=lambda: snapshot_state(node), **options)
+    replayed = restore(node, wal)
+    wal.open()
+    return wal, replayed